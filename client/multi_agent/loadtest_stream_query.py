@@ -0,0 +1,533 @@
+"""End-to-end load test of the host's /stream-query endpoint with local stub A2A agents.
+
+Five stub agents are served in this process on the ports from REMOTE_AGENTS. They use the same
+agent cards as the real agents, so the intent router is fitted the same way, and they stream a
+fixed answer at a configurable TTFT and chunk rate, without a model, Redis or MCP server. The
+host is started as a subprocess (python __main__.py) unless --no-start is given. The tool then
+runs multi-turn user sessions (SESSION_SCRIPTS) against /stream-query, with up to --concurrency
+sessions open at once and a think time between turns.
+
+Reported per run:
+- routing: time from sending the request to the stub agent receiving it, which covers routing
+  and dispatch. The host's own routing_time from /metrics is reported next to it.
+- misrouted: turns that reached a different agent than the script expects.
+- TTFT: time to the first status event with text.
+- chunk rate: status events per second after the first one, with the inter-chunk gap.
+- error rate: turns that ended with an error event, an HTTP error or no complete event.
+- host CPU: the change in cpu_seconds from /metrics, per turn and as a share of one core.
+- host memory: RSS sampled from /proc/<pid>/status. This needs Linux and a host started by the
+  tool or given with --host-pid.
+
+Each run appends one summary record to --output. With --record-turns it also appends one record
+per turn. The summary is compared with the last earlier summary that used the same settings.
+The file is JSONL.
+
+Routing stays on the local fast path (session affinity and the intent router) for all scripted
+turns. Turns that fall back to the LLM router need a DASHSCOPE_API_KEY.
+
+Run from this directory:
+    python loadtest_stream_query.py [--sessions 2000] [--concurrency 1000] [--output loadtest_results.jsonl]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import uuid4
+import httpx
+import uvicorn
+from a2a.server.agent_execution import AgentExecutor
+from a2a.server.agent_execution.context import RequestContext
+from a2a.server.apps import A2AStarletteApplication
+from a2a.server.events.event_queue import EventQueue
+from a2a.server.request_handlers import DefaultRequestHandler
+from a2a.server.tasks import InMemoryTaskStore, TaskUpdater
+from a2a.types import AgentCapabilities, AgentCard, AgentSkill, Part, TaskState, TextPart
+from a2a.utils import new_agent_text_message, new_task
+from src.config.settings import API_CONFIG, REMOTE_AGENTS
+from src.metrics import percentile
+
+# 与各远端Agent的名片一致（server.py），键为REMOTE_AGENTS中的名称
+STUB_CARDS = {
+    'coding_agent': {
+        'name': 'Coding Agent',
+        'description': 'An Agent for Coding',
+        'skill': ('coding agent', 'An Agent for Coding', ['编码', '代码', 'coding'],
+                  ['编写一个hello world程序', '编写一个快速排序的python程序']),
+    },
+    'Automobile_Recommendation_Agent': {
+        'name': 'Automobile Recommendation Agent',
+        'description': 'Query relevant data from the database for automobile recommendation to user',
+        'skill': ('Automobile Recommendation',
+                  'Query relevant data from the database for automobile recommendation to user',
+                  ['Automobile Recommendation', 'Auto Recommend'],
+                  ['Recommend a car for me', 'What is the best car for my budget?']),
+    },
+    'Loan_Scheme_Suggestion_Agent': {
+        'name': 'Loan Scheme Suggestion Agent',
+        'description': 'Give the loan scheme suggestion to user',
+        'skill': ('loan suggest', 'Give the loan scheme suggestion to user',
+                  ['loan scheme suggestion', 'loan scheme', 'loan suggestion', 'loan suggest'],
+                  ['What is the best loan scheme for me?', 'Suggest a loan scheme based on my requirements']),
+    },
+    'Loan Pre-examination Agent': {
+        'name': 'Loan Pre-examination Agent',
+        'description': 'Conduct loan pre-approval for users',
+        'skill': ('loan pre-examination', 'Based on the user basic information, conduct a loan pre-examination',
+                  ['loan pre-examination', 'pre-examination'],
+                  ['What is the loan pre-examination result for me?']),
+    },
+    'chat_agent': {
+        'name': 'Chat Agent',
+        'description': 'An Agent for Chat with user',
+        'skill': ('chat agent', 'An Agent for Chat with user', ['chat'], ['给我讲个笑话', '今天大连天气怎么样？']),
+    },
+}
+
+# 多轮会话脚本：(用户输入, 期望处理该轮的Agent)；每个会话按顺序执行其中一个脚本
+SESSION_SCRIPTS: List[List[Tuple[str, str]]] = [
+    # 选车 -> 贷款方案 -> 预审
+    [
+        ("我想买车，预算30万左右，适合家用，帮我推荐车型", 'Automobile Recommendation Agent'),
+        ("有没有空间更大一点的SUV车型", 'Automobile Recommendation Agent'),
+        ("这款车有什么贷款方案", 'Loan Scheme Suggestion Agent'),
+        ("首付比例是多少，月供多少", 'Loan Scheme Suggestion Agent'),
+        ("我想做贷款预审", 'Loan Pre-examination Agent'),
+        ("我叫张三，身份证号110101199003071234，手机号13800138000", 'Loan Pre-examination Agent'),
+        ("accept", 'Loan Pre-examination Agent'),
+    ],
+    # 编码
+    [
+        ("帮我写一段python代码，实现快速排序算法", 'Coding Agent'),
+        ("改成降序排列", 'Coding Agent'),
+        ("这段代码报错了：IndexError: list index out of range", 'Coding Agent'),
+        ("再写个Java版本的", 'Coding Agent'),
+    ],
+    # 闲聊后转入选车
+    [
+        ("你好", 'Chat Agent'),
+        ("给我讲个笑话", 'Chat Agent'),
+        ("推荐一款适合家用的车", 'Automobile Recommendation Agent'),
+        ("预算20万以内呢", 'Automobile Recommendation Agent'),
+    ],
+    # 直接咨询贷款
+    [
+        ("X3有什么金融方案", 'Loan Scheme Suggestion Agent'),
+        ("尾款比例是多少", 'Loan Scheme Suggestion Agent'),
+        ("帮我预审一下", 'Loan Pre-examination Agent'),
+    ],
+]
+
+# 桩Agent的回答文本，按chunk_chars个字符一块输出
+STUB_ANSWER = "根据您提供的信息，为您整理了以下内容，请确认是否符合您的需求。"
+
+
+class StubAgentExecutor(AgentExecutor):
+    """代替远端Agent的桩：不调用模型，按固定的TTFT与分块间隔流式返回回答。"""
+
+    def __init__(self, name: str, arrivals: Dict[str, Tuple[float, str]], ttft: float, chunk_interval: float,
+                 chunks: int, chunk_chars: int):
+        self.name = name
+        # session_id -> (收到请求的时间, Agent名称)，压测端据此计算路由耗时
+        self.arrivals = arrivals
+        self.ttft = ttft
+        self.chunk_interval = chunk_interval
+        self.chunks = chunks
+        self.chunk_chars = chunk_chars
+        self.running_tasks: Dict[str, asyncio.Task] = {}
+
+    async def execute(self, context: RequestContext, event_queue: EventQueue) -> None:
+        self.arrivals[context.metadata.get('session_id', '')] = (time.perf_counter(), self.name)
+        task = context.current_task
+        if not task:
+            task = new_task(context.message)
+            await event_queue.enqueue_event(task)
+        updater = TaskUpdater(event_queue, task.id, task.context_id)
+        self.running_tasks[task.id] = asyncio.current_task()
+        text = STUB_ANSWER * (self.chunks * self.chunk_chars // len(STUB_ANSWER) + 1)
+        try:
+            for i in range(self.chunks):
+                await asyncio.sleep(self.ttft if i == 0 else self.chunk_interval)
+                content = text[i * self.chunk_chars:(i + 1) * self.chunk_chars]
+                await updater.update_status(TaskState.working, new_agent_text_message(content, task.context_id, task.id))
+            await updater.add_artifact(parts=[Part(root=TextPart(text=text[:self.chunks * self.chunk_chars]))],
+                                       name="stub_result", last_chunk=True)
+            await updater.complete()
+        finally:
+            self.running_tasks.pop(task.id, None)
+
+    async def cancel(self, context: RequestContext, event_queue: EventQueue) -> None:
+        running_task = self.running_tasks.get(context.task_id)
+        if running_task and not running_task.done():
+            running_task.cancel()
+        await TaskUpdater(event_queue, context.task_id, context.context_id).cancel()
+
+
+async def start_stub_agents(arrivals: Dict[str, Tuple[float, str]],
+                            args: argparse.Namespace) -> List[Tuple[uvicorn.Server, asyncio.Task]]:
+    """Serve one stub agent per REMOTE_AGENTS entry in this process."""
+    servers = []
+    for agent_type, config in REMOTE_AGENTS.items():
+        card = STUB_CARDS[agent_type]
+        skill_name, skill_description, tags, examples = card['skill']
+        agent_card = AgentCard(
+            name=card['name'],
+            description=card['description'],
+            url=f"http://localhost:{config['port']}/",
+            capabilities=AgentCapabilities(streaming=True),
+            skills=[AgentSkill(id=agent_type, name=skill_name, description=skill_description, tags=tags,
+                               examples=examples)],
+            defaultInputModes=["text"],
+            defaultOutputModes=["text"],
+            version="1.0.0",
+        )
+        executor = StubAgentExecutor(card['name'], arrivals, args.ttft_ms / 1000, args.chunk_interval_ms / 1000,
+                                     args.chunks, args.chunk_chars)
+        app = A2AStarletteApplication(
+            agent_card=agent_card,
+            http_handler=DefaultRequestHandler(agent_executor=executor, task_store=InMemoryTaskStore()),
+        ).build()
+        server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=config['port'], log_level='warning',
+                                               access_log=False, backlog=4096))
+        # 由本进程统一处理Ctrl+C
+        server.install_signal_handlers = lambda: None
+        servers.append((server, asyncio.create_task(server.serve())))
+    while not all(server.started for server, _ in servers):
+        await asyncio.sleep(0.05)
+    return servers
+
+
+async def stop_stub_agents(servers: List[Tuple[uvicorn.Server, asyncio.Task]]) -> None:
+    for server, _ in servers:
+        server.should_exit = True
+    await asyncio.gather(*(task for _, task in servers), return_exceptions=True)
+
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {'p50': None, 'p90': None, 'p99': None}
+    return {'p50': round(percentile(values, 0.5), 3), 'p90': round(percentile(values, 0.9), 3),
+            'p99': round(percentile(values, 0.99), 3)}
+
+
+class TurnResult:
+    def __init__(self, session: int, turn: int, expected: str) -> None:
+        self.session = session
+        self.turn = turn
+        self.expected = expected
+        self.agent: Optional[str] = None
+        self.routing_ms: Optional[float] = None
+        self.ttft_ms: Optional[float] = None
+        self.duration_ms: Optional[float] = None
+        self.gaps_ms: List[float] = []
+        self.chunks = 0
+        self.completed = False
+        self.error: Optional[str] = None
+
+    @property
+    def chunk_rate(self) -> Optional[float]:
+        """Status events per second after the first one."""
+        if len(self.gaps_ms) < 1 or not sum(self.gaps_ms):
+            return None
+        return len(self.gaps_ms) / (sum(self.gaps_ms) / 1000)
+
+    def to_record(self) -> Dict[str, Any]:
+        return {
+            'kind': 'turn',
+            'session': self.session,
+            'turn': self.turn,
+            'expected': self.expected,
+            'agent': self.agent,
+            'routing_ms': self.routing_ms,
+            'ttft_ms': self.ttft_ms,
+            'duration_ms': self.duration_ms,
+            'chunks': self.chunks,
+            'completed': self.completed,
+            'error': self.error,
+        }
+
+
+async def run_turn(client: httpx.AsyncClient, url: str, session_id: str, user_input: str, result: TurnResult,
+                   arrivals: Dict[str, Tuple[float, str]]) -> None:
+    arrivals.pop(session_id, None)
+    started_at = last_at = time.perf_counter()
+    try:
+        async with client.stream('POST', url, json={'user_input': user_input, 'session_id': session_id}) as response:
+            if response.status_code != 200:
+                result.error = f"HTTP {response.status_code}"
+                return
+            async for line in response.aiter_lines():
+                if not line.startswith('data: '):
+                    continue
+                event = json.loads(line[len('data: '):])
+                if event.get('type') == 'status' and event.get('text'):
+                    now = time.perf_counter()
+                    result.chunks += 1
+                    if result.ttft_ms is None:
+                        result.ttft_ms = (now - started_at) * 1000
+                    else:
+                        result.gaps_ms.append((now - last_at) * 1000)
+                    last_at = now
+                elif event.get('type') == 'complete':
+                    result.completed = True
+                elif event.get('type') == 'error':
+                    result.error = event.get('text')
+    except Exception as e:
+        result.error = f"{type(e).__name__}: {e}"
+    finally:
+        result.duration_ms = (time.perf_counter() - started_at) * 1000
+        arrival = arrivals.pop(session_id, None)
+        if arrival:
+            result.routing_ms = (arrival[0] - started_at) * 1000
+            result.agent = arrival[1]
+        if not result.completed and not result.error:
+            result.error = "stream ended without a complete event"
+
+
+async def run_session(client: httpx.AsyncClient, url: str, session: int, think_time: float,
+                      arrivals: Dict[str, Tuple[float, str]]) -> List[TurnResult]:
+    script = SESSION_SCRIPTS[session % len(SESSION_SCRIPTS)]
+    session_id = f"loadtest-{uuid4()}"
+    results = []
+    for turn, (user_input, expected) in enumerate(script):
+        if turn:
+            # 用户阅读回答、输入下一句的时间
+            await asyncio.sleep(think_time * random.uniform(0.5, 1.5))
+        result = TurnResult(session, turn, expected)
+        await run_turn(client, url, session_id, user_input, result, arrivals)
+        results.append(result)
+    return results
+
+
+async def get_host_metrics(client: httpx.AsyncClient, base_url: str) -> Optional[Dict[str, Any]]:
+    try:
+        response = await client.get(f"{base_url}/metrics")
+        return response.json()
+    except Exception:
+        return None
+
+
+def read_rss_mb(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+async def sample_rss(pid: Optional[int], samples: List[float], interval: float = 0.5) -> None:
+    while pid:
+        rss = read_rss_mb(pid)
+        if rss is not None:
+            samples.append(rss)
+        await asyncio.sleep(interval)
+
+
+def start_host() -> subprocess.Popen:
+    os.makedirs('logs', exist_ok=True)
+    # uvicorn的访问日志写到stderr，写入文件，避免管道写满阻塞服务
+    # Keys.json中没有DASHSCOPE_API_KEY时使用占位值，避免启动时等待输入；脚本中的轮次都走本地路由
+    env = {'DASHSCOPE_API_KEY': 'loadtest', **os.environ}
+    with open(os.path.join('logs', 'loadtest_host_stderr.log'), 'wb') as stderr:
+        return subprocess.Popen([sys.executable, '__main__.py'], env=env, stdin=subprocess.DEVNULL,
+                                stdout=subprocess.DEVNULL, stderr=stderr)
+
+
+def stop_host(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+async def wait_host_ready(client: httpx.AsyncClient, base_url: str, process: Optional[subprocess.Popen],
+                          timeout: float = 60) -> bool:
+    """Wait until the host serves /metrics and every stub agent is registered and healthy."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process and process.poll() is not None:
+            return False
+        metrics = await get_host_metrics(client, base_url)
+        if metrics and sum(agent['healthy'] for agent in metrics['agents'].values()) >= len(REMOTE_AGENTS):
+            return True
+        await asyncio.sleep(0.5)
+    return False
+
+
+def raise_fd_limit() -> None:
+    # 每个会话在本进程占用两个连接（压测端与桩Agent），在Host中占用两个
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+
+def build_summary(args: argparse.Namespace, results: List[TurnResult], elapsed: float, loadgen_cpu: float,
+                  before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]],
+                  rss_samples: List[float]) -> Dict[str, Any]:
+    routed = [r for r in results if r.routing_ms is not None]
+    ok = [r for r in results if r.completed and not r.error]
+    errors: Dict[str, int] = {}
+    for r in results:
+        if r.error:
+            errors[r.error[:120]] = errors.get(r.error[:120], 0) + 1
+    summary: Dict[str, Any] = {
+        'kind': 'summary',
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'config': {
+            'sessions': args.sessions,
+            'concurrency': args.concurrency,
+            'think_time': args.think_time,
+            'ttft_ms': args.ttft_ms,
+            'chunk_interval_ms': args.chunk_interval_ms,
+            'chunks': args.chunks,
+        },
+        'elapsed_s': round(elapsed, 2),
+        'turns': len(results),
+        'turns_per_s': round(len(results) / elapsed, 2),
+        'error_rate': round(1 - len(ok) / len(results), 4) if results else None,
+        'errors': dict(sorted(errors.items(), key=lambda item: -item[1])[:5]),
+        'misrouted': sum(r.agent != r.expected for r in routed),
+        'routing_ms': summarize([r.routing_ms for r in routed]),
+        'ttft_ms': summarize([r.ttft_ms for r in ok if r.ttft_ms is not None]),
+        'chunk_gap_ms': summarize([gap for r in ok for gap in r.gaps_ms]),
+        'chunk_rate_per_s': summarize([r.chunk_rate for r in ok if r.chunk_rate]),
+        # 压测进程（含桩Agent）自身的CPU占用，接近1时测得的延迟包含压测端的排队
+        'loadgen_cpu_utilization': round(loadgen_cpu / elapsed, 3),
+        'host': {},
+    }
+    if after:
+        summary['host']['routing_time'] = after['query'].get('routing_time')
+        summary['host']['llm_routed'] = after['router']['model_time']['count'] - (
+            before['router']['model_time']['count'] if before else 0)
+    if before and after and before.get('cpu_seconds') is not None and after.get('cpu_seconds') is not None:
+        cpu = after['cpu_seconds'] - before['cpu_seconds']
+        summary['host']['cpu_ms_per_turn'] = round(cpu / len(results) * 1000, 3) if results else None
+        summary['host']['cpu_utilization'] = round(cpu / elapsed, 3)
+    if rss_samples:
+        summary['host']['rss_mb_start'] = round(rss_samples[0], 1)
+        summary['host']['rss_mb_peak'] = round(max(rss_samples), 1)
+    return summary
+
+
+def previous_summary(path: str, config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Find the last summary recorded with the same settings."""
+    previous = None
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get('kind') == 'summary' and record.get('config') == config:
+                previous = record
+    return previous
+
+
+def print_summary(summary: Dict[str, Any], previous: Optional[Dict[str, Any]]) -> None:
+    def fmt(values: Dict[str, Optional[float]], unit: str = 'ms') -> str:
+        return ' '.join(f"{key}={value:.1f}{unit}" if value is not None else f"{key}=n/a"
+                        for key, value in values.items())
+
+    print(f"turns: {summary['turns']} in {summary['elapsed_s']}s ({summary['turns_per_s']}/s), "
+          f"error rate {summary['error_rate']:.2%}, misrouted {summary['misrouted']}")
+    print(f"  routing      {fmt(summary['routing_ms'])}")
+    print(f"  ttft         {fmt(summary['ttft_ms'])}")
+    print(f"  chunk gap    {fmt(summary['chunk_gap_ms'])}")
+    print(f"  chunk rate   {fmt(summary['chunk_rate_per_s'], '/s')}")
+    print(f"  host         {json.dumps(summary['host'], ensure_ascii=False)}")
+    if summary['loadgen_cpu_utilization'] > 0.9:
+        print(f"  warning: the load generator used {summary['loadgen_cpu_utilization']:.0%} of a core, "
+              f"latencies include its own queueing")
+    for error, count in summary['errors'].items():
+        print(f"  error x{count}: {error}")
+    if previous:
+        print(f"compared with {previous['timestamp']}:")
+        for metric in ('routing_ms', 'ttft_ms', 'chunk_gap_ms'):
+            for key in ('p50', 'p99'):
+                old, new = previous[metric].get(key), summary[metric].get(key)
+                if old and new is not None:
+                    print(f"  {metric} {key}: {old:.1f} -> {new:.1f} ({(new - old) / old:+.1%})")
+        print(f"  error_rate: {previous['error_rate']:.2%} -> {summary['error_rate']:.2%}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=2000, help="number of scripted user sessions")
+    parser.add_argument('--concurrency', type=int, default=1000, help="sessions open at the same time")
+    parser.add_argument('--think-time', type=float, default=1.0, help="average seconds between turns")
+    parser.add_argument('--ttft-ms', type=float, default=300, help="stub agent time to the first chunk")
+    parser.add_argument('--chunk-interval-ms', type=float, default=50, help="stub agent time between chunks")
+    parser.add_argument('--chunks', type=int, default=20, help="chunks per stub answer")
+    parser.add_argument('--chunk-chars', type=int, default=8, help="characters per chunk")
+    parser.add_argument('--output', default='loadtest_results.jsonl', help="JSONL file the results are appended to")
+    parser.add_argument('--record-turns', action='store_true', help="also record every turn")
+    parser.add_argument('--no-start', action='store_true', help="use a host that is already running")
+    parser.add_argument('--host-pid', type=int, help="pid of a running host, for memory sampling")
+    args = parser.parse_args()
+
+    raise_fd_limit()
+    arrivals: Dict[str, Tuple[float, str]] = {}
+    servers = await start_stub_agents(arrivals, args)
+    base_url = f"http://localhost:{API_CONFIG['port']}"
+    process = None if args.no_start else start_host()
+    pid = process.pid if process else args.host_pid
+    # 空闲连接在Host（uvicorn默认5秒）关闭之前过期，避免复用正被关闭的连接导致ReadError
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency,
+                          keepalive_expiry=2)
+    try:
+        async with httpx.AsyncClient(timeout=httpx.Timeout(120, pool=None), limits=limits) as client:
+            if not await wait_host_ready(client, base_url, process):
+                print("host not ready, see logs/loadtest_host_stderr.log")
+                return
+            url = f"{base_url}/stream-query"
+            # 预热：首次请求的导入、连接建立不计入结果
+            await run_session(client, url, 0, 0, arrivals)
+            rss_samples: List[float] = []
+            sampler = asyncio.create_task(sample_rss(pid, rss_samples))
+            before = await get_host_metrics(client, base_url)
+            semaphore = asyncio.Semaphore(args.concurrency)
+
+            async def bounded(session: int) -> List[TurnResult]:
+                async with semaphore:
+                    return await run_session(client, url, session, args.think_time, arrivals)
+
+            started_at = time.perf_counter()
+            cpu_started_at = time.process_time()
+            sessions = await asyncio.gather(*(bounded(session) for session in range(args.sessions)))
+            elapsed = time.perf_counter() - started_at
+            loadgen_cpu = time.process_time() - cpu_started_at
+            after = await get_host_metrics(client, base_url)
+            sampler.cancel()
+    finally:
+        if process:
+            stop_host(process)
+        await stop_stub_agents(servers)
+
+    results = [result for turns in sessions for result in turns]
+    summary = build_summary(args, results, elapsed, loadgen_cpu, before, after, rss_samples)
+    previous = previous_summary(args.output, summary['config'])
+    with open(args.output, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(summary, ensure_ascii=False) + '\n')
+        if args.record_turns:
+            for result in results:
+                f.write(json.dumps(result.to_record(), ensure_ascii=False) + '\n')
+    print_summary(summary, previous)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
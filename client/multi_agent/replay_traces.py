@@ -0,0 +1,188 @@
+"""Replay recorded conversations against the host's /stream-query endpoint and compare latency and CPU.
+
+Recording: start the host and the agents with TRACE_ENABLED=1. The host appends every turn to
+logs/traces.jsonl: the user input, the routing decision and each event sent to the browser with
+its time. Each agent appends its side of the turn to its own logs/traces.jsonl: model calls with
+token timings, and tool calls with their arguments, results and durations. Set
+TRACE_CONFIG['sample_rate'] to record a share of the sessions.
+
+Replay:
+1. Start every agent with MODEL_PROVIDER=replay and REPLAY_TRACES=<that agent's recording>.
+   Model and tool answers then come from the recording, so DashScope, MySQL, MongoDB and the MCP
+   server are not needed. REPLAY_SPEED divides the recorded model and tool latency; 0 answers at
+   once.
+2. Start the host of the release under test.
+3. Run:
+    python replay_traces.py logs/traces.jsonl [--speed 1] [--output replay_results.jsonl]
+
+Sessions start at their recorded offsets and keep the recorded think time between turns. Both are
+divided by --speed, and --speed 0 starts all sessions at once with no pauses. Session IDs get a
+run prefix, so every replay starts with empty agent state. The agents find the recorded answers by
+conversation content, not by session ID. A turn routed to a different agent than in the recording
+finds no recorded answer there and counts as an error.
+
+Each run appends a summary record to --output with:
+- recorded and replayed TTFT and turn duration
+- the error rate
+- the host's CPU per turn, from cpu_seconds in /metrics
+The summary is compared with the last earlier replay of the same trace at the same speed.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+import httpx
+from loadtest_stream_query import TurnResult, get_host_metrics, previous_summary, run_turn, summarize
+from src.config.settings import API_CONFIG
+
+
+def load_sessions(path: str, limit: Optional[int] = None) -> List[List[Dict[str, Any]]]:
+    """Group the recorded host turns by session, in recorded order."""
+    sessions: Dict[str, List[Dict[str, Any]]] = {}
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            if record.get('kind') == 'host_turn':
+                sessions.setdefault(record['session_id'], []).append(record)
+    ordered = sorted((sorted(turns, key=lambda turn: turn['timestamp']) for turns in sessions.values()),
+                     key=lambda turns: turns[0]['timestamp'])
+    return ordered[:limit] if limit else ordered
+
+
+def recorded_ttft_ms(turn: Dict[str, Any]) -> Optional[float]:
+    for offset, event_type, text in turn['events']:
+        if event_type == 'status' and text:
+            return offset
+    return None
+
+
+async def replay_session(client: httpx.AsyncClient, url: str, run_id: str, index: int, turns: List[Dict[str, Any]],
+                         origin: float, started_at: float, speed: float) -> List[TurnResult]:
+    session_id = f"{run_id}-{turns[0]['session_id']}"
+    if speed:
+        await asyncio.sleep(max(0.0, started_at + (turns[0]['timestamp'] - origin) / speed - time.perf_counter()))
+    results = []
+    for i, turn in enumerate(turns):
+        if i and speed:
+            # 录制中上一轮结束到这一轮开始的间隔，即用户的阅读与输入时间
+            previous = turns[i - 1]
+            think_time = turn['timestamp'] - previous['timestamp'] - previous['duration_ms'] / 1000
+            await asyncio.sleep(max(0.0, think_time) / speed)
+        result = TurnResult(index, i, turn['agent'])
+        await run_turn(client, url, session_id, turn['user_input'], result, {})
+        results.append(result)
+    return results
+
+
+def build_summary(args: argparse.Namespace, sessions: List[List[Dict[str, Any]]], results: List[TurnResult],
+                  elapsed: float, before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    recorded = [turn for turns in sessions for turn in turns if turn['status'] == 'completed']
+    ok = [r for r in results if r.completed and not r.error]
+    errors: Dict[str, int] = {}
+    for r in results:
+        if r.error:
+            errors[r.error[:120]] = errors.get(r.error[:120], 0) + 1
+    summary: Dict[str, Any] = {
+        'kind': 'summary',
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'config': {'trace': os.path.basename(args.trace), 'sessions': len(sessions), 'speed': args.speed},
+        'elapsed_s': round(elapsed, 2),
+        'turns': len(results),
+        'error_rate': round(1 - len(ok) / len(results), 4) if results else None,
+        'errors': dict(sorted(errors.items(), key=lambda item: -item[1])[:5]),
+        'ttft_ms': {
+            'recorded': summarize([ttft for ttft in map(recorded_ttft_ms, recorded) if ttft is not None]),
+            'replayed': summarize([r.ttft_ms for r in ok if r.ttft_ms is not None]),
+        },
+        'duration_ms': {
+            'recorded': summarize([turn['duration_ms'] for turn in recorded]),
+            'replayed': summarize([r.duration_ms for r in ok]),
+        },
+        'host': {},
+    }
+    if after:
+        summary['host']['routing_time'] = after['query'].get('routing_time')
+    if before and after and before.get('cpu_seconds') is not None and after.get('cpu_seconds') is not None:
+        cpu = after['cpu_seconds'] - before['cpu_seconds']
+        summary['host']['cpu_ms_per_turn'] = round(cpu / len(results) * 1000, 3) if results else None
+        summary['host']['cpu_utilization'] = round(cpu / elapsed, 3)
+    return summary
+
+
+def print_summary(summary: Dict[str, Any], previous: Optional[Dict[str, Any]]) -> None:
+    def fmt(values: Dict[str, Optional[float]]) -> str:
+        return ' '.join(f"{key}={value:.1f}ms" if value is not None else f"{key}=n/a" for key, value in values.items())
+
+    print(f"replayed {summary['turns']} turns of {summary['config']['sessions']} sessions in {summary['elapsed_s']}s, "
+          f"error rate {summary['error_rate']:.2%}")
+    for metric in ('ttft_ms', 'duration_ms'):
+        print(f"  {metric:<12} recorded {fmt(summary[metric]['recorded'])}")
+        print(f"  {'':<12} replayed {fmt(summary[metric]['replayed'])}")
+    print(f"  host         {json.dumps(summary['host'], ensure_ascii=False)}")
+    for error, count in summary['errors'].items():
+        print(f"  error x{count}: {error}")
+    if previous:
+        print(f"compared with {previous['timestamp']}:")
+        for metric in ('ttft_ms', 'duration_ms'):
+            for key in ('p50', 'p99'):
+                old, new = previous[metric]['replayed'].get(key), summary[metric]['replayed'].get(key)
+                if old and new is not None:
+                    print(f"  {metric} {key}: {old:.1f} -> {new:.1f} ({(new - old) / old:+.1%})")
+        old, new = previous['host'].get('cpu_ms_per_turn'), summary['host'].get('cpu_ms_per_turn')
+        if old and new is not None:
+            print(f"  cpu_ms_per_turn: {old:.2f} -> {new:.2f} ({(new - old) / old:+.1%})")
+        print(f"  error_rate: {previous['error_rate']:.2%} -> {summary['error_rate']:.2%}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('trace', help="the host's trace file (JSONL, optionally .gz)")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="divide the recorded session offsets and think times by this; 0 for no waiting")
+    parser.add_argument('--limit', type=int, help="replay only the first N sessions")
+    parser.add_argument('--output', default='replay_results.jsonl', help="JSONL file the summary is appended to")
+    parser.add_argument('--record-turns', action='store_true', help="also record every replayed turn")
+    args = parser.parse_args()
+
+    sessions = load_sessions(args.trace, args.limit)
+    if not sessions:
+        print(f"no host turns in {args.trace}")
+        return
+    base_url = f"http://localhost:{API_CONFIG['port']}"
+    url = f"{base_url}/stream-query"
+    run_id = f"replay-{uuid4().hex[:8]}"
+    # 空闲连接在Host（uvicorn默认5秒）关闭之前过期，避免复用正被关闭的连接导致ReadError
+    limits = httpx.Limits(max_connections=len(sessions), max_keepalive_connections=len(sessions), keepalive_expiry=2)
+    async with httpx.AsyncClient(timeout=httpx.Timeout(120, pool=None), limits=limits) as client:
+        before = await get_host_metrics(client, base_url)
+        if before is None:
+            print(f"host not reachable at {base_url}")
+            return
+        origin = sessions[0][0]['timestamp']
+        started_at = time.perf_counter()
+        replayed = await asyncio.gather(*(
+            replay_session(client, url, run_id, index, turns, origin, started_at, args.speed)
+            for index, turns in enumerate(sessions)
+        ))
+        elapsed = time.perf_counter() - started_at
+        after = await get_host_metrics(client, base_url)
+
+    results = [result for turns in replayed for result in turns]
+    summary = build_summary(args, sessions, results, elapsed, before, after)
+    previous = previous_summary(args.output, summary['config'])
+    with open(args.output, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(summary, ensure_ascii=False) + '\n')
+        if args.record_turns:
+            for result in results:
+                f.write(json.dumps(result.to_record(), ensure_ascii=False) + '\n')
+    print_summary(summary, previous)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
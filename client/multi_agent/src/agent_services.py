@@ -1,9 +1,16 @@
 # services/agent_services.py
-from typing import Dict, List, Optional, AsyncGenerator
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set, Tuple, AsyncGenerator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+import hashlib
+import random
+import asyncio
+import time
 import httpx
-from a2a.client import A2ACardResolver, A2AClient
+from a2a.client import A2ACardResolver, A2AClient, A2AClientHTTPError
 from a2a.types import (
     AgentCard, 
+    CancelTaskRequest,
     Message, 
     Part, 
     Role, 
@@ -12,12 +19,19 @@ from a2a.types import (
     MessageSendConfiguration, 
     MessageSendParams, 
     SendStreamingMessageRequest, 
+    Task,
+    TaskIdParams,
     TaskStatusUpdateEvent
 )
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_openai import ChatOpenAI
 from langchain_core.output_parsers import StrOutputParser
 from src.config.load_key import load_key
+from src.config.settings import REGISTRY_CONFIG, ROUTER_CONFIG
+from src.intent_router import IntentRouter
+from src.session_routes import SessionRouteStore
+from src.trace_recorder import TraceRecorder
+from src.metrics import LatencyStats
 from uuid import uuid4
 import logging.config
 import os
@@ -26,15 +40,44 @@ log_config_path = os.path.abspath("src/config/logging.conf")
 logging.config.fileConfig(log_config_path, encoding='utf-8')
 logger = logging.getLogger(__name__)
 
+@dataclass
+class AgentEndpoint:
+    """单个Agent副本地址的健康状态与负载。"""
+    url: str
+    session_affinity: bool = False
+    name: Optional[str] = None
+    client: Optional[A2AClient] = None
+    healthy: bool = False
+    failures: int = 0
+    consecutive_errors: int = 0
+    in_flight: int = 0
+    next_check: float = 0.0
+
+
 class AgentRegistry:
     """Agent注册和发现服务。
 
-    提供注册和列出Agent的功能。
+    提供注册和列出Agent的功能。注册并发进行，后台定期刷新Agent名片，
+    对失败的Agent按指数退避重试，不健康的Agent不参与路由。
+    同一个Agent（名片name相同）可以有多个副本地址，按最少在途请求数选择副本，
+    也可以按session_id一致性哈希选择；连续失败的副本会被摘除。
     """
-    def __init__(self, http_client: httpx.AsyncClient):
+    def __init__(self, http_client: httpx.AsyncClient,
+                 card_timeout: float = REGISTRY_CONFIG['card_timeout'],
+                 refresh_interval: float = REGISTRY_CONFIG['refresh_interval'],
+                 retry_base: float = REGISTRY_CONFIG['retry_base'],
+                 retry_max: float = REGISTRY_CONFIG['retry_max'],
+                 eject_after: int = REGISTRY_CONFIG['eject_after']):
         self.http_client = http_client
         self.agents: Dict[str, AgentCard] = {}
-        self.clients: Dict[str, A2AClient] = {}
+        self.endpoints: Dict[str, AgentEndpoint] = {}
+        self.card_timeout = card_timeout
+        self.refresh_interval = refresh_interval
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.eject_after = eject_after
+        self.listeners: List[Callable[[List[AgentCard]], None]] = []
+        self._refresh_task: Optional[asyncio.Task] = None
 
     async def register_agent(self, url: str) -> Optional[AgentCard]:
         """Register an agent by resolving its card.
@@ -45,48 +88,207 @@ class AgentRegistry:
         Returns:
             Optional[AgentCard]: The registered AgentCard or None if registration fails.
         """
+        endpoint = self.endpoints.setdefault(url, AgentEndpoint(url=url))
         try:
             resolver = A2ACardResolver(self.http_client, url)
             try:
-                card = await resolver.get_agent_card()
+                card = await asyncio.wait_for(resolver.get_agent_card(), timeout=self.card_timeout)
             except Exception as e:
-                logger.error(f"❌ Error retrieving agent card: {e}", exc_info=True)
+                logger.error(f"❌ Error retrieving agent card from {url}: {e!r}")
+                self._mark_failed(endpoint)
                 return None
             card.url = url
 
-            # Create A2A client for this agent
-            client = A2AClient(self.http_client, agent_card=card)
-
-            self.agents[card.name] = card
-            self.clients[card.name] = client
-
-            logger.info(f"📋 Registered agent: {card.name}")
-            logger.info(f"   Description: {card.description}")
-            logger.info(f"   URL: {url}")
+            # 同一Agent的各副本名片仅url不同，比较时忽略url
+            known_card = self.agents.get(card.name)
+            changed = known_card is None or known_card.model_dump(exclude={'url'}) != card.model_dump(exclude={'url'})
+            if changed:
+                self.agents[card.name] = card
+            if endpoint.client is None or endpoint.name != card.name or changed:
+                # Create A2A client for this agent
+                endpoint.client = A2AClient(self.http_client, agent_card=card)
+
+                logger.info(f"📋 Registered agent: {card.name}")
+                logger.info(f"   Description: {card.description}")
+                logger.info(f"   URL: {url}")
+
+            if not endpoint.healthy and endpoint.failures:
+                logger.info(f"✅ Agent recovered: {card.name} ({url})")
+            endpoint.name = card.name
+            endpoint.healthy = True
+            endpoint.failures = 0
+            endpoint.consecutive_errors = 0
+            endpoint.next_check = time.monotonic() + self.refresh_interval
+            if changed:
+                self._notify_listeners()
 
             return card
 
         except Exception as e:
             logger.error(f"❌ Failed to register agent at {url}: {e}", exc_info=True)
+            self._mark_failed(endpoint)
+            return None
+
+    def add_endpoint(self, url: str, session_affinity: bool = False) -> AgentEndpoint:
+        """Declare a replica URL before registration.
+
+        Args:
+            url (str): The URL of the agent replica.
+            session_affinity (bool): Pick replicas of this agent by consistent hashing on session_id.
+
+        Returns:
+            AgentEndpoint: The endpoint state of the replica.
+        """
+        endpoint = self.endpoints.setdefault(url, AgentEndpoint(url=url))
+        endpoint.session_affinity = session_affinity
+        return endpoint
+
+    async def register_agents(self, urls: List[str]) -> List[Optional[AgentCard]]:
+        """Register several agents concurrently.
+
+        Startup time is bounded by the slowest card resolution (at most card_timeout),
+        not by the number of agents. Failed agents are retried by the background refresher.
+
+        Args:
+            urls (List[str]): The URLs of the agents to register.
+
+        Returns:
+            List[Optional[AgentCard]]: The registered AgentCards, None for failed ones.
+        """
+        return await asyncio.gather(*(self.register_agent(url) for url in urls))
+
+    def start_refresh(self) -> None:
+        """Start the background task that refreshes cards and retries failed agents."""
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop_refresh(self) -> None:
+        """Stop the background refresh task."""
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+    def add_listener(self, listener: Callable[[List[AgentCard]], None]) -> None:
+        """Register a callback invoked with all cards whenever a card is added or changed."""
+        self.listeners.append(listener)
+
+    def pick_endpoint(self, agent_name: str, session_id: Optional[str] = None) -> Optional[AgentEndpoint]:
+        """Pick a healthy replica of the agent.
+
+        Replicas are picked by least outstanding requests; for agents configured with
+        session_affinity the replica is chosen by rendezvous hashing on session_id.
+
+        Args:
+            agent_name (str): The name of the agent.
+            session_id (Optional[str]): The session ID used for consistent hashing.
+
+        Returns:
+            Optional[AgentEndpoint]: The chosen replica, or None if no replica is healthy.
+        """
+        candidates = [
+            endpoint for endpoint in self.endpoints.values()
+            if endpoint.name == agent_name and endpoint.healthy and endpoint.client
+        ]
+        if not candidates:
             return None
+        if session_id and all(endpoint.session_affinity for endpoint in candidates):
+            # 最高随机权重哈希：副本增减时只有少量会话迁移
+            return max(candidates, key=lambda endpoint: hashlib.md5(
+                f"{session_id}|{endpoint.url}".encode('utf-8')).digest())
+        least = min(endpoint.in_flight for endpoint in candidates)
+        return random.choice([endpoint for endpoint in candidates if endpoint.in_flight == least])
+
+    @asynccontextmanager
+    async def lease(self, agent_name: str, session_id: Optional[str] = None) -> AsyncIterator[Optional[AgentEndpoint]]:
+        """Pick a replica and count the request as in flight while the context is open.
+
+        Connection errors raised inside the context count towards ejecting the replica.
+
+        Args:
+            agent_name (str): The name of the agent.
+            session_id (Optional[str]): The session ID used for consistent hashing.
+
+        Yields:
+            Optional[AgentEndpoint]: The chosen replica, or None if no replica is healthy.
+        """
+        endpoint = self.pick_endpoint(agent_name, session_id)
+        if endpoint is None:
+            yield None
+            return
+        endpoint.in_flight += 1
+        try:
+            yield endpoint
+            endpoint.consecutive_errors = 0
+        except (httpx.HTTPError, A2AClientHTTPError):
+            endpoint.consecutive_errors += 1
+            if endpoint.consecutive_errors >= self.eject_after:
+                # 连续失败的副本摘除，由后台刷新按退避重试
+                self._mark_failed(endpoint)
+            raise
+        finally:
+            endpoint.in_flight -= 1
 
     def list_agents(self) -> List[Dict[str, str]]:
-        """List all registered agents.
+        """List all registered and healthy agents.
 
         Returns:
             List[Dict[str, str]]: List of dictionaries containing agent details.
         """
+        healthy_names = {endpoint.name for endpoint in self.endpoints.values() if endpoint.healthy}
         return [
             {'name': card.name, 'description': card.description, 'url': card.url}
             for card in self.agents.values()
+            if card.name in healthy_names
         ]
 
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Get the health state of every agent endpoint."""
+        return {
+            url: {
+                'name': endpoint.name,
+                'healthy': endpoint.healthy,
+                'failures': endpoint.failures,
+                'in_flight': endpoint.in_flight,
+            }
+            for url, endpoint in self.endpoints.items()
+        }
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            now = time.monotonic()
+            due = [url for url, endpoint in self.endpoints.items() if endpoint.next_check <= now]
+            if due:
+                await asyncio.gather(*(self.register_agent(url) for url in due))
+            next_check = min((endpoint.next_check for endpoint in self.endpoints.values()),
+                             default=now + self.refresh_interval)
+            await asyncio.sleep(max(0.1, next_check - time.monotonic()))
+
+    def _mark_failed(self, endpoint: AgentEndpoint) -> None:
+        if endpoint.healthy:
+            logger.warning(f"⚠️ Agent marked unhealthy: {endpoint.name} ({endpoint.url})")
+        endpoint.healthy = False
+        endpoint.failures += 1
+        backoff = min(self.retry_max, self.retry_base * 2 ** (endpoint.failures - 1))
+        endpoint.next_check = time.monotonic() + backoff
+
+    def _notify_listeners(self) -> None:
+        cards = list(self.agents.values())
+        for listener in self.listeners:
+            try:
+                listener(cards)
+            except Exception as e:
+                logger.error(f"❌ Agent registry listener failed: {e}", exc_info=True)
+
 class AgentSelector:
     """Agent选择服务。
 
     使用LLM选择最合适的Agent来处理用户请求。
     """
-    def __init__(self):
+    def __init__(self, max_concurrency: int = ROUTER_CONFIG['max_concurrency'], timeout: float = ROUTER_CONFIG['timeout']):
         # 初始化时仅创建LLM实例（可复用，配置固定）
         self.llm = ChatOpenAI(
             base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
@@ -94,6 +296,16 @@ class AgentSelector:
             model="qwen-plus",
         )
         self.parser = StrOutputParser()  # 输出解析器可复用
+        # 限制同时进行的路由LLM调用数，超出的请求排队等待
+        self.max_concurrency = max_concurrency
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.timeout = timeout
+        # 路由指标：排队耗时 vs 模型耗时
+        self.queue_time = LatencyStats()
+        self.model_time = LatencyStats()
+        self.timeouts = 0
+        self.errors = 0
+        self.in_flight = 0
 
     async def select_agent(self, user_query: str, available_agents: List[Dict[str, str]]) -> Optional[str]:
         """Select the best agent for the user query using LLM.
@@ -131,21 +343,126 @@ class AgentSelector:
                 ("user", "{text}")
             ])
             chain = prompt_template | self.llm | self.parser
-            selected_agent_name = chain.invoke({"text": user_query})
+            # 超时同时覆盖排队与模型调用，排队过久的请求不会超出路由预算
+            selected_agent_name = await asyncio.wait_for(self._invoke(chain, user_query), timeout=self.timeout)
             return selected_agent_name.strip()
 
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            logger.error(f"❌ Agent selection timed out after {self.timeout}s")
+            return None
         except Exception as e:
+            self.errors += 1
             logger.error(f"❌ Error selecting agent with LLM: {e}", exc_info=True)
             return None
 
+    async def _invoke(self, chain: Any, user_query: str) -> str:
+        queued_at = time.perf_counter()
+        async with self.semaphore:
+            started_at = time.perf_counter()
+            self.queue_time.observe(started_at - queued_at)
+            self.in_flight += 1
+            try:
+                # 使用异步调用，避免阻塞事件循环
+                return await chain.ainvoke({"text": user_query})
+            finally:
+                self.in_flight -= 1
+                self.model_time.observe(time.perf_counter() - started_at)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get the routing metrics.
+
+        Returns:
+            Dict[str, Any]: Queue time and model time statistics, timeout and error counts.
+        """
+        return {
+            'in_flight': self.in_flight,
+            'queue_time': self.queue_time.snapshot(),
+            'model_time': self.model_time.snapshot(),
+            'timeouts': self.timeouts,
+            'errors': self.errors,
+        }
+
+@dataclass
+class StreamState:
+    """上游A2A流的状态，用于断开时取消远端任务。"""
+    task_id: Optional[str] = None
+    completed: bool = False
+
+
+class SpeculativeStream:
+    """投机执行的Agent流。
+
+    在后台消费Agent的流式响应并缓存，路由确认后再按顺序回放；路由不一致时取消。
+    投机请求使用独立的检查点线程thread_id，被丢弃时不会写入会话的对话历史。
+    """
+    def __init__(self, agent_name: str, thread_id: str, source: AsyncGenerator[Dict, None]):
+        self.agent_name = agent_name
+        self.thread_id = thread_id
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.chunks = 0
+        # 已生成内容的字符数（Host无法得知token数，内容块在远端已合并）
+        self.chars = 0
+        self.task = asyncio.create_task(self._pump(source))
+
+    async def _pump(self, source: AsyncGenerator[Dict, None]) -> None:
+        try:
+            async for chunk in source:
+                self.chunks += 1
+                if chunk.get('type') == 'status':
+                    self.chars += len(chunk.get('text') or '')
+                self.queue.put_nowait(chunk)
+        except Exception as e:
+            logger.error(f"❌ Speculative stream to {self.agent_name} failed: {e}", exc_info=True)
+            self.queue.put_nowait({"type": "error", "text": f"Error processing streaming response: {e}"})
+        finally:
+            self.queue.put_nowait(None)
+
+    async def stream(self) -> AsyncGenerator[Dict, None]:
+        """Replay the buffered chunks, then keep streaming until the source is exhausted."""
+        try:
+            while (chunk := await self.queue.get()) is not None:
+                yield chunk
+        finally:
+            await self.cancel()
+
+    async def cancel(self) -> None:
+        """Cancel the background stream and close the upstream connection."""
+        if not self.task.done():
+            self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+
+
 class AgentQueryService:
     """统一查询处理服务。
 
     处理用户查询并将请求路由到适当的Agent。
+    开启投机执行（ROUTER_CONFIG['speculative']）时，在LLM路由决策的同时向本地意图路由的首选Agent发起请求，
+    路由一致则直接使用已缓存的输出，不一致则取消。投机执行只用于没有历史的新会话（需要会话路由存储），
+    投机请求在独立的检查点线程中执行：被丢弃时会话线程不受影响，命中时会话此后沿用该线程。
     """
-    def __init__(self, registry: AgentRegistry, selector: AgentSelector):
+    def __init__(self, registry: AgentRegistry, selector: AgentSelector, intent_router: Optional[IntentRouter] = None,
+                 session_routes: Optional[SessionRouteStore] = None,
+                 speculative: bool = ROUTER_CONFIG['speculative'],
+                 tracer: Optional[TraceRecorder] = None):
         self.registry = registry
         self.selector = selector
+        self.intent_router = intent_router
+        self.session_routes = session_routes
+        self.speculative = speculative
+        # 对话录制（TRACE_CONFIG），未开启时不记录
+        self.tracer = tracer or TraceRecorder(enabled=False)
+        self.sticky_hits = 0
+        self.topic_switches = 0
+        self.speculation_hits = 0
+        self.speculation_misses = 0
+        self.wasted_chunks = 0
+        self.wasted_chars = 0
+        self.abandoned_streams = 0
+        self.remote_cancels = 0
+        # 从收到请求到确定Agent的耗时（含会话亲和、本地意图路由与LLM路由）
+        self.routing_time = LatencyStats()
+        self._background_tasks: Set[asyncio.Task] = set()
 
     # 流式处理方法
     async def handle_stream_query(self, user_input: str, session_id: str) -> AsyncGenerator[Dict, None]:
@@ -158,57 +475,222 @@ class AgentQueryService:
         Yields:
             Dict: 查询结果的字典。
         """
+        trace = self.tracer.start_turn(session_id, user_input)
+        status = "canceled"
         try:
             # 1. 获取可用Agent列表
             available_agents = self.registry.list_agents()
 
             if not available_agents:
                 logger.error("No agents available")
+                status = "failed"
                 yield {"type": "error", "text": "No agents available"}
                 return
 
-            # 2. 选择Agent
-            selected_agent_name = await self.selector.select_agent(user_input, available_agents)
+            # 2. 选择Agent：会话亲和/本地意图路由，必要时再由LLM选择（可投机执行）
+            agent_names = [agent['name'] for agent in available_agents]
+            stream = None
+            started_at = time.perf_counter()
+            # 会话在远端的检查点线程，None表示新会话
+            thread_id = await self.session_routes.get_thread(session_id) if self.session_routes else session_id
+            selected_agent_name = await self._route_locally(user_input, agent_names, session_id)
+            if not selected_agent_name:
+                selected_agent_name, speculative = await self._route_with_llm(
+                    user_input, available_agents, session_id, new_session=thread_id is None
+                )
+                if speculative:
+                    stream, thread_id = speculative.stream(), speculative.thread_id
+            thread_id = thread_id or session_id
             if not selected_agent_name:
                 logger.error("No suitable agent found")
+                status = "failed"
                 yield {"type": "error", "text": "No suitable agent found"}
                 return
-
-            # 3. 获取Agent客户端
-            client = self.registry.clients.get(selected_agent_name)
-            if not client:
-                logger.error(f"Agent client not found: {selected_agent_name}")
-                yield {"type": "error", "text": f"Agent client not found: {selected_agent_name}"}
-                return
-
-            # 4. 构建消息
-            message = Message(
-                role=Role.user,
-                parts=[Part(root=TextPart(text=user_input))],
-                messageId=str(uuid4()),
-            )
-            payload = MessageSendParams(
-                id=str(uuid4()),
-                message=message,
-                configuration=MessageSendConfiguration(
-                    acceptedOutputModes=['text', 'text/plain'],
-                ),
-                metadata={"session_id": session_id}
-            )
-            # 5. 流式处理响应(流式传输需要每一层（Remote → Host → Client）都支持逐字/分片处理,代码需要修改)
-            async for chunk in self._process_streaming_response(client, payload):
+            self.routing_time.observe(time.perf_counter() - started_at)
+            trace.routed(selected_agent_name)
+            if self.session_routes:
+                await self.session_routes.set(session_id, selected_agent_name, thread_id)
+
+            # 3. 流式处理响应
+            if stream is None:
+                stream = self._stream_agent(selected_agent_name, user_input, thread_id)
+            async for chunk in stream:
+                trace.event(chunk)
                 yield chunk
+            status = "completed"
 
         except Exception as e:
             logger.error(f"❌ Error processing streaming response: {e}", exc_info=True)
+            status = "failed"
             yield {"type": "error", "text": f"Error processing streaming response: {e}"}
+        finally:
+            self.tracer.finish(trace, status)
+
+    async def _route_locally(self, user_input: str, agent_names: List[str], session_id: str) -> Optional[str]:
+        """不调用LLM的路由：同一会话沿用上一轮的Agent，否则尝试本地意图路由。
+
+        Args:
+            user_input (str): 用户的请求。
+            agent_names (List[str]): 可用Agent名称。
+            session_id (str): 会话ID。
+
+        Returns:
+            Optional[str]: 选中的Agent名称，None表示需要LLM选择。
+        """
+        # 会话亲和：只有本地意图路由明确指向其他Agent（话题切换）时才重新路由
+        if self.session_routes:
+            sticky_agent_name = await self.session_routes.get(session_id)
+            if sticky_agent_name in agent_names:
+                switched_to = self.intent_router.match(user_input, agent_names) if self.intent_router else None
+                if not switched_to or switched_to == sticky_agent_name:
+                    self.sticky_hits += 1
+                    return sticky_agent_name
+                self.topic_switches += 1
+                logger.info(f"Topic switch detected in session {session_id}: {sticky_agent_name} -> {switched_to}")
+                return switched_to
+
+        if self.intent_router:
+            return self.intent_router.route(user_input, agent_names)
+        return None
+
+    async def _route_with_llm(self, user_input: str, available_agents: List[Dict[str, str]], session_id: str,
+                              new_session: bool = False) -> Tuple[Optional[str], Optional[SpeculativeStream]]:
+        """由LLM选择Agent；开启投机执行且为新会话时同时向本地首选Agent发起请求。
+
+        Args:
+            user_input (str): 用户的请求。
+            available_agents (List[Dict[str, str]]): 可用Agent列表。
+            session_id (str): 会话ID。
+            new_session (bool): 会话没有历史轮次。已有历史的会话不投机，投机请求的线程中没有这些历史。
 
-    async def _process_streaming_response(self, client, payload) -> AsyncGenerator[Dict, None]:
+        Returns:
+            Tuple[Optional[str], Optional[SpeculativeStream]]: 选中的Agent名称，
+            以及投机命中时可直接使用的投机流（含其检查点线程）。
+        """
+        speculative = None
+        if self.speculative and self.intent_router and new_session:
+            match = self.intent_router.classify(user_input, [agent['name'] for agent in available_agents])
+            if match:
+                # 独立的检查点线程：未命中时丢弃，远端检查点清理任务按TTL删除
+                thread_id = f"{session_id}:speculative:{uuid4().hex[:12]}"
+                speculative = SpeculativeStream(
+                    match.agent_name, thread_id, self._stream_agent(match.agent_name, user_input, thread_id)
+                )
+
+        try:
+            selected_agent_name = await self.selector.select_agent(user_input, available_agents)
+        except BaseException:
+            if speculative:
+                await speculative.cancel()
+            raise
+
+        if speculative is None:
+            return selected_agent_name, None
+        if selected_agent_name == speculative.agent_name:
+            self.speculation_hits += 1
+            return selected_agent_name, speculative
+
+        await speculative.cancel()
+        self.speculation_misses += 1
+        self.wasted_chunks += speculative.chunks
+        self.wasted_chars += speculative.chars
+        logger.info(f"Speculative dispatch to {speculative.agent_name} discarded, router chose {selected_agent_name}")
+        return selected_agent_name, None
+
+    async def _stream_agent(self, agent_name: str, user_input: str, thread_id: str) -> AsyncGenerator[Dict, None]:
+        """向选中的Agent发送消息并流式返回响应。
+
+        Args:
+            agent_name (str): Agent名称。
+            user_input (str): 用户的请求。
+            thread_id (str): 会话在远端的检查点线程，作为metadata中的session_id发送（通常就是会话ID）。
+
+        Yields:
+            Dict: 处理后的响应字典。
+        """
+        # 构建消息
+        message = Message(
+            role=Role.user,
+            parts=[Part(root=TextPart(text=user_input))],
+            messageId=str(uuid4()),
+        )
+        payload = MessageSendParams(
+            id=str(uuid4()),
+            message=message,
+            configuration=MessageSendConfiguration(
+                acceptedOutputModes=['text', 'text/plain'],
+            ),
+            metadata={"session_id": thread_id}
+        )
+        state = StreamState()
+        client = None
+        try:
+            # 选择Agent副本并流式处理响应(流式传输需要每一层（Remote → Host → Client）都支持逐字/分片处理,代码需要修改)
+            async with self.registry.lease(agent_name, thread_id) as endpoint:
+                if not endpoint:
+                    logger.error(f"Agent client not found: {agent_name}")
+                    yield {"type": "error", "text": f"Agent client not found: {agent_name}"}
+                    return
+                client = endpoint.client
+                async for chunk in self._process_streaming_response(client, payload, state):
+                    yield chunk
+        except (httpx.HTTPError, A2AClientHTTPError) as e:
+            logger.error(f"❌ Error connecting to agent {agent_name}: {e}", exc_info=True)
+            yield {"type": "error", "text": f"Error processing streaming response: {e}"}
+        finally:
+            # 流被提前关闭（客户端断开、投机请求被丢弃等）时，远端任务仍在生成，需要主动取消
+            if client and state.task_id and not state.completed:
+                self.abandoned_streams += 1
+                task = asyncio.create_task(self._cancel_remote_task(agent_name, client, state.task_id))
+                self._background_tasks.add(task)
+                task.add_done_callback(self._background_tasks.discard)
+
+    async def _cancel_remote_task(self, agent_name: str, client: A2AClient, task_id: str) -> None:
+        """向远端Agent发送A2A tasks/cancel请求。
+
+        Args:
+            agent_name (str): Agent名称。
+            client (A2AClient): Agent客户端。
+            task_id (str): 远端任务ID。
+        """
+        try:
+            response = await client.cancel_task(
+                CancelTaskRequest(id=str(uuid4()), params=TaskIdParams(id=task_id))
+            )
+            if isinstance(response.root, JSONRPCErrorResponse):
+                logger.warning(f"Agent {agent_name} rejected cancel of task {task_id}: {response.root.error}")
+                return
+            self.remote_cancels += 1
+            logger.info(f"Canceled task {task_id} on agent {agent_name}")
+        except Exception as e:
+            logger.warning(f"Failed to cancel task {task_id} on agent {agent_name}: {e}")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get the routing time, trace, session affinity and speculative dispatch counters."""
+        speculations = self.speculation_hits + self.speculation_misses
+        return {
+            'routing_time': self.routing_time.snapshot(),
+            'traces': self.tracer.get_metrics(),
+            'sticky_hits': self.sticky_hits,
+            'topic_switches': self.topic_switches,
+            'abandoned_streams': self.abandoned_streams,
+            'remote_cancels': self.remote_cancels,
+            'speculation': {
+                'hits': self.speculation_hits,
+                'misses': self.speculation_misses,
+                'hit_rate': round(self.speculation_hits / speculations, 3) if speculations else 0.0,
+                'wasted_chunks': self.wasted_chunks,
+                'wasted_chars': self.wasted_chars,
+            },
+        }
+
+    async def _process_streaming_response(self, client, payload, state: StreamState) -> AsyncGenerator[Dict, None]:
         """处理流式响应。
 
         Args:
             client: Agent客户端。
             payload: 发送的消息负载。
+            state (StreamState): 记录远端任务ID与是否已完成。
 
         Yields:
             Dict: 处理后的响应字典。
@@ -221,10 +703,16 @@ class AgentQueryService:
             if not result:
                 yield {"type": "warning", "text": "Empty response from agent"}
                 continue
+            if isinstance(result, Task):
+                state.task_id = result.id
             # 处理最终状态
             if isinstance(result, TaskStatusUpdateEvent):
+                state.task_id = result.task_id
                 if result.final:
+                    state.completed = True
                     yield {"type": "complete", "text": "Agent task completed"}
+                    # 最终事件之后不再读取：任务被取消时远端会直接断开SSE连接
+                    return
                 else:
                     # 确保parts和text存在，避免AttributeError
                     if result.status.message and result.status.message.parts:
@@ -234,3 +722,5 @@ class AgentQueryService:
                         yield {"type": "status", "text": "Agent is processing..."}
             else:
                 yield {"type": "unknown", "text": f"Received unknown event: {type(result)}"}
+        # 上游流正常结束，远端任务已不再运行
+        state.completed = True
@@ -1,17 +1,23 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from contextlib import asynccontextmanager
 import httpx
+import asyncio
+import time
 from src.config.settings import API_CONFIG
 from fastapi.responses import StreamingResponse
-from src.config.settings import REMOTE_AGENTS
+from src.config.settings import REMOTE_AGENTS, INTENT_ROUTER_CONFIG, SESSION_ROUTE_CONFIG, TRACE_CONFIG
 import json
+from typing import AsyncGenerator, Dict
 from src.agent_services import (
     AgentRegistry,
     AgentSelector,
     AgentQueryService
 )
+from src.intent_router import IntentRouter
+from src.session_routes import SessionRouteStore
+from src.trace_recorder import TraceRecorder
 import logging.config
 import os
 
@@ -26,27 +32,47 @@ class QueryRequest(BaseModel):
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # 初始化服务
-    http_client = httpx.AsyncClient(timeout=API_CONFIG['timeout'])
+    http_client = httpx.AsyncClient(
+        timeout=API_CONFIG['timeout'],
+        limits=httpx.Limits(max_connections=API_CONFIG['max_connections'],
+                            max_keepalive_connections=API_CONFIG['max_connections']),
+    )
     registry = AgentRegistry(http_client)
     selector = AgentSelector()
-    query_service = AgentQueryService(registry, selector)
+    intent_router = IntentRouter() if INTENT_ROUTER_CONFIG['enabled'] else None
+    session_routes = SessionRouteStore() if SESSION_ROUTE_CONFIG['enabled'] else None
+    tracer = TraceRecorder() if TRACE_CONFIG['enabled'] else None
+    query_service = AgentQueryService(registry, selector, intent_router, session_routes, tracer=tracer)
 
-    # 启动时注册所有Agent（仅一次）
+    # 根据已注册Agent的名片构建本地意图路由，名片变化时重新构建
+    if intent_router:
+        registry.add_listener(intent_router.fit)
+
+    # 启动时并发注册所有Agent（含多个副本），失败的Agent由后台刷新任务重试
     for agent_type, config in REMOTE_AGENTS.items():
-        url = f"http://{config['host']}:{config['port']}"
-        await registry.register_agent(url)
+        for url in config.get('replicas') or [f"http://{config['host']}:{config['port']}"]:
+            registry.add_endpoint(url, session_affinity=config.get('session_affinity', False))
+    await registry.register_agents(list(registry.endpoints))
+    registry.start_refresh()
     
     # 注入到app state
     app.state.services = {
         'http_client': http_client,
         'registry': registry,
         'query_service': query_service,
-        'selector': selector
+        'selector': selector,
+        'intent_router': intent_router,
+        'session_routes': session_routes
     }
     
     yield
     
     # 清理资源
+    await registry.stop_refresh()
+    if session_routes:
+        await session_routes.close()
+    if tracer:
+        await tracer.close()
     await http_client.aclose()
 
 app = FastAPI(lifespan=lifespan)
@@ -58,16 +84,47 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+async def pump(stream: AsyncGenerator[Dict, None], queue: asyncio.Queue) -> None:
+    """Read the upstream stream into the queue; None marks the end."""
+    try:
+        async for content in stream:
+            queue.put_nowait(content)
+    finally:
+        queue.put_nowait(None)
+
+
+async def watch_disconnect(http_request: Request, consumer: asyncio.Task, session_id: str) -> None:
+    """Cancel the upstream consumer when the browser closes the connection."""
+    while not consumer.done():
+        if await http_request.is_disconnected():
+            # 取消上游：关闭A2A SSE连接，并向远端Agent发送tasks/cancel
+            logger.info(f"Client disconnected, tearing down stream for session {session_id}")
+            consumer.cancel()
+            return
+        await asyncio.sleep(API_CONFIG['disconnect_poll_interval'])
+
 @app.post("/stream-query")
-async def handle_stream_query(request: QueryRequest):
+async def handle_stream_query(request: QueryRequest, http_request: Request):
     services = app.state.services
     try:
         async def generate():
-            async for content in services['query_service'].handle_stream_query(request.user_input, request.session_id):
-                # 将字典转换为JSON字符串
-                json_data = json.dumps(content)
-                # 按照SSE格式返回，每个事件以两个换行符结束
-                yield f"data: {json_data}\n\n"
+            stream = services['query_service'].handle_stream_query(request.user_input, request.session_id)
+            # 一个任务消费上游流；浏览器断开时立即取消它，而不是等到模型下一次输出、写入失败时才发现。
+            # 服务器按ASGI 2.4之前的规范运行时，Starlette也会在断开时取消本生成器，两者都会取消消费任务
+            queue: asyncio.Queue = asyncio.Queue()
+            consumer = asyncio.create_task(pump(stream, queue))
+            watcher = asyncio.create_task(watch_disconnect(http_request, consumer, request.session_id))
+            try:
+                while (content := await queue.get()) is not None:
+                    # 将字典转换为JSON字符串
+                    json_data = json.dumps(content)
+                    # 按照SSE格式返回，每个事件以两个换行符结束
+                    yield f"data: {json_data}\n\n"
+            finally:
+                watcher.cancel()
+                consumer.cancel()
+                await asyncio.gather(watcher, consumer, return_exceptions=True)
+                await stream.aclose()
         return StreamingResponse(
             generate(), 
             media_type="text/event-stream",
@@ -75,4 +132,19 @@ async def handle_stream_query(request: QueryRequest):
         )
     except Exception as e:
         logger.error(f"Error handling stream query: {e}", exc_info=True)
-        return {"error": "Internal Server Error"}, 500
\ No newline at end of file
+        return {"error": "Internal Server Error"}, 500
+
+@app.get("/metrics")
+async def get_metrics():
+    services = app.state.services
+    metrics = {
+        'router': services['selector'].get_metrics(),
+        'query': services['query_service'].get_metrics(),
+        'agents': services['registry'].get_metrics(),
+        'cpu_seconds': time.process_time()
+    }
+    if services['intent_router']:
+        metrics['intent_router'] = services['intent_router'].get_metrics()
+    if services['session_routes']:
+        metrics['session_routes'] = services['session_routes'].get_metrics()
+    return metrics
@@ -9,12 +9,17 @@ def load_key(keyname: str) -> object:
             Key = json.load(file)
         if keyname in Key and Key[keyname]:
             return Key[keyname]
+        elif os.getenv(keyname):
+            # 配置文件中没有时使用环境变量，便于非交互启动（如压测）
+            return os.getenv(keyname)
         else:
             keyval = getpass.getpass("配置文件中没有相应键，请输入对应配置信息:").strip()
             Key[keyname] = keyval
             with open(file_name, "w") as file:
                 json.dump(Key, file, indent=4)
             return keyval
+    elif os.getenv(keyname):
+        return os.getenv(keyname)
     else:
         keyval = getpass.getpass("配置文件中没有相应键，请输入对应配置信息:").strip()
         Key = {
@@ -1,4 +1,6 @@
 # config/settings.py
+import os
+
 REMOTE_AGENTS = {
     'coding_agent': {
         'host': 'localhost',
@@ -13,7 +15,10 @@ REMOTE_AGENTS = {
     'Loan_Scheme_Suggestion_Agent': {
         'host': 'localhost',
         'port': 10030,
-        'description': 'Give the loan scheme suggestion to user'
+        'description': 'Give the loan scheme suggestion to user',
+        # 可选：多个副本地址（配置后忽略host/port），以及按session_id一致性哈希选择副本
+        # 'replicas': ['http://localhost:10030', 'http://localhost:10031'],
+        # 'session_affinity': True,
     },
     'Loan Pre-examination Agent': {
         'host': 'localhost',
@@ -26,8 +31,84 @@ REMOTE_AGENTS = {
         'description': 'An Agent for other chatting'
     },
 }
+# max_connections：访问远端Agent的连接池上限。每个进行中的流式请求占用一个连接，名片刷新也使用该连接池，
+# 上限过低时刷新排队超时，Agent会被误判为不健康；disconnect_poll_interval：检查浏览器是否已断开的间隔（秒）
 API_CONFIG = {
     'host': '0.0.0.0',
     'port': 9001,
-    'timeout': 30
-}
\ No newline at end of file
+    'timeout': 30,
+    'max_connections': 4096,
+    'disconnect_poll_interval': 0.5
+}
+
+# LLM路由器设定：并发上限（同时进行的路由LLM调用数）与单次路由超时（秒，含排队等待与模型调用）
+# speculative: LLM路由决策期间，投机地向本地意图路由的首选Agent发起请求（仅新会话，在独立的检查点线程中执行）
+ROUTER_CONFIG = {
+    'max_concurrency': 16,
+    'timeout': 10,
+    'speculative': False
+}
+
+# 本地快速意图路由设定：得分与置信度均达到阈值时跳过LLM路由；
+# 每次构建后检查greeting_probes中的问候语只会交给chat_agent或交由LLM路由，否则记录警告
+INTENT_ROUTER_CONFIG = {
+    'enabled': True,
+    'min_score': 0.2,
+    'min_confidence': 0.35,
+    'chat_agent': 'Chat Agent',
+    'greeting_probes': ['hello', 'hi', 'hey', 'Hello!', 'hello there', '你好', '您好', '嗨', '早上好']
+}
+
+# 意图路由的标注种子语句，键为Agent名片中的name；问候语放在Chat Agent中，其n-gram（如hello）在其他Agent的示例中出现时权重随之降低
+INTENT_SEEDS = {
+    'Coding Agent': [
+        '写代码', '帮我写一段代码', '编写一个python程序', '写个Java程序',
+        '实现一个快速排序算法', '这段代码报错了', '帮我写个函数', 'write a python script',
+    ],
+    'Automobile Recommendation Agent': [
+        '推荐一款车', '帮我推荐车型', '预算30万买什么车', '有哪些SUV车型',
+        '适合家用的车', '我想买车', '车型推荐', 'recommend a car',
+    ],
+    'Loan Scheme Suggestion Agent': [
+        '贷款方案', '推荐一个贷款方案', '这款车有什么金融方案', '首付比例是多少',
+        '分期方案', '月供多少', '尾款比例', '车贷方案', 'loan scheme',
+    ],
+    'Loan Pre-examination Agent': [
+        '预审', '贷款预审', '我想做贷款预审', '帮我预审一下', '征信查询',
+        '我的姓名身份证号和手机号', '同意授权查询征信', 'accept', 'pre-examination',
+    ],
+    'Chat Agent': [
+        '你好', '您好', '嗨', '早上好', '给我讲个笑话', '今天天气怎么样', '陪我聊聊天', '你是谁', '谢谢',
+        'hello', 'hi', 'hey', 'good morning', 'thanks', 'who are you',
+    ],
+}
+
+# 会话路由亲和设定：进程内最多缓存的会话数、TTL（秒），redis_url非空时多副本共享；
+# 使用Redis时Redis为准，进程内记录只在local_ttl秒内直接使用，之后重新读取Redis（Redis不可用时仍按ttl回退到进程内记录）；
+# thread_ttl为会话检查点线程记录的保留时间（秒），与远端Agent的检查点保留时间（CHECKPOINT_CONFIG['ttl_minutes']）一致
+SESSION_ROUTE_CONFIG = {
+    'enabled': True,
+    'max_sessions': 10000,
+    'ttl': 1800,
+    'local_ttl': 5,
+    'thread_ttl': 7 * 24 * 3600,
+    'redis_url': None  # 例如 "redis://localhost:6379"
+}
+
+# Agent注册设定：获取名片超时（秒）、名片刷新间隔（秒）、失败重试的退避基数与上限（秒）
+REGISTRY_CONFIG = {
+    'card_timeout': 5,
+    'refresh_interval': 60,
+    'retry_base': 1,
+    'retry_max': 60,
+    'eject_after': 3  # 副本连续失败多少次后摘除
+}
+
+# 对话录制设定（默认关闭，可用环境变量TRACE_ENABLED=1开启）：把每轮的用户输入、路由决策与返回给浏览器的事件（含时间）
+# 写入path（.gz结尾时压缩），供replay_traces.py回放；按会话采样sample_rate比例，等待写入的轮次超过max_buffer时丢弃
+TRACE_CONFIG = {
+    'enabled': os.getenv('TRACE_ENABLED', '0') == '1',
+    'path': 'logs/traces.jsonl',
+    'sample_rate': 1.0,
+    'max_buffer': 10000
+}
@@ -0,0 +1,189 @@
+# services/intent_router.py
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from a2a.types import AgentCard
+from src.config.settings import INTENT_ROUTER_CONFIG, INTENT_SEEDS
+import math
+import re
+import logging.config
+import os
+
+log_config_path = os.path.abspath("src/config/logging.conf")
+logging.config.fileConfig(log_config_path, encoding='utf-8')
+logger = logging.getLogger(__name__)
+
+_SPACES = re.compile(r"\s+")
+
+
+@dataclass
+class IntentMatch:
+    """本地意图分类结果。"""
+    agent_name: str
+    score: float
+    confidence: float
+
+
+def _ngrams(text: str, sizes=(2, 3)) -> Dict[str, float]:
+    """Split text into character n-grams with sublinear term frequency.
+
+    Character n-grams work for Chinese (no word boundaries) and English alike.
+    """
+    text = _SPACES.sub(" ", text.lower()).strip()
+    counts: Dict[str, int] = {}
+    for size in sizes:
+        for i in range(len(text) - size + 1):
+            gram = text[i:i + size]
+            if gram.strip():
+                counts[gram] = counts.get(gram, 0) + 1
+    return {gram: 1 + math.log(count) for gram, count in counts.items()}
+
+
+class IntentRouter:
+    """本地快速意图路由。
+
+    基于字符n-gram的TF-IDF，对Agent名片（描述、技能标签、示例）和标注种子语句打分，
+    置信度足够时直接返回Agent，否则交由LLM选择。
+    """
+    def __init__(self, seeds: Optional[Dict[str, List[str]]] = None,
+                 min_score: float = INTENT_ROUTER_CONFIG['min_score'],
+                 min_confidence: float = INTENT_ROUTER_CONFIG['min_confidence'],
+                 chat_agent: str = INTENT_ROUTER_CONFIG['chat_agent'],
+                 greeting_probes: Optional[List[str]] = None):
+        self.seeds = seeds if seeds is not None else INTENT_SEEDS
+        self.min_score = min_score
+        self.min_confidence = min_confidence
+        self.chat_agent = chat_agent
+        self.greeting_probes = greeting_probes if greeting_probes is not None else INTENT_ROUTER_CONFIG['greeting_probes']
+        self.misrouted_greetings: Dict[str, str] = {}
+        self.idf: Dict[str, float] = {}
+        self.max_idf = 1.0
+        self.agent_names: List[str] = []
+        self.postings: Dict[str, List[Tuple[str, int, float]]] = {}
+        self.hits = 0
+        self.fallbacks = 0
+
+    def fit(self, cards: Iterable[AgentCard]) -> None:
+        """Build TF-IDF vectors for every agent from its card and seed utterances.
+
+        Args:
+            cards (Iterable[AgentCard]): The registered agent cards.
+        """
+        documents: Dict[str, List[str]] = {}
+        for card in cards:
+            texts = [card.name, card.description]
+            for skill in card.skills or []:
+                texts.append(skill.name)
+                texts.append(skill.description)
+                texts.extend(skill.tags or [])
+                texts.extend(skill.examples or [])
+            texts.extend(self.seeds.get(card.name, []))
+            documents[card.name] = texts
+
+        # IDF以Agent为文档单位计算：所有Agent都出现的n-gram（如"agent"）权重最低
+        document_frequency: Dict[str, int] = {}
+        for texts in documents.values():
+            for gram in {gram for text in texts for gram in _ngrams(text)}:
+                document_frequency[gram] = document_frequency.get(gram, 0) + 1
+
+        total = len(documents)
+        self.idf = {
+            gram: math.log((1 + total) / (1 + df)) + 1
+            for gram, df in document_frequency.items()
+        }
+        self.max_idf = math.log(1 + total) + 1
+        # 每条描述/示例/种子单独成向量，打分取与该Agent最相近的一条；用倒排表只遍历查询命中的n-gram
+        self.agent_names = list(documents)
+        self.postings = {}
+        for name, texts in documents.items():
+            for index, text in enumerate(texts):
+                for gram, weight in self._vectorize(text).items():
+                    self.postings.setdefault(gram, []).append((name, index, weight))
+        logger.info(f"Intent router fitted with {total} agents and {len(self.idf)} n-grams")
+        self._check_greetings()
+
+    def classify(self, user_query: str, candidates: Optional[Iterable[str]] = None) -> Optional[IntentMatch]:
+        """Score the query against every agent.
+
+        Args:
+            user_query (str): The user's request.
+            candidates (Optional[Iterable[str]]): Restrict scoring to these agent names.
+
+        Returns:
+            Optional[IntentMatch]: The best agent with its score and confidence, or None if nothing matches.
+        """
+        query = self._vectorize(user_query)
+        if not query:
+            return None
+
+        allowed = set(self.agent_names if candidates is None else candidates)
+        similarities: Dict[Tuple[str, int], float] = {}
+        for gram, weight in query.items():
+            for name, index, doc_weight in self.postings.get(gram, ()):
+                if name in allowed:
+                    similarities[(name, index)] = similarities.get((name, index), 0.0) + weight * doc_weight
+        best: Dict[str, float] = {}
+        for (name, _), similarity in similarities.items():
+            if similarity > best.get(name, 0.0):
+                best[name] = similarity
+        scores = sorted(((score, name) for name, score in best.items()), reverse=True)
+        if not scores or scores[0][0] <= 0:
+            return None
+        top_score, top_name = scores[0]
+        second_score = scores[1][0] if len(scores) > 1 else 0.0
+        # 置信度：第一名相对第二名的领先幅度
+        confidence = (top_score - second_score) / top_score
+        return IntentMatch(agent_name=top_name, score=top_score, confidence=confidence)
+
+    def route(self, user_query: str, candidates: Optional[Iterable[str]] = None) -> Optional[str]:
+        """Return the agent name when the local match is confident enough.
+
+        Args:
+            user_query (str): The user's request.
+            candidates (Optional[Iterable[str]]): Restrict routing to these agent names.
+
+        Returns:
+            Optional[str]: The agent name, or None if the LLM selector should decide.
+        """
+        agent_name = self.match(user_query, candidates)
+        if agent_name:
+            self.hits += 1
+            logger.info(f"Fast-path routed to {agent_name}")
+            return agent_name
+        self.fallbacks += 1
+        return None
+
+    def match(self, user_query: str, candidates: Optional[Iterable[str]] = None) -> Optional[str]:
+        """Same as route() but without updating the hit/fallback counters."""
+        match = self.classify(user_query, candidates)
+        if match and match.score >= self.min_score and match.confidence >= self.min_confidence:
+            return match.agent_name
+        return None
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get fast-path hit and fallback counts and the greetings routed away from the chat agent."""
+        return {'hits': self.hits, 'fallbacks': self.fallbacks, 'misrouted_greetings': self.misrouted_greetings}
+
+    def _check_greetings(self) -> None:
+        # 问候语只能交给闲聊Agent或交由LLM路由；名片示例（如"hello world程序"）可能让问候语被误判为其他意图
+        self.misrouted_greetings = {}
+        for greeting in self.greeting_probes:
+            agent_name = self.match(greeting)
+            if agent_name and agent_name != self.chat_agent:
+                self.misrouted_greetings[greeting] = agent_name
+        if self.misrouted_greetings:
+            logger.warning(f"Greetings routed past the LLM to the wrong agent: {self.misrouted_greetings}, "
+                           f"add them to INTENT_SEEDS['{self.chat_agent}']")
+
+    def _vectorize(self, text: str) -> Dict[str, float]:
+        # 未见过的n-gram按最高IDF计入范数，避免陌生内容居多的输入得分虚高
+        return self._normalize({
+            gram: weight * self.idf.get(gram, self.max_idf)
+            for gram, weight in _ngrams(text).items()
+        })
+
+    @staticmethod
+    def _normalize(vector: Dict[str, float]) -> Dict[str, float]:
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+        if not norm:
+            return {}
+        return {gram: weight / norm for gram, weight in vector.items()}
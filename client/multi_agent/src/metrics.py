@@ -0,0 +1,55 @@
+# metrics.py
+from collections import deque
+from typing import Deque, Dict, Iterable, Optional
+
+
+def percentile(values: Iterable[float], q: float) -> Optional[float]:
+    """Return the q-th quantile (0-1) of the values by nearest rank, or None when there are none."""
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+class LatencyStats:
+    """延迟统计。
+
+    记录最近若干次耗时（秒），提供次数、平均值、最大值以及p50/p99。
+    """
+    def __init__(self, window: int = 1024):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        """Record one latency sample.
+
+        Args:
+            seconds (float): The observed latency in seconds.
+        """
+        self._samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q: float) -> float:
+        """Return the q-th percentile (0-100) of the recent window."""
+        value = percentile(self._samples, q / 100)
+        return 0.0 if value is None else value
+
+    def snapshot(self) -> Dict[str, float]:
+        """Return the statistics in milliseconds.
+
+        Returns:
+            Dict[str, float]: count, avg_ms, max_ms, p50_ms and p99_ms.
+        """
+        avg = self.total / self.count if self.count else 0.0
+        return {
+            'count': self.count,
+            'avg_ms': round(avg * 1000, 3),
+            'max_ms': round(self.max * 1000, 3),
+            'p50_ms': round(self.percentile(50) * 1000, 3),
+            'p99_ms': round(self.percentile(99) * 1000, 3),
+        }
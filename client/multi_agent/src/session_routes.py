@@ -0,0 +1,157 @@
+# services/session_routes.py
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from src.config.settings import SESSION_ROUTE_CONFIG
+import time
+import logging.config
+import os
+
+log_config_path = os.path.abspath("src/config/logging.conf")
+logging.config.fileConfig(log_config_path, encoding='utf-8')
+logger = logging.getLogger(__name__)
+
+
+class SessionRouteStore:
+    """会话路由亲和存储。
+
+    记录每个session_id最近一次处理请求的Agent。进程内使用带TTL的LRU，
+    配置redis_url后同时写入Redis，供多个Host副本共享。此时Redis为准：进程内记录只在local_ttl秒内直接使用，
+    过期后重新读取Redis，其他副本写入的新路由最多延迟local_ttl秒生效。
+    同时记录会话在远端Agent使用的检查点线程（通常就是session_id，投机请求命中时为投机请求的线程），
+    保留thread_ttl秒；没有线程记录的会话视为新会话。线程记录写入后不再改变，进程内缓存无需过期检查Redis。
+    """
+    KEY_PREFIX = "session_route:"
+    THREAD_KEY_PREFIX = "session_thread:"
+
+    def __init__(self, max_sessions: int = SESSION_ROUTE_CONFIG['max_sessions'],
+                 ttl: int = SESSION_ROUTE_CONFIG['ttl'],
+                 local_ttl: float = SESSION_ROUTE_CONFIG['local_ttl'],
+                 thread_ttl: int = SESSION_ROUTE_CONFIG['thread_ttl'],
+                 redis_url: Optional[str] = SESSION_ROUTE_CONFIG['redis_url']):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.local_ttl = local_ttl
+        # session_id -> (Agent名称, 无需读取Redis的截止时间, 过期时间)
+        self.routes: "OrderedDict[str, Tuple[str, float, float]]" = OrderedDict()
+        self.thread_ttl = thread_ttl
+        # session_id -> (检查点线程ID, 过期时间)
+        self.threads: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self.redis = None
+        if redis_url:
+            # Redis为可选依赖，仅在配置时导入
+            import redis.asyncio as redis
+            self.redis = redis.from_url(redis_url, decode_responses=True)
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    async def get(self, session_id: str) -> Optional[str]:
+        """Get the agent that handled the previous turn of the session.
+
+        Args:
+            session_id (str): The session ID.
+
+        Returns:
+            Optional[str]: The agent name, or None if unknown or expired.
+        """
+        now = time.monotonic()
+        entry = self.routes.get(session_id)
+        if entry and entry[2] <= now:
+            del self.routes[session_id]
+            entry = None
+        if entry and (not self.redis or entry[1] > now):
+            self.routes.move_to_end(session_id)
+            self.local_hits += 1
+            return entry[0]
+
+        if self.redis:
+            try:
+                agent_name = await self.redis.get(self.KEY_PREFIX + session_id)
+            except Exception as e:
+                logger.warning(f"Failed to read session route from Redis: {e}")
+                # Redis不可用时退回进程内记录
+                if entry:
+                    self.local_hits += 1
+                    return entry[0]
+                agent_name = None
+            if agent_name:
+                self._remember(session_id, agent_name)
+                self.redis_hits += 1
+                return agent_name
+            # Redis中已过期或不存在，丢弃进程内的旧记录
+            self.routes.pop(session_id, None)
+
+        self.misses += 1
+        return None
+
+    async def get_thread(self, session_id: str) -> Optional[str]:
+        """Get the checkpoint thread the remote agents keep the session's history in.
+
+        Args:
+            session_id (str): The session ID.
+
+        Returns:
+            Optional[str]: The thread ID, or None if the session has no earlier turns.
+        """
+        entry = self.threads.get(session_id)
+        if entry and entry[1] > time.monotonic():
+            self.threads.move_to_end(session_id)
+            return entry[0]
+        if self.redis:
+            try:
+                thread_id = await self.redis.get(self.THREAD_KEY_PREFIX + session_id)
+            except Exception as e:
+                logger.warning(f"Failed to read session thread from Redis: {e}")
+                # 无法确定时按已有历史处理，不会把会话切换到新线程
+                return session_id
+            if thread_id:
+                self._remember_thread(session_id, thread_id)
+                return thread_id
+        return None
+
+    async def set(self, session_id: str, agent_name: str, thread_id: Optional[str] = None) -> None:
+        """Remember the agent and the checkpoint thread for the session and refresh their TTLs.
+
+        Args:
+            session_id (str): The session ID.
+            agent_name (str): The agent that handles this turn.
+            thread_id (Optional[str]): The checkpoint thread of the session, session_id if not given.
+        """
+        thread_id = thread_id or session_id
+        self._remember(session_id, agent_name)
+        self._remember_thread(session_id, thread_id)
+        if self.redis:
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    pipe.set(self.KEY_PREFIX + session_id, agent_name, ex=self.ttl)
+                    pipe.set(self.THREAD_KEY_PREFIX + session_id, thread_id, ex=self.thread_ttl)
+                    await pipe.execute()
+            except Exception as e:
+                logger.warning(f"Failed to write session route to Redis: {e}")
+
+    async def close(self) -> None:
+        """Close the Redis connection if one was opened."""
+        if self.redis:
+            await self.redis.aclose()
+
+    def get_metrics(self) -> Dict[str, int]:
+        """Get the session route cache statistics."""
+        return {
+            'sessions': len(self.routes),
+            'local_hits': self.local_hits,
+            'redis_hits': self.redis_hits,
+            'misses': self.misses,
+        }
+
+    def _remember(self, session_id: str, agent_name: str) -> None:
+        now = time.monotonic()
+        self.routes[session_id] = (agent_name, now + min(self.local_ttl, self.ttl), now + self.ttl)
+        self.routes.move_to_end(session_id)
+        while len(self.routes) > self.max_sessions:
+            self.routes.popitem(last=False)
+
+    def _remember_thread(self, session_id: str, thread_id: str) -> None:
+        self.threads[session_id] = (thread_id, time.monotonic() + self.thread_ttl)
+        self.threads.move_to_end(session_id)
+        while len(self.threads) > self.max_sessions:
+            self.threads.popitem(last=False)
@@ -0,0 +1,142 @@
+# services/trace_recorder.py
+from typing import Any, Dict, List, Optional, Tuple
+from src.config.settings import TRACE_CONFIG
+import asyncio
+import gzip
+import json
+import time
+import zlib
+import logging.config
+import os
+
+log_config_path = os.path.abspath("src/config/logging.conf")
+logging.config.fileConfig(log_config_path, encoding='utf-8')
+logger = logging.getLogger(__name__)
+
+
+def _offset_ms(started_at: float) -> float:
+    return round((time.perf_counter() - started_at) * 1000, 2)
+
+
+class TurnTrace:
+    """一轮查询的录制：用户输入、路由决策，以及返回给浏览器的每个事件及其时间。
+
+    未被采样的轮次recording为False，不记录任何内容。
+    """
+    def __init__(self, session_id: str, user_input: str, recording: bool):
+        self.recording = recording
+        self.session_id = session_id
+        self.user_input = user_input
+        self.started_at = time.perf_counter()
+        self.timestamp = time.time()
+        self.agent: Optional[str] = None
+        self.routing_ms: Optional[float] = None
+        self.events: List[Tuple[float, str, str]] = []
+
+    def routed(self, agent_name: str) -> None:
+        """Record the routing decision."""
+        if self.recording:
+            self.agent = agent_name
+            self.routing_ms = _offset_ms(self.started_at)
+
+    def event(self, chunk: Dict[str, Any]) -> None:
+        """Record one event streamed to the browser."""
+        if self.recording:
+            self.events.append((_offset_ms(self.started_at), chunk.get('type'), chunk.get('text')))
+
+    def to_record(self, status: str) -> Dict[str, Any]:
+        return {
+            'kind': 'host_turn',
+            'session_id': self.session_id,
+            'user_input': self.user_input,
+            'timestamp': self.timestamp,
+            'status': status,
+            'agent': self.agent,
+            'routing_ms': self.routing_ms,
+            'duration_ms': _offset_ms(self.started_at),
+            'events': self.events,
+        }
+
+
+class TraceRecorder:
+    """查询录制器，把每轮查询写入JSONL文件（路径以.gz结尾时gzip压缩），供replay_traces.py回放。
+
+    按session_id采样，被采样的会话录制所有轮次。写入在后台任务中批量进行，不阻塞流式输出；
+    等待写入的轮次超过max_buffer时丢弃新的记录。
+    """
+    def __init__(self,
+                 enabled: bool = TRACE_CONFIG['enabled'],
+                 path: str = TRACE_CONFIG['path'],
+                 sample_rate: float = TRACE_CONFIG['sample_rate'],
+                 max_buffer: int = TRACE_CONFIG['max_buffer']):
+        self.enabled = enabled
+        self.path = os.path.abspath(path)
+        self.sample_rate = sample_rate
+        self.max_buffer = max_buffer
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.writer: Optional[asyncio.Task] = None
+        self.recorded = 0
+        self.dropped = 0
+        self.write_errors = 0
+
+    def start_turn(self, session_id: str, user_input: str) -> TurnTrace:
+        """Start recording a turn; the returned trace records nothing when the session is not sampled."""
+        return TurnTrace(session_id, user_input, self.enabled and self._sampled(session_id))
+
+    def finish(self, trace: TurnTrace, status: str) -> None:
+        """Queue a finished turn for writing."""
+        if not trace.recording:
+            return
+        if self.queue.qsize() >= self.max_buffer:
+            self.dropped += 1
+            return
+        if self.writer is None:
+            self.writer = asyncio.create_task(self._write_loop())
+        self.queue.put_nowait(trace.to_record(status))
+
+    async def close(self) -> None:
+        """Write the queued turns and stop the writer."""
+        if self.writer:
+            await self.queue.join()
+            self.writer.cancel()
+            await asyncio.gather(self.writer, return_exceptions=True)
+            self.writer = None
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get the recorded, dropped and failed turn counters."""
+        return {
+            'enabled': self.enabled,
+            'recorded': self.recorded,
+            'buffered': self.queue.qsize(),
+            'dropped': self.dropped,
+            'write_errors': self.write_errors,
+        }
+
+    def _sampled(self, session_id: str) -> bool:
+        if self.sample_rate >= 1:
+            return True
+        return zlib.crc32(session_id.encode('utf-8')) / 0xFFFFFFFF < self.sample_rate
+
+    async def _write_loop(self) -> None:
+        while True:
+            batch = [await self.queue.get()]
+            while not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            lines = ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in batch)
+            try:
+                await asyncio.to_thread(self._append, lines)
+                self.recorded += len(batch)
+            except Exception as e:
+                self.write_errors += len(batch)
+                logger.error(f"Failed to write {len(batch)} traced turns to {self.path}: {e}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _append(self, lines: str) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # gzip文件可以逐批追加（多个gzip成员），读取时作为一个整体解压
+        opener = gzip.open if self.path.endswith('.gz') else open
+        with opener(self.path, 'at', encoding='utf-8') as f:
+            f.write(lines)
+
@@ -0,0 +1,86 @@
+"""Embedding calls and latency of concurrent query embeddings with and without the cache and micro-batcher.
+
+Concurrent clients embed query texts drawn from a skewed distribution: a few model IDs are asked
+for much more often than the rest, like the loan scheme tool's traffic. The embedding model is
+FakeEmbeddings with a simulated round trip of --latency-ms per call, so no API key or network is
+needed.
+
+Modes:
+- direct: every request calls the model, as before.
+- batched: the micro-batcher only (no cache entries).
+- cached: the in-process LRU and the micro-batcher.
+- cached_redis: also the Redis tier, which starts cold (only with --redis; needs Redis at
+  RAG_CONFIG['redis_url']).
+
+Reported: model calls, texts sent, p50/p99 latency, cache hit rate, average batch size and the
+model calls saved.
+
+Run from this directory:
+    python benchmark_embeddings.py [--requests 2000] [--concurrency 100] [--distinct 30] [--latency-ms 50]
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import Any, Dict, List
+from src.metrics import format_ms, percentile
+from src.services.embeddings import CachedEmbeddings, FakeEmbeddings
+
+
+async def run_mode(embed: Any, texts: List[str], concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    remaining = iter(texts)
+
+    async def worker() -> None:
+        for text in remaining:
+            started_at = time.perf_counter()
+            await embed(text)
+            latencies.append((time.perf_counter() - started_at) * 1000)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return {'elapsed': time.perf_counter() - started_at, 'latencies': latencies}
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--distinct', type=int, default=30, help="number of different query texts")
+    parser.add_argument('--latency-ms', type=float, default=50.0, help="simulated embedding round trip")
+    parser.add_argument('--redis', action='store_true', help="also measure the Redis tier")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    # Zipf分布：排名第r的车型被查询的概率与1/r成正比
+    candidates = [f"BMW{i:03d}" for i in range(1, args.distinct + 1)]
+    texts = rng.choices(candidates, weights=[1 / rank for rank in range(1, args.distinct + 1)], k=args.requests)
+    print(f"{args.requests} requests over {args.distinct} texts, concurrency {args.concurrency}, "
+          f"model latency {args.latency_ms}ms")
+    print(f"  {'mode':<12} {'calls':>6} {'texts':>6} {'p50':>9} {'p99':>9} {'req/s':>8} {'hit rate':>8} "
+          f"{'batch':>6} {'saved':>6}")
+
+    modes = ['direct', 'batched', 'cached'] + (['cached_redis'] if args.redis else [])
+    for mode in modes:
+        model = FakeEmbeddings(latency=args.latency_ms / 1000)
+        cached = None
+        if mode == 'direct':
+            embed = model.aembed_query
+        else:
+            cached = CachedEmbeddings(model, f"benchmark-{time.time_ns()}", max_entries=0 if mode == 'batched' else 10000,
+                                      redis_enabled=mode == 'cached_redis')
+            embed = cached.aembed_query
+        result = await run_mode(embed, texts, args.concurrency)
+        metrics = cached.get_metrics() if cached else {}
+        batching = metrics.get('batching', {})
+        hit_rate = metrics.get('hit_rate')
+        print(f"  {mode:<12} {model.calls:>6} {model.texts:>6} {format_ms(percentile(result['latencies'], 0.5), 7)} "
+              f"{format_ms(percentile(result['latencies'], 0.99), 7)} {args.requests / result['elapsed']:8.1f} "
+              f"{f'{hit_rate:.1%}' if hit_rate is not None else '-':>8} "
+              f"{batching.get('avg_batch_size') or '-':>6} {metrics.get('saved_calls', 0):>6}")
+        if cached:
+            await cached.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
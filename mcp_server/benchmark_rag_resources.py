@@ -0,0 +1,131 @@
+"""Tool-call latency of get_loan_scheme_from_rag with per-call and shared RAG resources against a local Redis.
+
+Two modes are measured:
+- per_call: the previous code path. Every call creates the embedding client, a RedisConfig (with
+  its own connection pool) and a RedisVectorStore. Creating the store embeds a sample text to
+  probe the dimensions and checks the index, then the query runs.
+- shared: LoanSuggestService.get_loan_scheme with the process-wide RagResources created once.
+  The model index is left empty, so shared runs the same vector search as per_call.
+
+Redis with the search module (Redis Stack, or Redis 8) must run at RAG_CONFIG['redis_url'].
+Embeddings come from FakeEmbeddings without the cache, so no API key or network is needed.
+--embed-latency-ms adds a simulated embedding round trip to every embedding call; per_call pays
+it twice per call.
+
+The scheme blocks of loan_scheme_V2.txt are written to a separate index (--index). Every mode and
+concurrency level then runs --requests calls for the model IDs found in the file. Reported:
+- p50/p99 latency
+- calls per second
+- errors
+- new Redis connections per call: the change in total_connections_received from INFO
+The benchmark index is dropped at the end.
+
+Run from this directory:
+    python benchmark_rag_resources.py [--levels 1 10 100] [--requests 300] [--embed-latency-ms 0]
+"""
+import argparse
+import asyncio
+import gc
+import os
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+from langchain_core.embeddings import Embeddings
+from langchain_redis import RedisConfig, RedisVectorStore
+from src.config.settings import RAG_CONFIG
+from src.metrics import format_ms, percentile
+from src.services.embeddings import FakeEmbeddings
+from src.services.loan_suggest import LoanSuggestService
+from src.services.rag_resources import rag_resources
+from src.services.scheme_index import SchemeIndex
+
+SCHEME_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'remote_server', 'loan_suggest',
+                           'loan_scheme_V2.txt')
+LEVELS = [1, 10, 100]
+
+
+def per_call_lookup(embeddings: Embeddings, config: Dict[str, Any]) -> Callable[[str], Awaitable[Dict]]:
+    async def lookup(model_id: str) -> Dict:
+        # 与改造前一致：每次调用在事件循环中新建配置与向量存储
+        store = RedisVectorStore(embeddings, config=RedisConfig(index_name=config['index_name'],
+                                                                redis_url=config['redis_url']))
+        docs = await store.as_retriever(search_kwargs={'k': config['k']}).ainvoke(model_id)
+        return {'count': len(docs), 'error': None}
+
+    return lookup
+
+
+async def run_level(lookup: Callable[[str], Awaitable[Dict]], model_ids: List[str], level: int,
+                    requests: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors: List[str] = []
+    remaining = iter(range(requests))
+
+    async def worker() -> None:
+        for i in remaining:
+            started_at = time.perf_counter()
+            try:
+                result = await lookup(model_ids[i % len(model_ids)])
+                if result.get('error'):
+                    errors.append(result['error'])
+                else:
+                    latencies.append((time.perf_counter() - started_at) * 1000)
+            except Exception as e:
+                errors.append(str(e))
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(level)))
+    return {'elapsed': time.perf_counter() - started_at, 'latencies': latencies, 'errors': errors}
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--levels', nargs='+', type=int, default=LEVELS)
+    parser.add_argument('--requests', type=int, default=300, help="tool calls per mode and level")
+    parser.add_argument('--embed-latency-ms', type=float, default=0.0)
+    parser.add_argument('--index', default='loan_scheme_bench', help="index the benchmark writes and drops")
+    args = parser.parse_args()
+
+    config = {**RAG_CONFIG, 'index_name': args.index}
+    embeddings = FakeEmbeddings(config['embedding_dimensions'], args.embed_latency_ms / 1000)
+    with open(SCHEME_FILE, encoding='utf-8') as f:
+        content = f.read()
+    blocks = [block.strip() for block in content.split('\n\n') if block.strip()]
+    model_ids = sorted(set(re.findall(r'BMW\d+', content)))
+
+    rag_resources.config = config
+    rag_resources.embeddings = embeddings
+    # 不存在的车型索引，所有查询都走向量检索
+    rag_resources.scheme_index = SchemeIndex(f"{args.index}_model_index")
+    await rag_resources.start()
+    store = await rag_resources.get_vector_store()
+    await asyncio.to_thread(store.add_texts, blocks)
+    print(f"indexed {len(blocks)} scheme blocks in {args.index}, querying {len(model_ids)} model IDs, "
+          f"embedding latency {args.embed_latency_ms}ms")
+    modes = {
+        'per_call': per_call_lookup(embeddings, config),
+        'shared': LoanSuggestService.get_loan_scheme,
+    }
+    try:
+        print(f"  {'mode':<8} {'conc':>4} {'calls':>5} {'errors':>6} {'p50':>9} {'p99':>9} {'calls/s':>8} "
+              f"{'conns/call':>10}")
+        for name, lookup in modes.items():
+            await run_level(lookup, model_ids, 1, 3)  # 预热
+            for level in args.levels:
+                gc.collect()
+                connections = rag_resources.redis.info('stats')['total_connections_received']
+                result = await run_level(lookup, model_ids, level, args.requests)
+                connections = rag_resources.redis.info('stats')['total_connections_received'] - connections
+                latencies = result['latencies']
+                print(f"  {name:<8} {level:>4} {args.requests:>5} {len(result['errors']):>6} "
+                      f"{format_ms(percentile(latencies, 0.5), 7)} {format_ms(percentile(latencies, 0.99), 7)} "
+                      f"{args.requests / result['elapsed']:8.1f} {connections / args.requests:10.2f}")
+                for error in sorted(set(result['errors']))[:3]:
+                    print(f"       error: {error[:200]}")
+    finally:
+        store.index.delete(drop=True)
+        await rag_resources.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
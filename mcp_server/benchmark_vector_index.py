@@ -0,0 +1,135 @@
+"""Latency and recall of the in-process NumPy vector index against RedisVectorStore.
+
+Default mode needs Redis with the ingested loan scheme index (see rag_input.py) at
+RAG_CONFIG['redis_url']. The index is exported to a temporary NumPy file and opened
+memory-mapped. The queries are the first line of every scheme block and the known model IDs,
+embedded by the configured provider (EMBEDDING_PROVIDER; use fake only if the index was ingested
+with --fake). For every query, RedisVectorStore.similarity_search_by_vector and
+NumpyVectorIndex.similarity_search_by_vector are timed, and recall@k is the share of Redis's
+top-k that NumPy also returns.
+
+--synthetic N needs no Redis. It builds N random unit vectors and queries them with noisy copies
+of random rows. Recall is measured against a float64 full sort.
+
+Both modes also report:
+- the time to open the memory-mapped index
+- the per-query time of batched search (--batch queries per matrix product)
+
+Run from this directory:
+    python benchmark_vector_index.py [--k 20] [--batch 32] [--synthetic 500 --dim 1536]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import Callable, List, Tuple
+import numpy as np
+from src.config.settings import RAG_CONFIG
+from src.metrics import format_ms, percentile
+from src.services.numpy_index import NumpyVectorIndex
+
+
+def timed(search: Callable[[], List[str]]) -> Tuple[float, List[str]]:
+    started_at = time.perf_counter()
+    ids = search()
+    return (time.perf_counter() - started_at) * 1000, ids
+
+
+def report(name: str, latencies: List[float]) -> None:
+    print(f"  {name:<22} p50 {format_ms(percentile(latencies, 0.5), 8, 3)}  "
+          f"p99 {format_ms(percentile(latencies, 0.99), 8, 3)}")
+
+
+def report_open_and_batch(path: str, queries: np.ndarray, k: int, batch: int) -> NumpyVectorIndex:
+    started_at = time.perf_counter()
+    index = NumpyVectorIndex.load(path)
+    print(f"  open (memory-mapped)   {(time.perf_counter() - started_at) * 1000:8.3f}ms for {len(index)} vectors")
+    started_at = time.perf_counter()
+    for i in range(0, len(queries), batch):
+        index.search(queries[i:i + batch], k)
+    print(f"  batched search         {(time.perf_counter() - started_at) * 1000 / len(queries):8.3f}ms per query "
+          f"(batches of {batch})")
+    return index
+
+
+def run_synthetic(args: argparse.Namespace, path: str) -> None:
+    rng = np.random.default_rng(42)
+    matrix = NumpyVectorIndex.normalize(rng.standard_normal((args.synthetic, args.dim)).astype(np.float32))
+    ids = [str(i) for i in range(args.synthetic)]
+    NumpyVectorIndex(matrix, ids, ids, [{} for _ in ids]).save(path)
+    rows = rng.integers(0, args.synthetic, args.queries)
+    queries = matrix[rows] + rng.standard_normal((args.queries, args.dim)).astype(np.float32) * 0.05
+    print(f"synthetic: {args.synthetic} vectors of {args.dim} dimensions, {args.queries} queries, k={args.k}")
+    index = report_open_and_batch(path, queries, args.k, args.batch)
+
+    latencies, exact_latencies, recalls = [], [], []
+    for query in queries:
+        latency, found = timed(lambda: [doc.id for doc in index.similarity_search_by_vector(query.tolist(), k=args.k)])
+        exact_latency, exact = timed(lambda: [ids[i] for i in np.argsort(
+            -(matrix.astype(np.float64) @ (query / np.linalg.norm(query)).astype(np.float64)))[:args.k]])
+        latencies.append(latency)
+        exact_latencies.append(exact_latency)
+        recalls.append(len(set(found) & set(exact)) / len(exact))
+    report('numpy', latencies)
+    report('float64 full sort', exact_latencies)
+    print(f"  recall@{args.k}: {np.mean(recalls):.4f}")
+
+
+async def run_redis(args: argparse.Namespace, path: str) -> None:
+    from langchain_redis import RedisConfig, RedisVectorStore
+    from redis import Redis
+    from src.services.embeddings import create_embeddings
+    from src.services.scheme_index import SchemeIndex
+
+    redis_client = Redis.from_url(RAG_CONFIG['redis_url'])
+    scheme_index = SchemeIndex()
+    scheme_index.refresh(redis_client)
+    index = NumpyVectorIndex.load_or_export(redis_client, RAG_CONFIG['index_name'], path,
+                                            int(scheme_index.version or 0))
+    if not len(index):
+        print(f"the Redis index {RAG_CONFIG['index_name']} is empty, ingest it with rag_input.py first")
+        return
+    embeddings = create_embeddings()
+    store = RedisVectorStore(embeddings, config=RedisConfig(index_name=RAG_CONFIG['index_name'], redis_client=redis_client,
+                                                            embedding_dimensions=RAG_CONFIG['embedding_dimensions']))
+    texts = [text.splitlines()[0] for text in index.texts] + sorted(scheme_index.models)
+    vectors = await embeddings.aembed_documents(texts)
+    await embeddings.close()
+    print(f"{RAG_CONFIG['index_name']}: {len(index)} documents, {len(texts)} queries, k={args.k}")
+    report_open_and_batch(path, np.asarray(vectors, dtype=np.float32), args.k, args.batch)
+
+    redis_latencies, numpy_latencies, recalls = [], [], []
+    for vector in vectors:
+        redis_latency, redis_ids = timed(lambda: [doc.id or doc.metadata.get('id')
+                                                  for doc in store.similarity_search_by_vector(vector, k=args.k)])
+        numpy_latency, numpy_ids = timed(lambda: [doc.id for doc in index.similarity_search_by_vector(vector, k=args.k)])
+        redis_latencies.append(redis_latency)
+        numpy_latencies.append(numpy_latency)
+        # Redis返回的文档ID带键前缀
+        redis_ids = [str(doc_id).split(':')[-1] for doc_id in redis_ids]
+        recalls.append(len(set(redis_ids) & set(numpy_ids)) / len(redis_ids) if redis_ids else 1.0)
+    report('RedisVectorStore', redis_latencies)
+    report('NumpyVectorIndex', numpy_latencies)
+    print(f"  recall@{args.k} against Redis: {np.mean(recalls):.4f}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--k', type=int, default=RAG_CONFIG['k'])
+    parser.add_argument('--batch', type=int, default=32, help="queries per batched search")
+    parser.add_argument('--synthetic', type=int, help="use N random vectors instead of Redis")
+    parser.add_argument('--dim', type=int, default=RAG_CONFIG['embedding_dimensions'])
+    parser.add_argument('--queries', type=int, default=500, help="queries in synthetic mode")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'vectors')
+        if args.synthetic:
+            run_synthetic(args, path)
+        else:
+            await run_redis(args, path)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
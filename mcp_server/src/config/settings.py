@@ -0,0 +1,42 @@
+# config/settings.py
+import os
+
+# 贷款方案RAG设定：嵌入模型客户端、Redis连接池与向量存储在服务启动时创建一次，所有工具调用共享；
+# embedding_dimensions为嵌入向量维度（text-embedding-v1为1536），已知时创建向量存储不再调用嵌入接口探测；
+# max_connections为连接池上限，连接用尽时最多等待pool_timeout秒；health_check_interval为后台检查
+# Redis连接的间隔（秒），检查失败时重建连接池与向量存储，检查时同时按版本号刷新车型索引的内存镜像；
+# scheme_index_prefix为车型索引（model_id→方案，见rag_input.py）在Redis中的键前缀；符合model_id_pattern
+# 的输入视为车型ID，索引中没有时直接返回无方案，不再按向量检索返回其他车型的方案；
+# backend为向量检索后端：redis（RedisVectorStore）或numpy（进程内矩阵，从Redis导出到numpy_index_path
+# 并以内存映射打开，入库版本变化时重新导出）
+RAG_CONFIG = {
+    'redis_url': os.getenv('REDIS_URL', 'redis://localhost:6379'),
+    'index_name': 'loan_scheme',
+    'embedding_model': 'text-embedding-v1',
+    'embedding_dimensions': 1536,
+    'k': 20,
+    'max_connections': 64,
+    'pool_timeout': 5,
+    'socket_timeout': 5,
+    'health_check_interval': 30,
+    'scheme_index_prefix': 'loan_scheme_index',
+    'model_id_pattern': r'BMW\d+',
+    'backend': os.getenv('RAG_BACKEND', 'redis'),
+    'numpy_index_path': 'data/loan_scheme_vectors'
+}
+
+# 嵌入模型设定：provider为dashscope（RAG_CONFIG['embedding_model']）或fake（本地确定性向量，
+# 每次调用等待fake_latency_ms毫秒模拟接口往返，用于测试与基准）；查询向量按(模型, 文本哈希)缓存，
+# 进程内LRU最多cache_size条（以float32保存，1536维每条约6KB，10000条约60MB），
+# redis_cache为True时以Redis为第二级缓存（键前缀key_prefix，保留ttl秒）；
+# 并发的嵌入请求最多等待batch_max_delay_ms毫秒或凑满batch_max_size条后合并为一次批量调用
+EMBEDDING_CONFIG = {
+    'provider': os.getenv('EMBEDDING_PROVIDER', 'dashscope'),
+    'fake_latency_ms': 0,
+    'cache_size': 10000,
+    'redis_cache': True,
+    'key_prefix': 'embedding_cache:',
+    'ttl': 7 * 24 * 3600,
+    'batch_max_size': 25,
+    'batch_max_delay_ms': 5
+}
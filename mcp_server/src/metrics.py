@@ -0,0 +1,15 @@
+# metrics.py
+from typing import Iterable, Optional
+
+
+def percentile(values: Iterable[float], q: float) -> Optional[float]:
+    """Return the q-th quantile (0-1) of the values by nearest rank, or None when there are none."""
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def format_ms(value: Optional[float], width: int, digits: int = 2) -> str:
+    """Format a latency in milliseconds for a report column; '-' when there were no samples."""
+    return f"{value:{width}.{digits}f}ms" if value is not None else f"{'-':>{width}}ms"
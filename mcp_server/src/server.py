@@ -1,8 +1,11 @@
 import asyncio
 from fastmcp import FastMCP
 from fastmcp.tools import tool
+from starlette.requests import Request
+from starlette.responses import JSONResponse
 from src.services.loan_suggest import LoanSuggestService
 from src.services.loan_pre_examination import LoanPreExaminationService
+from src.services.rag_resources import rag_resources
 from typing import Dict, Optional
 
 mcp = FastMCP("auto_finance_mcp")
@@ -22,8 +25,18 @@ async def create_examination_result(id_number:str,phone_number:str,result:str):
     # """对外暴露的信用报告查询接口（调用封装好的 CreditReportingService）"""
     await LoanPreExaminationService.create_examination_result(id_number,phone_number,result)
 
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics(request: Request) -> JSONResponse:
+    # 向量存储连接、车型索引与嵌入缓存/批处理的计数
+    return JSONResponse({'rag': rag_resources.get_metrics()})
+
 async def main():
-    await mcp.run_streamable_http_async(host="0.0.0.0", port=8000)
+    # 共享资源的生命周期与进程一致；FastMCP的lifespan在streamable HTTP下按MCP会话执行，不适用
+    await rag_resources.start()
+    try:
+        await mcp.run_streamable_http_async(host="0.0.0.0", port=8000)
+    finally:
+        await rag_resources.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,300 @@
+from array import array
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from langchain_core.embeddings import DeterministicFakeEmbedding, Embeddings
+from src.config.settings import EMBEDDING_CONFIG, RAG_CONFIG
+import redis.asyncio as redis
+import asyncio
+import hashlib
+import threading
+import time
+import logging.config
+import os
+
+log_config_path = os.path.abspath("src/config/logging.conf")
+logging.config.fileConfig(log_config_path, encoding='utf-8')
+logger = logging.getLogger(__name__)
+
+
+class FakeEmbeddings(Embeddings):
+    """本地确定性嵌入模型，用于测试与基准：同一文本总是得到同一向量，不需要网络与API Key。
+
+    每次调用等待latency秒模拟嵌入接口的往返，calls与texts记录调用次数与文本数。
+    """
+
+    def __init__(self, size: int = RAG_CONFIG['embedding_dimensions'], latency: float = 0.0):
+        self.fake = DeterministicFakeEmbedding(size=size)
+        self.latency = latency
+        self.calls = 0
+        self.texts = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self._record(len(texts))
+        return self.fake.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        self._record(1)
+        return self.fake.embed_query(text)
+
+    def _record(self, texts: int) -> None:
+        self.calls += 1
+        self.texts += texts
+        if self.latency:
+            time.sleep(self.latency)
+
+
+class EmbeddingBatcher:
+    """嵌入请求的微批处理：收集并发的单条请求，最多等待max_delay_ms毫秒或凑满max_batch_size条后合并为
+    一次批量调用。正在等待或正在请求中的文本不重复发送，相同文本的请求共享同一个结果。
+    """
+
+    def __init__(self,
+                 embed: Callable[[List[str]], Awaitable[List[List[float]]]],
+                 max_batch_size: int = EMBEDDING_CONFIG['batch_max_size'],
+                 max_delay_ms: float = EMBEDDING_CONFIG['batch_max_delay_ms']):
+        """
+        Args:
+            embed: The batched embedding call.
+            max_batch_size: Maximum texts per call (DashScope accepts 25).
+            max_delay_ms: Maximum time a request waits for others to join its batch.
+        """
+        self.embed = embed
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay_ms / 1000
+        self.pending: List[Tuple[str, asyncio.Future]] = []
+        # 已排队或请求中的文本 -> 结果
+        self.inflight: Dict[str, asyncio.Future] = {}
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.tasks: set = set()
+        self.requests = 0
+        self.coalesced = 0
+        self.batches = 0
+        self.batched_texts = 0
+        self.max_seen_batch = 0
+
+    async def embed_one(self, text: str) -> List[float]:
+        """Embed one text as part of the next batch."""
+        self.requests += 1
+        future = self.inflight.get(text)
+        if future is not None:
+            self.coalesced += 1
+        else:
+            loop = asyncio.get_running_loop()
+            future = self.inflight[text] = loop.create_future()
+            self.pending.append((text, future))
+            if len(self.pending) >= self.max_batch_size:
+                self._flush()
+            elif self.timer is None:
+                self.timer = loop.call_later(self.max_delay, self._flush)
+        # 一个请求被取消时不影响共享同一结果的其他请求
+        return await asyncio.shield(future)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get the request, batch and saved call counters."""
+        return {
+            'requests': self.requests,
+            'coalesced': self.coalesced,
+            'batches': self.batches,
+            'avg_batch_size': round(self.batched_texts / self.batches, 2) if self.batches else None,
+            'max_batch_size': self.max_seen_batch,
+            'saved_calls': self.requests - self.batches,
+        }
+
+    def _flush(self) -> None:
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending[:self.max_batch_size], self.pending[self.max_batch_size:]
+        if self.pending:
+            self.timer = asyncio.get_running_loop().call_later(self.max_delay, self._flush)
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        texts = [text for text, _ in batch]
+        self.batches += 1
+        self.batched_texts += len(texts)
+        self.max_seen_batch = max(self.max_seen_batch, len(texts))
+        try:
+            vectors = await self.embed(texts)
+            if len(vectors) != len(texts):
+                # 返回数量不符时无法确定向量与文本的对应关系，整批失败，避免等待的请求永远得不到结果
+                raise ValueError(f"Embedding call returned {len(vectors)} vectors for {len(texts)} texts")
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        finally:
+            for text in texts:
+                self.inflight.pop(text, None)
+        for (_, future), vector in zip(batch, vectors):
+            future.set_result(vector)
+
+
+class CachedEmbeddings(Embeddings):
+    """带两级缓存与微批处理的嵌入模型。
+
+    缓存键为(模型名称, 文本的SHA-256)。第一级为进程内的LRU（向量以float32的array保存，1536维约6KB，
+    读取时转换回列表），启用redis时第二级为Redis（向量以float32字节保存），在多个进程与重启之间共享。异步接口（工具调用使用）依次查询两级缓存，未命中的请求
+    经EmbeddingBatcher合并后调用模型；同步接口（RedisVectorStore入库时调用）只使用进程内缓存，
+    未命中的文本一次批量调用模型。Redis不可用时按未命中处理。
+    """
+
+    def __init__(self,
+                 embeddings: Embeddings,
+                 model_name: str,
+                 max_entries: int = EMBEDDING_CONFIG['cache_size'],
+                 redis_enabled: bool = EMBEDDING_CONFIG['redis_cache'],
+                 redis_url: str = RAG_CONFIG['redis_url'],
+                 key_prefix: str = EMBEDDING_CONFIG['key_prefix'],
+                 ttl: int = EMBEDDING_CONFIG['ttl']):
+        """
+        Args:
+            embeddings: The embedding model.
+            model_name: Part of the cache key; vectors of different models never mix.
+            max_entries: Maximum vectors kept in memory.
+            redis_enabled: Use Redis as the second tier.
+            redis_url: Redis connection URL.
+            key_prefix: Prefix of the Redis keys.
+            ttl: Seconds a vector stays in Redis.
+        """
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.redis = redis.from_url(redis_url, socket_timeout=RAG_CONFIG['socket_timeout'],
+                                    socket_connect_timeout=RAG_CONFIG['socket_timeout']) if redis_enabled else None
+        self.key_prefix = key_prefix
+        self.ttl = ttl
+        self.batcher = EmbeddingBatcher(self._embed_batch)
+        self.entries: "OrderedDict[str, array]" = OrderedDict()
+        # 同步接口在线程池中调用，与事件循环共享LRU
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def key(self, text: str) -> str:
+        return f"{self.key_prefix}{self.model_name}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = self.key(text)
+        vector = self._get(key)
+        if vector is not None:
+            self.hits += 1
+            return vector
+        if self.redis:
+            try:
+                data = await self.redis.get(key)
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"Failed to read the embedding cache from Redis: {e}")
+                data = None
+            if data:
+                vector = array('f', data)
+                self._store(key, vector)
+                self.hits += 1
+                self.redis_hits += 1
+                return vector.tolist()
+        self.misses += 1
+        return await self.batcher.embed_one(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return list(await asyncio.gather(*(self.aembed_query(text) for text in texts)))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self.key(text) for text in texts]
+        vectors = [self._get(key) for key in keys]
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        self.hits += len(texts) - sum(vector is None for vector in vectors)
+        self.misses += len(missing)
+        if missing:
+            embedded_vectors = self.embeddings.embed_documents(missing)
+            if len(embedded_vectors) != len(missing):
+                raise ValueError(f"Embedding call returned {len(embedded_vectors)} vectors for {len(missing)} texts")
+            embedded = dict(zip(missing, embedded_vectors))
+            for i, text in enumerate(texts):
+                if vectors[i] is None:
+                    vectors[i] = embedded[text]
+                    self._remember(keys[i], vectors[i])
+        return vectors
+
+    async def close(self) -> None:
+        if self.redis:
+            await self.redis.aclose()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get the cache and batching counters."""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'redis_hits': self.redis_hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            'errors': self.errors,
+            'batching': self.batcher.get_metrics(),
+            # 缓存命中与批处理合并共节省的模型调用次数
+            'saved_calls': self.hits + self.batcher.get_metrics()['saved_calls'],
+        }
+
+    async def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        vectors = await self.embeddings.aembed_documents(texts)
+        if len(vectors) != len(texts):
+            raise ValueError(f"Embedding call returned {len(vectors)} vectors for {len(texts)} texts")
+        # 在批次完成时写入缓存，之后到达的请求直接命中
+        keys = [self.key(text) for text in texts]
+        for key, vector in zip(keys, vectors):
+            self._remember(key, vector)
+        if self.redis:
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                for key, vector in zip(keys, vectors):
+                    pipe.set(key, array('f', vector).tobytes(), ex=self.ttl)
+                await pipe.execute()
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"Failed to write the embedding cache to Redis: {e}")
+        return vectors
+
+    def _get(self, key: str) -> Optional[List[float]]:
+        with self.lock:
+            vector = self.entries.get(key)
+            if vector is None:
+                return None
+            self.entries.move_to_end(key)
+        return vector.tolist()
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        # 列表中每个float对象约24字节另加8字节指针，float32的array每维4字节
+        self._store(key, array('f', vector))
+
+    def _store(self, key: str, vector: array) -> None:
+        with self.lock:
+            self.entries[key] = vector
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+def create_embeddings(provider: str = EMBEDDING_CONFIG['provider']) -> CachedEmbeddings:
+    """Create the cached embedding model of the configured provider.
+
+    Args:
+        provider: 'dashscope' for RAG_CONFIG['embedding_model'] on DashScope, 'fake' for FakeEmbeddings.
+    """
+    if provider == 'fake':
+        return CachedEmbeddings(FakeEmbeddings(latency=EMBEDDING_CONFIG['fake_latency_ms'] / 1000), 'fake')
+    if provider == 'dashscope':
+        # 只有使用DashScope时才需要langchain_community
+        from langchain_community.embeddings import DashScopeEmbeddings
+        from src.config.load_key import load_key
+        embeddings = DashScopeEmbeddings(model=RAG_CONFIG['embedding_model'],
+                                         dashscope_api_key=load_key("DASHSCOPE_API_KEY"))
+        return CachedEmbeddings(embeddings, RAG_CONFIG['embedding_model'])
+    raise ValueError(f"Unknown embedding provider: {provider}")
@@ -1,9 +1,10 @@
 from typing import Dict, Optional
-from src.config.load_key import load_key
-from langchain_redis import RedisConfig, RedisVectorStore
-from langchain_community.embeddings import DashScopeEmbeddings
+from src.config.settings import RAG_CONFIG
+from src.services.numpy_index import NumpyVectorIndex
+from src.services.rag_resources import rag_resources
 from pydantic import BaseModel, Field
 from typing import List
+import asyncio
 import logging.config
 import os
 
@@ -39,34 +40,31 @@ class LoanSuggestService:
             result.error = "model_id cannot be empty."
             return result.model_dump()
         
+        # 精确的model_id直接从车型索引的内存镜像返回，不调用嵌入接口与向量检索
+        schemes = rag_resources.scheme_index.lookup(model_id)
+        if schemes is not None:
+            logger.info(f"Found {len(schemes)} schemes in the model index for model_id: {model_id}")
+            result.schemes = list(schemes)
+            result.count = len(schemes)
+            return result.model_dump()
+        if rag_resources.scheme_index.is_unknown_model(model_id):
+            # 向量检索只会返回其他车型的方案
+            logger.info(f"No schemes in the model index for model_id: {model_id}")
+            result.error = f"No loan scheme is available for model_id {model_id}."
+            return result.model_dump()
+        
         try:
-            logger.info(f"Initializing embedding model for model_id: {model_id}")
-            # 初始化嵌入模型
-            embedding_model = DashScopeEmbeddings(
-                model="text-embedding-v1",
-                dashscope_api_key=load_key("DASHSCOPE_API_KEY"),
-            )
-            
-            logger.info("Configuring Redis vector store")
-            # 配置Redis向量存储
-            redis_url = "redis://localhost:6379"
-            config = RedisConfig(
-                index_name="loan_scheme",
-                redis_url=redis_url
-            )
-            
-            logger.info("Creating vector store instance")
-            # 创建向量存储实例
-            vector_store = RedisVectorStore(embedding_model, config=config)
-            
-            logger.info("Getting retriever and invoking it")
-            # 获取检索器并检索相关文档
-            retriever = vector_store.as_retriever(
-                search_kwargs={"k": 20}  # 最多返回3个最相关的结果
-            )
+            # 不在索引中的输入（如自由文本描述）使用向量检索
+            # 使用服务进程共享的向量存储（嵌入模型客户端与Redis连接池在启动时创建）
+            vector_store = await rag_resources.get_vector_store()
             
-            # 调用检索器（使用to_thread适配同步方法为异步）
-            docs = await retriever.ainvoke(model_id)
+            # 查询向量经两级缓存与微批处理获得，再按向量检索相关文档
+            embedding = await rag_resources.embeddings.aembed_query(model_id)
+            if isinstance(vector_store, NumpyVectorIndex):
+                # 进程内矩阵检索（几百个块）不到1毫秒，直接在事件循环中执行
+                docs = vector_store.similarity_search_by_vector(embedding, k=RAG_CONFIG['k'])
+            else:
+                docs = await asyncio.to_thread(vector_store.similarity_search_by_vector, embedding, k=RAG_CONFIG['k'])
             
             logger.info(f"Retrieved {len(docs)} documents for model_id: {model_id}")
             # 处理检索结果
@@ -0,0 +1,172 @@
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.documents import Document
+from redis import Redis
+import numpy as np
+import glob
+import json
+import time
+import uuid
+import logging.config
+import os
+
+log_config_path = os.path.abspath("src/config/logging.conf")
+logging.config.fileConfig(log_config_path, encoding='utf-8')
+logger = logging.getLogger(__name__)
+
+# 导出锁：同一时间只有一个worker从Redis导出并保存索引；锁在EXPORT_LOCK_TTL秒后自动过期，最多等待EXPORT_LOCK_WAIT秒
+EXPORT_LOCK_PREFIX = 'numpy_index_export:'
+EXPORT_LOCK_TTL = 120
+EXPORT_LOCK_WAIT = 60
+# 矩阵文件写入后至少保留的秒数，其他worker写完矩阵、替换描述文件之前不会被删除
+STALE_GRACE = 60
+
+
+class NumpyVectorIndex:
+    """进程内的向量索引：全部向量保存在一个连续的float32矩阵中，检索为矩阵与查询向量的乘积加argpartition取top-k。
+
+    方案语料只有几百个块，精确检索在本进程内完成，不再经过网络访问Redis向量索引。向量按行归一化，
+    内积即余弦相似度。索引持久化为<path>.<版本>.npy（矩阵）与<path>.json（文档ID、内容、元数据与版本号），
+    以内存映射方式打开，多个worker进程共享同一份页缓存，启动时不需要重新读取或计算。
+    """
+
+    def __init__(self, matrix: np.ndarray, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]],
+                 version: int = 0):
+        self.matrix = matrix
+        self.ids = ids
+        self.texts = texts
+        self.metadatas = metadatas
+        self.version = version
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @staticmethod
+    def normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact top-k by cosine similarity for a batch of query vectors.
+
+        Args:
+            queries: Query vectors, shape (m, d).
+            k: Results per query.
+
+        Returns:
+            Row indices and similarities, shape (m, min(k, n)), best first.
+        """
+        queries = self.normalize(np.asarray(queries, dtype=np.float32))
+        k = min(k, len(self))
+        if k == 0:
+            return np.empty((len(queries), 0), dtype=np.int64), np.empty((len(queries), 0), dtype=np.float32)
+        scores = queries @ self.matrix.T
+        # argpartition取出前k个（无序），只对这k个排序
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k] if k < len(self) else np.argsort(-scores, axis=1)
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+    def similarity_search_by_vectors(self, embeddings: List[List[float]], k: int = 4) -> List[List[Document]]:
+        """Get the k most similar documents for each of a batch of query vectors."""
+        indices, scores = self.search(np.asarray(embeddings, dtype=np.float32), k)
+        return [
+            [Document(page_content=self.texts[i], metadata={**self.metadatas[i], 'score': float(score)}, id=self.ids[i])
+             for i, score in zip(row_indices, row_scores)]
+            for row_indices, row_scores in zip(indices, scores)
+        ]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        """Get the k most similar documents; same call as RedisVectorStore.similarity_search_by_vector."""
+        return self.similarity_search_by_vectors([embedding], k)[0]
+
+    def save(self, path: str) -> None:
+        """Write the index to path, replacing an earlier version atomically."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # 矩阵文件名带版本与随机后缀，写完后再替换描述文件；已映射旧矩阵的进程不受影响
+        matrix_path = f"{path}.{self.version}-{uuid.uuid4().hex[:8]}.npy"
+        np.save(matrix_path, np.ascontiguousarray(self.matrix, dtype=np.float32))
+        manifest_tmp = f"{path}.json.{uuid.uuid4().hex[:8]}.tmp"
+        with open(manifest_tmp, 'w', encoding='utf-8') as f:
+            json.dump({'version': self.version, 'matrix': os.path.basename(matrix_path), 'ids': self.ids,
+                       'texts': self.texts, 'metadatas': self.metadatas}, f, ensure_ascii=False)
+        os.replace(manifest_tmp, f"{path}.json")
+        self._remove_stale(path)
+
+    @staticmethod
+    def _remove_stale(path: str) -> None:
+        # 只删除比描述文件当前指向的矩阵更早、且已写入超过STALE_GRACE秒的矩阵：
+        # 其他worker刚写完、尚未替换描述文件的矩阵保留，留到下一次保存时删除
+        directory = os.path.dirname(os.path.abspath(path))
+        try:
+            with open(f"{path}.json", encoding='utf-8') as f:
+                current = os.path.join(directory, json.load(f)['matrix'])
+            current_mtime = os.path.getmtime(current)
+        except (FileNotFoundError, ValueError, KeyError):
+            return
+        deadline = min(current_mtime, time.time() - STALE_GRACE)
+        for stale in glob.glob(f"{glob.escape(path)}.*.npy"):
+            try:
+                if stale != current and os.path.getmtime(stale) < deadline:
+                    os.remove(stale)
+            except OSError:
+                pass
+
+    @classmethod
+    def load(cls, path: str) -> Optional["NumpyVectorIndex"]:
+        """Open a saved index with the matrix memory-mapped, or None when there is none."""
+        try:
+            with open(f"{path}.json", encoding='utf-8') as f:
+                manifest = json.load(f)
+            matrix = np.load(os.path.join(os.path.dirname(os.path.abspath(path)), manifest['matrix']), mmap_mode='r')
+        except FileNotFoundError:
+            return None
+        return cls(matrix, manifest['ids'], manifest['texts'], manifest['metadatas'], manifest['version'])
+
+    @classmethod
+    def export_from_redis(cls, redis_client: Redis, key_prefix: str, version: int) -> "NumpyVectorIndex":
+        """Read every document of a RedisVectorStore index (hash storage, FLOAT32 vectors)."""
+        keys = sorted(redis_client.scan_iter(match=f"{key_prefix}:*"))
+        pipe = redis_client.pipeline(transaction=False)
+        for key in keys:
+            pipe.hmget(key, 'text', 'embedding', '_metadata_json')
+        ids, texts, metadatas, vectors = [], [], [], []
+        for key, (text, embedding, metadata) in zip(keys, pipe.execute()):
+            if text is None or embedding is None:
+                continue
+            ids.append(key.decode('utf-8')[len(key_prefix) + 1:])
+            texts.append(text.decode('utf-8'))
+            metadatas.append(json.loads(metadata) if metadata else {})
+            vectors.append(np.frombuffer(embedding, dtype=np.float32))
+        matrix = cls.normalize(np.vstack(vectors)) if vectors else np.empty((0, 0), dtype=np.float32)
+        return cls(matrix.astype(np.float32), ids, texts, metadatas, version)
+
+    @classmethod
+    def load_or_export(cls, redis_client: Redis, key_prefix: str, path: str, version: int) -> "NumpyVectorIndex":
+        """Open the saved index when it matches the ingested version, otherwise export it from Redis and save it.
+
+        The version is the model index version that rag_input.py increases on every ingestion. Workers
+        export one at a time under a Redis lock; the others wait and then open the saved file. When the
+        lock cannot be acquired within EXPORT_LOCK_WAIT seconds the worker exports anyway.
+        """
+        index = cls.load(path)
+        if index is not None and index.version == version:
+            return index
+        lock = redis_client.lock(f"{EXPORT_LOCK_PREFIX}{key_prefix}", timeout=EXPORT_LOCK_TTL,
+                                 blocking_timeout=EXPORT_LOCK_WAIT, thread_local=False)
+        acquired = lock.acquire()
+        try:
+            # 等待期间其他worker可能已经导出了同一版本
+            index = cls.load(path)
+            if index is not None and index.version == version:
+                return index
+            index = cls.export_from_redis(redis_client, key_prefix, version)
+            index.save(path)
+            logger.info(f"Exported {len(index)} documents of version {version} from Redis to {path}")
+        finally:
+            if acquired:
+                try:
+                    lock.release()
+                except Exception as e:
+                    logger.warning(f"Failed to release the export lock of {key_prefix}: {e}")
+        # 另一个worker刚好替换了文件时使用内存中的索引
+        return cls.load(path) or index
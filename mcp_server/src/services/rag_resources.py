@@ -0,0 +1,167 @@
+from typing import Any, Dict, Optional, Union
+from langchain_core.embeddings import Embeddings
+from langchain_redis import RedisConfig, RedisVectorStore
+from redis import BlockingConnectionPool, Redis
+from src.config.settings import RAG_CONFIG
+from src.services.embeddings import CachedEmbeddings, create_embeddings
+from src.services.numpy_index import NumpyVectorIndex
+from src.services.scheme_index import SchemeIndex
+import asyncio
+import time
+import logging.config
+import os
+
+log_config_path = os.path.abspath("src/config/logging.conf")
+logging.config.fileConfig(log_config_path, encoding='utf-8')
+logger = logging.getLogger(__name__)
+
+
+class RagResources:
+    """进程级共享的RAG资源：嵌入模型客户端、Redis连接池、向量存储（RedisVectorStore或NumpyVectorIndex）与车型索引。
+
+    服务启动时创建一次，并发的工具调用共享同一个向量存储，不再每次调用都新建客户端、连接Redis并读取索引。
+    后台任务定期检查Redis并刷新车型索引，失败时重建连接池与向量存储；服务关闭时释放连接。healthy为最近一次检查的结果。
+    """
+
+    def __init__(self, config: Dict[str, Any] = RAG_CONFIG, embeddings: Optional[Embeddings] = None):
+        """
+        Args:
+            config: The RAG settings, see RAG_CONFIG.
+            embeddings: The embedding model; create_embeddings() (cached and batched) when not given.
+        """
+        self.config = config
+        self.embeddings = embeddings
+        self.pool: Optional[BlockingConnectionPool] = None
+        self.redis: Optional[Redis] = None
+        self.vector_store: Optional[Union[RedisVectorStore, NumpyVectorIndex]] = None
+        self.scheme_index = SchemeIndex(config['scheme_index_prefix'])
+        self.healthy = False
+        self.reconnects = 0
+        self._lock = asyncio.Lock()
+        self._last_error: Optional[Exception] = None
+        self._retry_at = 0.0
+        self._health_task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        """Create the resources and start the health check.
+
+        A Redis that is not reachable yet does not stop the server: the connection is retried by the
+        health check and by the next tool call.
+        """
+        try:
+            await self.get_vector_store()
+        except Exception as e:
+            logger.error(f"Failed to connect the loan scheme vector store at startup: {e}")
+        if self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def get_vector_store(self) -> Union[RedisVectorStore, NumpyVectorIndex]:
+        """Get the shared vector store, connecting first when there is none yet.
+
+        After a failed connection attempt, calls within the next second fail with the same error
+        instead of each waiting for its own connection timeout.
+        """
+        if self.vector_store is None:
+            async with self._lock:
+                if self.vector_store is None:
+                    if self._last_error and time.monotonic() < self._retry_at:
+                        raise ConnectionError(f"Loan scheme vector store unavailable: {self._last_error}")
+                    try:
+                        await self._connect()
+                    except Exception as e:
+                        self._last_error, self._retry_at = e, time.monotonic() + 1
+                        raise
+        return self.vector_store
+
+    async def close(self) -> None:
+        """Stop the health check and close the Redis connections."""
+        if self._health_task:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
+        if self.pool:
+            self.pool.disconnect()
+        self.pool = self.redis = self.vector_store = None
+        self.healthy = False
+        if isinstance(self.embeddings, CachedEmbeddings):
+            await self.embeddings.close()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get the connection, model index and embedding counters."""
+        return {
+            'healthy': self.healthy,
+            'reconnects': self.reconnects,
+            'backend': self.config['backend'],
+            'documents': len(self.vector_store) if isinstance(self.vector_store, NumpyVectorIndex) else None,
+            'scheme_index': {
+                'version': int(self.scheme_index.version or 0),
+                'models': len(self.scheme_index.models),
+            },
+            'embeddings': self.embeddings.get_metrics() if isinstance(self.embeddings, CachedEmbeddings) else None,
+        }
+
+    async def _connect(self) -> None:
+        if self.embeddings is None:
+            self.embeddings = create_embeddings()
+        # 连接用尽时等待空闲连接而不是报错，并发调用超过max_connections时排队
+        pool = BlockingConnectionPool.from_url(
+            self.config['redis_url'],
+            max_connections=self.config['max_connections'],
+            timeout=self.config['pool_timeout'],
+            socket_timeout=self.config['socket_timeout'],
+            socket_connect_timeout=self.config['socket_timeout'],
+        )
+        redis_client = Redis(connection_pool=pool)
+        try:
+            await asyncio.to_thread(self.scheme_index.refresh, redis_client)
+            vector_store = await asyncio.to_thread(self._create_vector_store, redis_client)
+        except Exception:
+            pool.disconnect()
+            raise
+        old_pool = self.pool
+        self.pool, self.redis, self.vector_store, self.healthy = pool, redis_client, vector_store, True
+        self._last_error = None
+        if old_pool:
+            self.reconnects += 1
+            # 仍在使用旧连接的调用结束后，连接随旧连接池一起释放
+            old_pool.disconnect(inuse_connections=False)
+        logger.info(f"Connected the loan scheme vector store {self.config['index_name']} at {self.config['redis_url']}")
+
+    def _create_vector_store(self, redis_client: Redis) -> Union[RedisVectorStore, NumpyVectorIndex]:
+        if self.config['backend'] == 'numpy':
+            # 导出的版本与车型索引一致，入库后两者一起更新
+            return NumpyVectorIndex.load_or_export(redis_client, self.config['index_name'],
+                                                   self.config['numpy_index_path'],
+                                                   int(self.scheme_index.version or 0))
+        config = RedisConfig(
+            index_name=self.config['index_name'],
+            redis_client=redis_client,
+            embedding_dimensions=self.config['embedding_dimensions'],
+        )
+        return RedisVectorStore(self.embeddings, config=config)
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.config['health_check_interval'])
+            try:
+                if self.redis is None:
+                    await self.get_vector_store()
+                else:
+                    # 读取索引版本号同时作为连接检查
+                    if (await asyncio.to_thread(self.scheme_index.refresh, self.redis)
+                            and self.config['backend'] == 'numpy'):
+                        self.vector_store = await asyncio.to_thread(self._create_vector_store, self.redis)
+                self.healthy = True
+            except Exception as e:
+                logger.warning(f"Redis health check failed, reconnecting: {e}")
+                self.healthy = False
+                # 重建期间工具调用继续使用原有的向量存储（redis-py会为断开的连接自动重连）
+                try:
+                    async with self._lock:
+                        await self._connect()
+                except Exception as e:
+                    logger.error(f"Failed to reconnect the loan scheme vector store: {e}")
+
+
+# 服务进程内共享的实例，由server.main()启动与关闭
+rag_resources = RagResources()
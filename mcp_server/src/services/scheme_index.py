@@ -0,0 +1,66 @@
+from typing import Dict, Optional, Tuple
+from redis import Redis
+from src.config.settings import RAG_CONFIG
+import json
+import re
+import logging.config
+import os
+
+log_config_path = os.path.abspath("src/config/logging.conf")
+logging.config.fileConfig(log_config_path, encoding='utf-8')
+logger = logging.getLogger(__name__)
+
+
+class SchemeIndex:
+    """贷款方案的车型索引：从model_id到方案文本的精确映射，并在进程内存中保存一份镜像。
+
+    rag_input.py入库时解析每个方案的“适用车型”行，写入Redis的两个哈希：
+    <prefix>:schemes（方案ID→方案文本）与<prefix>:models（model_id→方案ID的JSON列表，按目录顺序），
+    每次写入后递增<prefix>:version。refresh在版本变化时重新加载镜像。精确的model_id查询直接在内存中
+    命中，不调用嵌入接口，也不做向量检索。
+    """
+
+    def __init__(self, prefix: str = RAG_CONFIG['scheme_index_prefix'],
+                 model_id_pattern: str = RAG_CONFIG['model_id_pattern']):
+        self.prefix = prefix
+        self.model_id_pattern = re.compile(model_id_pattern)
+        self.version: Optional[bytes] = None
+        self.models: Dict[str, Tuple[str, ...]] = {}
+
+    @staticmethod
+    def normalize(model_id: str) -> str:
+        return model_id.strip().upper()
+
+    def lookup(self, model_id: str) -> Optional[Tuple[str, ...]]:
+        """Get the schemes of a model ID, or None when the ID is not in the index."""
+        return self.models.get(self.normalize(model_id))
+
+    def is_unknown_model(self, model_id: str) -> bool:
+        """Whether the input is a model ID that the loaded index does not contain."""
+        # 镜像尚未加载时无法判断，按自由文本处理
+        normalized = self.normalize(model_id)
+        return bool(self.models) and normalized not in self.models and bool(self.model_id_pattern.fullmatch(normalized))
+
+    def refresh(self, redis_client: Redis) -> bool:
+        """Reload the mirror when the index version in Redis changed.
+
+        Blocking; run it in a thread. Returns whether the mirror was reloaded.
+        """
+        if redis_client.get(f"{self.prefix}:version") == self.version:
+            return False
+        # 在同一个事务中读取，避免读到入库过程中的中间状态
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.hgetall(f"{self.prefix}:schemes")
+        pipe.hgetall(f"{self.prefix}:models")
+        pipe.get(f"{self.prefix}:version")
+        schemes, models, version = pipe.execute()
+        schemes = {scheme_id.decode('utf-8'): text.decode('utf-8') for scheme_id, text in schemes.items()}
+        self.models = {
+            model_id.decode('utf-8'): tuple(schemes[scheme_id] for scheme_id in json.loads(scheme_ids)
+                                            if scheme_id in schemes)
+            for model_id, scheme_ids in models.items()
+        }
+        self.version = version
+        logger.info(f"Loaded the loan scheme index version {int(version or 0)}: {len(self.models)} models, "
+                    f"{len(schemes)} schemes")
+        return True
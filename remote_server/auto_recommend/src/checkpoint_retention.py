@@ -0,0 +1,256 @@
+from typing import Any, Dict, List, Optional
+from langgraph.checkpoint.redis import AsyncRedisSaver
+from langgraph.checkpoint.redis.base import BaseRedisSaver
+from langgraph.checkpoint.redis.util import to_storage_safe_id, to_storage_safe_str
+from redisvl.query import FilterQuery
+from redisvl.query.filter import Tag
+from src.config.settings import CHECKPOINT_CONFIG
+import redis.asyncio as redis
+import asyncio
+import time
+import os
+import logging.config
+
+log_config_path = os.path.abspath("src/config/logging.conf")
+logging.config.fileConfig(log_config_path, encoding='utf-8')
+logger = logging.getLogger(__name__)
+
+# 单个线程的检查点、blob、写入记录的最大查询数量
+MAX_RESULTS = 10000
+
+
+def checkpoint_ttl_config() -> Optional[Dict[str, Any]]:
+    """Get the AsyncRedisSaver ttl argument from CHECKPOINT_CONFIG (None disables key TTLs)."""
+    if not CHECKPOINT_CONFIG['ttl_minutes']:
+        return None
+    return {'default_ttl': CHECKPOINT_CONFIG['ttl_minutes'], 'refresh_on_read': True}
+
+
+class CheckpointRetention:
+    """检查点保留策略。
+
+    各Agent共用同一个Redis（同时保存loan_scheme向量索引），检查点默认永不删除。
+    - AsyncRedisSaver按ttl_minutes为线程的所有键设置过期时间（见checkpoint_ttl_config）；
+    - 每轮对话记录线程的最近活跃时间（按Agent分别记录在有序集合中，由后台任务批量写入，不阻塞对话）；
+    - 后台清理任务删除所有Agent都超过ttl未活跃的线程（包括启用TTL之前写入、没有过期时间的键），
+      并把上次清理后活跃过的线程裁剪为最近keep_last个检查点；
+    - get_stats给出线程数、检查点占用的字节数与淘汰速率。
+    多个worker进程时通过Redis锁保证同一时间只有一个进程执行清理。
+    """
+    THREADS_KEY = "checkpoint_threads:"
+    BYTES_KEY = "checkpoint_bytes:"
+    AGENTS_KEY = "checkpoint_agents"
+    LOCK_KEY = "checkpoint_sweep_lock:"
+
+    def __init__(self,
+                 checkpointer: AsyncRedisSaver,
+                 agent_name: str = CHECKPOINT_CONFIG['agent_name'],
+                 redis_url: str = CHECKPOINT_CONFIG['redis_url'],
+                 ttl_minutes: float = CHECKPOINT_CONFIG['ttl_minutes'],
+                 keep_last: int = CHECKPOINT_CONFIG['keep_last'],
+                 sweep_interval: float = CHECKPOINT_CONFIG['sweep_interval']):
+        self.checkpointer = checkpointer
+        self.agent_name = agent_name
+        self.redis = redis.from_url(redis_url, decode_responses=True)
+        self.ttl = ttl_minutes * 60
+        # 至少保留2个：最新检查点恢复时需要读取父检查点上的写入
+        self.keep_last = max(2, keep_last)
+        self.sweep_interval = sweep_interval
+        self.threads_key = self.THREADS_KEY + agent_name
+        self.bytes_key = self.BYTES_KEY + agent_name
+        self.sweep_task: Optional[asyncio.Task] = None
+        self.touched: Dict[str, float] = {}
+        self.touch_task: Optional[asyncio.Task] = None
+        self.last_sweep = time.time()
+        self.started_at = time.monotonic()
+        self.sweeps = 0
+        self.threads_evicted = 0
+        self.checkpoints_trimmed = 0
+        self.keys_trimmed = 0
+
+    def start(self) -> None:
+        """Start the background sweeper on the running event loop."""
+        if self.sweep_task is None and self.sweep_interval > 0:
+            self.sweep_task = asyncio.create_task(self._sweep_loop())
+
+    async def stop(self) -> None:
+        """Stop the sweeper and close the Redis connection."""
+        if self.sweep_task:
+            self.sweep_task.cancel()
+            await asyncio.gather(self.sweep_task, return_exceptions=True)
+            self.sweep_task = None
+        if self.touch_task:
+            await asyncio.gather(self.touch_task, return_exceptions=True)
+        await self.redis.aclose()
+
+    async def touch(self, thread_id: str) -> None:
+        """Record that a turn ran on the thread without waiting for Redis.
+
+        The activity is written by a background task; the threads touched while a write is in
+        flight go into the next ZADD. Failures are logged and ignored.
+        """
+        self.touched[thread_id] = time.time()
+        if self.touch_task is None or self.touch_task.done():
+            self.touch_task = asyncio.create_task(self._write_touched())
+
+    async def _write_touched(self) -> None:
+        while self.touched:
+            touched, self.touched = self.touched, {}
+            try:
+                await self.redis.zadd(self.threads_key, touched)
+            except Exception as e:
+                logger.warning(f"Failed to record checkpoint activity for {len(touched)} threads: {e}")
+
+    async def sweep(self) -> Dict[str, int]:
+        """Evict stale threads and trim threads active since the previous sweep.
+
+        Returns:
+            Dict[str, int]: Threads evicted, threads trimmed and checkpoints removed in this sweep.
+        """
+        now = time.time()
+        since, self.last_sweep = self.last_sweep, now
+        # 同一时间只允许一个进程清理，锁在一个清理周期后自动过期
+        if not await self.redis.set(self.LOCK_KEY + self.agent_name, os.getpid(), nx=True,
+                                    ex=max(1, int(self.sweep_interval))):
+            return {'evicted': 0, 'trimmed': 0, 'checkpoints': 0}
+        self.sweeps += 1
+
+        evicted = 0
+        if self.ttl:
+            stale = await self.redis.zrangebyscore(self.threads_key, '-inf', now - self.ttl)
+            for thread_id in stale:
+                if await self._evict(thread_id, now):
+                    evicted += 1
+
+        trimmed, checkpoints = 0, 0
+        for thread_id in await self.redis.zrangebyscore(self.threads_key, since, '+inf'):
+            removed = await self._trim(thread_id)
+            if removed:
+                trimmed += 1
+                checkpoints += removed
+        return {'evicted': evicted, 'trimmed': trimmed, 'checkpoints': checkpoints}
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """Get thread counts, checkpoint bytes and eviction rates."""
+        hours = max((time.monotonic() - self.started_at) / 3600, 1e-9)
+        agents = await self.redis.smembers(self.AGENTS_KEY)
+        per_agent = {}
+        for agent_name in sorted(agents):
+            # 字节数为各线程最近一次裁剪后的MEMORY USAGE之和，未裁剪过的线程不计入
+            sizes = await self.redis.hvals(self.BYTES_KEY + agent_name)
+            per_agent[agent_name] = {
+                'threads': await self.redis.zcard(self.THREADS_KEY + agent_name),
+                'bytes': sum(int(size) for size in sizes),
+            }
+        memory = await self.redis.info('memory')
+        return {
+            'agent': self.agent_name,
+            'ttl_minutes': self.ttl / 60,
+            'keep_last': self.keep_last,
+            'agents': per_agent,
+            'redis_used_memory': memory.get('used_memory'),
+            'sweeps': self.sweeps,
+            'threads_evicted': self.threads_evicted,
+            'checkpoints_trimmed': self.checkpoints_trimmed,
+            'keys_trimmed': self.keys_trimmed,
+            'threads_evicted_per_hour': round(self.threads_evicted / hours, 2),
+            'checkpoints_trimmed_per_hour': round(self.checkpoints_trimmed / hours, 2),
+        }
+
+    async def _sweep_loop(self) -> None:
+        await self.redis.sadd(self.AGENTS_KEY, self.agent_name)
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                started_at = time.perf_counter()
+                result = await self.sweep()
+                if result['evicted'] or result['trimmed']:
+                    logger.info(f"Checkpoint sweep: {result}, took {time.perf_counter() - started_at:.2f}s")
+            except Exception as e:
+                logger.warning(f"Checkpoint sweep failed: {e}")
+
+    async def _evict(self, thread_id: str, now: float) -> bool:
+        # 会话在各Agent间共用thread_id，任一Agent仍活跃则只移除本Agent的记录
+        for agent_name in await self.redis.smembers(self.AGENTS_KEY):
+            last_active = await self.redis.zscore(self.THREADS_KEY + agent_name, thread_id)
+            if last_active is not None and last_active > now - self.ttl:
+                await self._forget(thread_id)
+                return False
+        await self.checkpointer.adelete_thread(thread_id)
+        for agent_name in await self.redis.smembers(self.AGENTS_KEY):
+            await self.redis.zrem(self.THREADS_KEY + agent_name, thread_id)
+            await self.redis.hdel(self.BYTES_KEY + agent_name, thread_id)
+        self.threads_evicted += 1
+        return True
+
+    async def _forget(self, thread_id: str) -> None:
+        await self.redis.zrem(self.threads_key, thread_id)
+        await self.redis.hdel(self.bytes_key, thread_id)
+
+    async def _trim(self, thread_id: str) -> int:
+        safe_thread_id = to_storage_safe_id(thread_id)
+        checkpoint_ns = ''
+        thread_filter = (Tag('thread_id') == safe_thread_id) & (Tag('checkpoint_ns') == to_storage_safe_str(checkpoint_ns))
+
+        checkpoint_docs = (await self.checkpointer.checkpoints_index.search(FilterQuery(
+            filter_expression=thread_filter, return_fields=['checkpoint_id'], num_results=MAX_RESULTS,
+        ))).docs
+        # checkpoint_id为按时间递增的UUIDv6，逆序排列即从新到旧
+        checkpoint_ids = sorted((doc.checkpoint_id for doc in checkpoint_docs), reverse=True)
+        kept, removed = checkpoint_ids[:self.keep_last], checkpoint_ids[self.keep_last:]
+
+        # 清理不持有会话锁，执行期间可能写入新的检查点、blob与写入记录，只删除确定属于被移除检查点的键：
+        # channel版本按线程单调递增，低于保留的最旧检查点所引用版本的blob不再被任何保留的检查点引用；
+        # 保留的最旧检查点中没有的channel，其blob全部保留
+        oldest_versions: Dict[str, int] = {}
+        if removed:
+            checkpoint_tuple = await self.checkpointer.aget_tuple({'configurable': {
+                'thread_id': thread_id, 'checkpoint_ns': checkpoint_ns, 'checkpoint_id': kept[-1],
+            }})
+            if checkpoint_tuple:
+                oldest_versions = {channel: self._version_number(version)
+                                   for channel, version in checkpoint_tuple.checkpoint['channel_versions'].items()}
+
+        blob_docs = (await self.checkpointer.checkpoint_blobs_index.search(FilterQuery(
+            filter_expression=thread_filter, return_fields=['channel', 'version'], num_results=MAX_RESULTS,
+        ))).docs
+        write_docs = (await self.checkpointer.checkpoint_writes_index.search(FilterQuery(
+            filter_expression=thread_filter, return_fields=['checkpoint_id', 'task_id', 'idx'],
+            num_results=MAX_RESULTS,
+        ))).docs
+
+        delete_keys: List[str] = [
+            BaseRedisSaver._make_redis_checkpoint_key(safe_thread_id, checkpoint_ns, checkpoint_id)
+            for checkpoint_id in removed
+        ]
+        keep_keys: List[str] = [
+            BaseRedisSaver._make_redis_checkpoint_key(safe_thread_id, checkpoint_ns, checkpoint_id)
+            for checkpoint_id in kept
+        ]
+        for doc in blob_docs:
+            key = BaseRedisSaver._make_redis_checkpoint_blob_key(safe_thread_id, checkpoint_ns, doc.channel, doc.version)
+            stale = doc.channel in oldest_versions and self._version_number(doc.version) < oldest_versions[doc.channel]
+            (delete_keys if stale else keep_keys).append(key)
+        removed_ids = set(removed)
+        for doc in write_docs:
+            key = BaseRedisSaver._make_redis_checkpoint_writes_key(
+                safe_thread_id, checkpoint_ns, doc.checkpoint_id, doc.task_id, getattr(doc, 'idx', 0))
+            (delete_keys if doc.checkpoint_id in removed_ids else keep_keys).append(key)
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            if delete_keys:
+                pipe.delete(*delete_keys)
+            for key in keep_keys:
+                pipe.memory_usage(key)
+            results = await pipe.execute()
+        sizes = results[1:] if delete_keys else results
+        await self.redis.hset(self.bytes_key, thread_id, sum(size or 0 for size in sizes))
+
+        self.checkpoints_trimmed += len(removed)
+        self.keys_trimmed += len(delete_keys)
+        return len(removed)
+
+    @staticmethod
+    def _version_number(version: Any) -> int:
+        # AsyncRedisSaver的版本为"<32位递增序号>.<随机数>"
+        return version if isinstance(version, int) else int(str(version).split('.')[0])
@@ -0,0 +1,186 @@
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from src.config.load_key import load_key
+from src.config.settings import MODEL_CONFIG
+from src.trace_recorder import load_recording
+import asyncio
+import json
+import time
+
+# 本地模型的回答文本，按两个字符一个token循环取用
+FAKE_ANSWER = "根据您提供的信息，为您整理了以下内容，请确认是否符合您的需求。"
+
+
+class FakeChatModel(BaseChatModel):
+    """确定性的本地聊天模型，不访问网络，用于测量框架自身的开销。
+
+    每轮（最后一条用户消息之后）先依次发出tool_calls中的工具调用，每次调用一个工具，全部得到
+    结果后流式输出answer_tokens个token的回答。首个token在ttft_ms毫秒后输出，之后按
+    tokens_per_second的速度输出。相同的对话总是得到相同的输出。
+    """
+    ttft_ms: float = 300
+    tokens_per_second: float = 50
+    answer_tokens: int = 200
+    # 每轮按顺序发出的工具调用：{'name': 工具名, 'args': 参数}
+    tool_calls: List[Dict[str, Any]] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "FakeChatModel":
+        return self
+
+    def _next_message(self, messages: List[BaseMessage]) -> AIMessage:
+        turn = sum(isinstance(message, HumanMessage) for message in messages)
+        called = 0
+        for message in reversed(messages):
+            if isinstance(message, HumanMessage):
+                break
+            called += isinstance(message, ToolMessage)
+        if called < len(self.tool_calls):
+            tool_call = self.tool_calls[called]
+            return AIMessage(content='', tool_calls=[{
+                'name': tool_call['name'], 'args': tool_call.get('args', {}), 'id': f"call_{turn}_{called}",
+            }])
+        return AIMessage(content=''.join(self._tokens()))
+
+    def _tokens(self) -> List[str]:
+        text = FAKE_ANSWER * (self.answer_tokens * 2 // len(FAKE_ANSWER) + 1)
+        return [text[i * 2:i * 2 + 2] for i in range(self.answer_tokens)]
+
+    def _chunks(self, message: AIMessage) -> List[AIMessageChunk]:
+        if message.tool_calls:
+            return [AIMessageChunk(content='', tool_call_chunks=[{
+                'name': call['name'], 'args': json.dumps(call['args'], ensure_ascii=False), 'id': call['id'], 'index': i,
+            } for i, call in enumerate(message.tool_calls)])]
+        return [AIMessageChunk(content=token) for token in self._tokens()]
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None,
+                  **kwargs: Any) -> ChatResult:
+        message = self._next_message(messages)
+        time.sleep(self.ttft_ms / 1000 + max(0, len(self._chunks(message)) - 1) / self.tokens_per_second)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None,
+                         **kwargs: Any) -> ChatResult:
+        message = self._next_message(messages)
+        await asyncio.sleep(self.ttft_ms / 1000 + max(0, len(self._chunks(message)) - 1) / self.tokens_per_second)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None,
+                **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        for i, chunk in enumerate(self._chunks(self._next_message(messages))):
+            time.sleep(self.ttft_ms / 1000 if i == 0 else 1 / self.tokens_per_second)
+            generation = ChatGenerationChunk(message=chunk)
+            if run_manager:
+                run_manager.on_llm_new_token(generation.text, chunk=generation)
+            yield generation
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        for i, chunk in enumerate(self._chunks(self._next_message(messages))):
+            await asyncio.sleep(self.ttft_ms / 1000 if i == 0 else 1 / self.tokens_per_second)
+            generation = ChatGenerationChunk(message=chunk)
+            if run_manager:
+                await run_manager.on_llm_new_token(generation.text, chunk=generation)
+            yield generation
+
+
+class ReplayChatModel(BaseChatModel):
+    """按录制文件（src/trace_recorder.py）回放的聊天模型，不访问网络。
+
+    以对话内容（不含系统消息）查找录制的模型调用，按录制的逐token时间间隔除以speed输出相同的回答与工具调用；
+    speed为0时不等待。找不到录制时抛出LookupError。
+    """
+    speed: float = 1.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay-chat"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "ReplayChatModel":
+        return self
+
+    @staticmethod
+    def _recorded(messages: List[BaseMessage]) -> Dict[str, Any]:
+        return load_recording().model_call(messages)
+
+    @staticmethod
+    def _message(call: Dict[str, Any]) -> AIMessage:
+        return AIMessage(content=call['content'], tool_calls=call['tool_calls'])
+
+    def _chunks(self, call: Dict[str, Any]) -> List[Tuple[float, AIMessageChunk]]:
+        """The recorded chunks with their offsets from the start of the call in milliseconds."""
+        tokens = call['tokens']
+        if not tokens or ''.join(token for _, token in tokens) != call['content']:
+            tokens = [(call['duration_ms'], call['content'])]
+        chunks = [(offset, AIMessageChunk(content=token)) for offset, token in tokens]
+        if call['tool_calls']:
+            chunks.append((call['duration_ms'], AIMessageChunk(content='', tool_call_chunks=[{
+                'name': tool_call['name'], 'args': json.dumps(tool_call['args'], ensure_ascii=False),
+                'id': tool_call['id'], 'index': i,
+            } for i, tool_call in enumerate(call['tool_calls'])])))
+        return chunks
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None,
+                  **kwargs: Any) -> ChatResult:
+        call = self._recorded(messages)
+        if self.speed:
+            time.sleep(call['duration_ms'] / 1000 / self.speed)
+        return ChatResult(generations=[ChatGeneration(message=self._message(call))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None,
+                         **kwargs: Any) -> ChatResult:
+        call = self._recorded(messages)
+        if self.speed:
+            await asyncio.sleep(call['duration_ms'] / 1000 / self.speed)
+        return ChatResult(generations=[ChatGeneration(message=self._message(call))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None,
+                **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        previous = 0.0
+        for offset, chunk in self._chunks(self._recorded(messages)):
+            if self.speed:
+                time.sleep(max(0.0, offset - previous) / 1000 / self.speed)
+            previous = offset
+            generation = ChatGenerationChunk(message=chunk)
+            if run_manager:
+                run_manager.on_llm_new_token(generation.text, chunk=generation)
+            yield generation
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        previous = 0.0
+        for offset, chunk in self._chunks(self._recorded(messages)):
+            if self.speed:
+                await asyncio.sleep(max(0.0, offset - previous) / 1000 / self.speed)
+            previous = offset
+            generation = ChatGenerationChunk(message=chunk)
+            if run_manager:
+                await run_manager.on_llm_new_token(generation.text, chunk=generation)
+            yield generation
+
+
+def create_chat_model(**kwargs: Any) -> BaseChatModel:
+    """Create the chat model selected by MODEL_CONFIG['provider'].
+
+    Args:
+        **kwargs: Extra ChatTongyi arguments (e.g. temperature); ignored by the fake and replay models.
+    """
+    if MODEL_CONFIG['provider'] == 'fake':
+        return FakeChatModel(**MODEL_CONFIG['fake'])
+    if MODEL_CONFIG['provider'] == 'replay':
+        return ReplayChatModel(speed=MODEL_CONFIG['replay']['speed'])
+    if MODEL_CONFIG['provider'] != 'tongyi':
+        raise ValueError(f"Unknown model provider: {MODEL_CONFIG['provider']}")
+    # 只有使用通义千问时才需要langchain_community
+    from langchain_community.chat_models import ChatTongyi
+    return ChatTongyi(
+        base_url=MODEL_CONFIG['base_url'],
+        api_key=load_key("DASHSCOPE_API_KEY"),
+        model=MODEL_CONFIG['model'],
+        **kwargs,
+    )
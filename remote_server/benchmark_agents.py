@@ -0,0 +1,196 @@
+"""Throughput benchmark of the remote agents' A2A endpoints with the local fake model.
+
+Each agent is started with MODEL_PROVIDER=fake. That selects the deterministic model from
+src/model_provider.py and the in-process checkpointer, SQLite database and MCP tools from
+src/fake_backends.py, so no network, API key, Redis, MySQL or MongoDB is needed. The suite then
+sends streaming message/stream requests at rising concurrency, each with a new session.
+
+Reported per concurrency level:
+- p50/p99 TTFT: time to the first non-empty status update.
+- p50/p99 inter-chunk latency: the gap between status updates (the agents coalesce tokens).
+- streams per second.
+- Server CPU milliseconds per stream: the change in cpu_seconds from /metrics, which assumes one
+  uvicorn worker.
+
+The fake model's TTFT and token rate come from MODEL_CONFIG['fake']. Anything above them is
+framework overhead.
+
+Run from this directory:
+    python benchmark_agents.py [--agents chat_agent loan_suggest] [--levels 1 4 16 64]
+With --no-start the agents must already be running (started with MODEL_PROVIDER=fake).
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from typing import List, Optional
+from uuid import uuid4
+import httpx
+from a2a.client import A2ACardResolver, A2AClient
+from a2a.types import (
+    JSONRPCErrorResponse,
+    Message,
+    MessageSendParams,
+    Part,
+    Role,
+    SendStreamingMessageRequest,
+    TaskStatusUpdateEvent,
+    TextPart,
+)
+
+AGENTS = {
+    'chat_agent': 10050,
+    'coding_agent': 10010,
+    'auto_recommend': 10020,
+    'loan_suggest': 10030,
+    'loan_pre-examination': 10040,
+}
+LEVELS = [1, 4, 16, 64]
+STREAMS_PER_CLIENT = 3
+START_TIMEOUT = 60
+USER_INPUT = "我想买一辆适合家用的宝马，预算40万左右，有什么推荐和贷款方案？"
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+class StreamResult:
+    def __init__(self) -> None:
+        self.ttft: Optional[float] = None
+        self.gaps: List[float] = []
+        self.completed = False
+        self.error: Optional[str] = None
+
+
+async def run_stream(client: A2AClient) -> StreamResult:
+    result = StreamResult()
+    payload = MessageSendParams(
+        message=Message(role=Role.user, parts=[Part(root=TextPart(text=USER_INPUT))], message_id=str(uuid4())),
+        metadata={'session_id': str(uuid4())},
+    )
+    started_at = last_at = time.perf_counter()
+    try:
+        async for chunk in client.send_message_streaming(SendStreamingMessageRequest(id=str(uuid4()), params=payload)):
+            if isinstance(chunk.root, JSONRPCErrorResponse):
+                result.error = str(chunk.root.error)
+                return result
+            event = chunk.root.result
+            if not isinstance(event, TaskStatusUpdateEvent):
+                continue
+            if event.final:
+                result.completed = True
+                break
+            if event.status.message and event.status.message.parts and event.status.message.parts[0].root.text:
+                now = time.perf_counter()
+                if result.ttft is None:
+                    result.ttft = now - started_at
+                else:
+                    result.gaps.append(now - last_at)
+                last_at = now
+    except Exception as e:
+        result.error = str(e)
+    return result
+
+
+async def server_cpu(http_client: httpx.AsyncClient, base_url: str) -> Optional[float]:
+    try:
+        response = await http_client.get(f"{base_url}/metrics")
+        return response.json().get('cpu_seconds')
+    except Exception:
+        return None
+
+
+async def benchmark_agent(name: str, port: int, levels: List[int]) -> None:
+    base_url = f"http://localhost:{port}"
+    limits = httpx.Limits(max_connections=max(levels) * 2, max_keepalive_connections=max(levels) * 2)
+    async with httpx.AsyncClient(timeout=httpx.Timeout(120), limits=limits) as http_client:
+        card = await A2ACardResolver(http_client, base_url).get_agent_card()
+        client = A2AClient(http_client, agent_card=card)
+        await run_stream(client)  # 预热
+        print(f"{name} (port {port})")
+        print(f"  {'conc':>4} {'streams':>7} {'ok':>4} {'ttft p50':>9} {'ttft p99':>9} "
+              f"{'itl p50':>8} {'itl p99':>8} {'streams/s':>9} {'cpu/stream':>10}")
+        for level in levels:
+            cpu_before = await server_cpu(http_client, base_url)
+            started_at = time.perf_counter()
+
+            async def client_loop() -> List[StreamResult]:
+                return [await run_stream(client) for _ in range(STREAMS_PER_CLIENT)]
+
+            results = [r for batch in await asyncio.gather(*(client_loop() for _ in range(level))) for r in batch]
+            elapsed = time.perf_counter() - started_at
+            cpu_after = await server_cpu(http_client, base_url)
+            ok = [r for r in results if r.completed and r.ttft is not None]
+            ttfts = [r.ttft * 1000 for r in ok]
+            gaps = [gap * 1000 for r in ok for gap in r.gaps]
+            cpu = (f"{(cpu_after - cpu_before) / len(results) * 1000:8.1f}ms"
+                   if cpu_before is not None and cpu_after is not None else f"{'n/a':>10}")
+            print(f"  {level:>4} {len(results):>7} {len(ok):>4} {percentile(ttfts, 0.5):7.1f}ms "
+                  f"{percentile(ttfts, 0.99):7.1f}ms {percentile(gaps, 0.5):6.1f}ms {percentile(gaps, 0.99):6.1f}ms "
+                  f"{len(results) / elapsed:9.2f} {cpu}")
+            errors = {r.error for r in results if r.error}
+            for error in list(errors)[:3]:
+                print(f"       error: {error[:200]}")
+
+
+async def wait_ready(port: int, process: Optional[subprocess.Popen]) -> bool:
+    deadline = time.monotonic() + START_TIMEOUT
+    async with httpx.AsyncClient(timeout=2) as http_client:
+        while time.monotonic() < deadline:
+            if process and process.poll() is not None:
+                return False
+            try:
+                await A2ACardResolver(http_client, f"http://localhost:{port}").get_agent_card()
+                return True
+            except Exception:
+                await asyncio.sleep(0.5)
+    return False
+
+
+def start_agent(name: str) -> subprocess.Popen:
+    agent_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+    os.makedirs(os.path.join(agent_dir, 'logs'), exist_ok=True)
+    # uvicorn的访问日志写到stderr，写入文件，避免管道写满阻塞服务
+    with open(os.path.join(agent_dir, 'logs', 'benchmark_stderr.log'), 'wb') as stderr:
+        return subprocess.Popen(
+            [sys.executable, '__main__.py'], cwd=agent_dir,
+            env={**os.environ, 'MODEL_PROVIDER': 'fake'},
+            stdout=subprocess.DEVNULL, stderr=stderr,
+        )
+
+
+def stderr_tail(name: str) -> str:
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), name, 'logs', 'benchmark_stderr.log')
+    with open(path, encoding='utf-8', errors='replace') as f:
+        return f.read()[-500:]
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--agents', nargs='+', default=list(AGENTS), choices=list(AGENTS))
+    parser.add_argument('--levels', nargs='+', type=int, default=LEVELS)
+    parser.add_argument('--no-start', action='store_true', help="use agents that are already running")
+    args = parser.parse_args()
+
+    for name in args.agents:
+        process = None if args.no_start else start_agent(name)
+        try:
+            if not await wait_ready(AGENTS[name], process):
+                stderr = stderr_tail(name) if process else ''
+                print(f"{name}: not ready after {START_TIMEOUT}s, skipped\n{stderr}")
+                continue
+            await benchmark_agent(name, AGENTS[name], args.levels)
+        finally:
+            if process:
+                process.terminate()
+                process.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,260 @@
+"""Benchmark the checkpoint durability policies and check their crash consistency.
+
+A fake model drives create_react_agent through tool-heavy turns (several tool calls per answer, so
+every turn writes about ten checkpoints). The saver is AsyncRedisSaver when Redis (with RediSearch)
+is reachable at CHECKPOINT_CONFIG['redis_url'], otherwise an in-memory saver that waits a simulated
+round trip on every call.
+
+1. Latency: average and p95 turn latency for the sync, async and exit policies.
+2. Crash consistency (in-memory saver only): a turn is killed at a random point and the stored data
+   is frozen at that instant, as if the process died. A new process then loads the thread and the
+   script checks that the state loads, every referenced blob exists, the parent chain is intact,
+   the messages are a prefix of the uninterrupted conversation and, after
+   ChatAgent.recover_interrupted_turn repairs the thread, a new turn completes. The ChatAgent is
+   created with the fake model and backends (MODEL_PROVIDER=fake unless set) and runs on the
+   benchmark's tool graph.
+
+Run from this directory: python benchmark_checkpoint_durability.py
+"""
+import asyncio
+import copy
+import os
+import random
+import statistics
+import time
+from typing import Any, List, Optional, Tuple
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.tools import tool
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.prebuilt import create_react_agent
+
+# ChatAgent使用fake模型与进程内后端创建，不需要API Key
+os.environ.setdefault('MODEL_PROVIDER', 'fake')
+from src.agent import ChatAgent
+from src.config.settings import CHECKPOINT_CONFIG
+from src.durable_checkpoint import DURABILITY_POLICIES, DurableCheckpointSaver
+
+TOOL_CALLS_PER_TURN = 4
+MODEL_LATENCY = 0.02
+TURNS = 20
+SIMULATED_RTT = 0.002
+CRASH_TRIALS = 50
+CRASH_TURNS = 3
+
+
+@tool
+def lookup_car(model_id: str) -> str:
+    """Look up the price and loan schemes of a car model."""
+    return f"{model_id}：指导价32.99万元，可选首付20%-50%，期限12-60期"
+
+
+class FakeToolModel(BaseChatModel):
+    """Calls lookup_car TOOL_CALLS_PER_TURN times per user message, then answers."""
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-tool-chat"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "FakeToolModel":
+        return self
+
+    def _generate(self, messages: List[BaseMessage], stop: Any = None, run_manager: Any = None,
+                  **kwargs: Any) -> ChatResult:
+        turn = sum(isinstance(message, HumanMessage) for message in messages)
+        calls = 0
+        for message in reversed(messages):
+            if isinstance(message, HumanMessage):
+                break
+            calls += isinstance(message, ToolMessage)
+        if calls < TOOL_CALLS_PER_TURN:
+            # 工具调用id固定，便于与未中断的对话逐条比较
+            message = AIMessage(content='', tool_calls=[{
+                'name': 'lookup_car', 'args': {'model_id': f"BMW{calls:03d}"}, 'id': f"call-{turn}-{calls}",
+            }])
+        else:
+            message = AIMessage(content=f"第{turn}轮：已为您对比{calls}款车型的贷款方案。")
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Any = None, run_manager: Any = None,
+                         **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(MODEL_LATENCY)
+        return self._generate(messages, stop, **kwargs)
+
+
+class RemoteInMemorySaver(InMemorySaver):
+    """InMemorySaver that waits a network round trip before every read and write."""
+
+    def __init__(self, rtt: float = SIMULATED_RTT) -> None:
+        super().__init__()
+        self.rtt = rtt
+
+    async def aget_tuple(self, config):
+        await asyncio.sleep(self.rtt)
+        return self.get_tuple(config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        await asyncio.sleep(self.rtt)
+        for checkpoint_tuple in self.list(config, filter=filter, before=before, limit=limit):
+            yield checkpoint_tuple
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        await asyncio.sleep(self.rtt)
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=''):
+        await asyncio.sleep(self.rtt)
+        return self.put_writes(config, writes, task_id, task_path)
+
+    def snapshot(self) -> "RemoteInMemorySaver":
+        """Copy of the data stored so far, as a new process would find it after a crash."""
+        saver = RemoteInMemorySaver(self.rtt)
+        saver.storage = copy.deepcopy(self.storage)
+        saver.writes = copy.deepcopy(self.writes)
+        saver.blobs = copy.deepcopy(self.blobs)
+        return saver
+
+
+async def redis_saver():
+    """AsyncRedisSaver on CHECKPOINT_CONFIG['redis_url'], or None when it is not reachable."""
+    try:
+        from langgraph.checkpoint.redis import AsyncRedisSaver
+        saver = AsyncRedisSaver(CHECKPOINT_CONFIG['redis_url'])
+        await asyncio.wait_for(saver.asetup(), timeout=2)
+        return saver
+    except Exception:
+        return None
+
+
+def build_graph(saver, policy: str) -> Tuple[Any, DurableCheckpointSaver]:
+    durable = DurableCheckpointSaver(saver, policy=policy)
+    return create_react_agent(model=FakeToolModel(), tools=[lookup_car], checkpointer=durable), durable
+
+
+async def run_turn(graph, durable: DurableCheckpointSaver, thread_id: str, turn: int,
+                   progress: Optional[List[int]] = None) -> None:
+    config = {'configurable': {'thread_id': thread_id}}
+    async for state in graph.astream({'messages': [HumanMessage(f"第{turn}个问题：对比几款车的贷款方案")]},
+                                     config=config, stream_mode='values',
+                                     checkpoint_during=durable.checkpoint_during):
+        if progress is not None:
+            progress[0] = len(state['messages'])
+
+
+def signature(message: BaseMessage) -> Tuple[str, str, str]:
+    if isinstance(message, ToolMessage):
+        return 'tool', message.tool_call_id, message.content
+    if isinstance(message, AIMessage):
+        return 'ai', ','.join(call['id'] for call in message.tool_calls), message.content
+    return message.type, '', message.content
+
+
+async def benchmark_latency(saver, label: str) -> None:
+    print(f"turn latency, {TURNS} turns x {TOOL_CALLS_PER_TURN} tool calls, saver={label}")
+    for policy in DURABILITY_POLICIES:
+        graph, durable = build_graph(saver, policy)
+        thread_id = f"durability-bench-{policy}-{time.time_ns()}"
+        latencies = []
+        for turn in range(1, TURNS + 1):
+            started_at = time.perf_counter()
+            await run_turn(graph, durable, thread_id, turn)
+            latencies.append((time.perf_counter() - started_at) * 1000)
+        await durable.close()
+        latencies.sort()
+        print(f"  {policy:>5}: avg={statistics.mean(latencies):7.2f}ms "
+              f"p95={latencies[int(len(latencies) * 0.95) - 1]:7.2f}ms  {durable.get_metrics()}")
+        if hasattr(saver, 'adelete_thread'):
+            await saver.adelete_thread(thread_id)
+
+
+def check_stored(saver: RemoteInMemorySaver, thread_id: str, check_parents: bool) -> List[str]:
+    """Check that referenced blobs exist and every parent checkpoint is stored."""
+    problems = []
+    checkpoints = list(saver.list({'configurable': {'thread_id': thread_id}}))
+    ids = {checkpoint_tuple.config['configurable']['checkpoint_id'] for checkpoint_tuple in checkpoints}
+    for checkpoint_tuple in checkpoints:
+        parent = checkpoint_tuple.parent_config
+        if check_parents and parent and parent['configurable']['checkpoint_id'] not in ids:
+            problems.append(f"missing parent {parent['configurable']['checkpoint_id']}")
+    if checkpoints:
+        for channel, version in checkpoints[0].checkpoint['channel_versions'].items():
+            if (thread_id, '', channel, version) not in saver.blobs:
+                problems.append(f"missing blob {channel}@{version}")
+    return problems
+
+
+async def crash_trial(policy: str, reference: List[Tuple[str, str, str]], rng: random.Random) -> dict:
+    saver = RemoteInMemorySaver()
+    graph, durable = build_graph(saver, policy)
+    thread_id = 'crash'
+    for turn in range(1, CRASH_TURNS):
+        await run_turn(graph, durable, thread_id, turn)
+    # 在最后一轮进行中的随机时刻“崩溃”：冻结下层存储，丢弃进程内的一切（包括写缓冲区）
+    progress = [0]
+    task = asyncio.create_task(run_turn(graph, durable, thread_id, CRASH_TURNS, progress))
+    await asyncio.sleep(rng.uniform(0, (MODEL_LATENCY + SIMULATED_RTT * 4) * (TOOL_CALLS_PER_TURN + 1)))
+    stored = saver.snapshot()
+    task.cancel()
+    if durable.writer:
+        durable.writer.cancel()
+    await asyncio.gather(task, durable.writer or asyncio.sleep(0), return_exceptions=True)
+
+    # 新进程：用崩溃时刻的数据重新加载线程
+    graph, durable = build_graph(stored, policy)
+    config = {'configurable': {'thread_id': thread_id}}
+    # exit只保存每轮的最后一个检查点，其父检查点是未保存的中间步骤
+    problems = check_stored(stored, thread_id, check_parents=policy != 'exit')
+    state = await graph.aget_state(config)
+    messages = state.values.get('messages', [])
+    recovered = [signature(message) for message in messages]
+    if recovered != reference[:len(recovered)]:
+        problems.append("messages are not a prefix of the uninterrupted conversation")
+    # 由真实的ChatAgent修复线程，检查点变化即表示做了修复
+    agent = ChatAgent()
+    agent.graph = graph
+    await agent.recover_interrupted_turn(thread_id)
+    repaired = (await graph.aget_state(config)).config != state.config
+    await run_turn(graph, durable, thread_id, CRASH_TURNS + 1)
+    final = (await graph.aget_state(config)).values['messages'][-1]
+    if not (isinstance(final, AIMessage) and not final.tool_calls and final.content):
+        problems.append("the next turn did not complete")
+    await durable.close()
+    return {'problems': problems, 'lost': max(0, progress[0] - len(messages)), 'repaired': repaired}
+
+
+async def benchmark_crash() -> None:
+    # 未中断的对话作为比较基准
+    saver = RemoteInMemorySaver(0)
+    graph, durable = build_graph(saver, 'sync')
+    for turn in range(1, CRASH_TURNS + 1):
+        await run_turn(graph, durable, 'reference', turn)
+    state = await graph.aget_state({'configurable': {'thread_id': 'reference'}})
+    reference = [signature(message) for message in state.values['messages']]
+
+    print(f"crash consistency, {CRASH_TRIALS} random crashes during turn {CRASH_TURNS}")
+    rng = random.Random(0)
+    for policy in DURABILITY_POLICIES:
+        results = [await crash_trial(policy, reference, rng) for _ in range(CRASH_TRIALS)]
+        failed = [result['problems'] for result in results if result['problems']]
+        lost = [result['lost'] for result in results]
+        print(f"  {policy:>5}: consistent={CRASH_TRIALS - len(failed)}/{CRASH_TRIALS} "
+              f"repaired={sum(result['repaired'] for result in results)} "
+              f"messages lost avg={statistics.mean(lost):.2f} max={max(lost)}")
+        for problems in failed[:3]:
+            print(f"         {problems}")
+
+
+async def main() -> None:
+    saver = await redis_saver()
+    if saver:
+        await benchmark_latency(saver, "AsyncRedisSaver")
+    else:
+        print(f"Redis not reachable at {CHECKPOINT_CONFIG['redis_url']}, "
+              f"using an in-memory saver with a {SIMULATED_RTT * 1000:.0f}ms round trip")
+    await benchmark_latency(RemoteInMemorySaver(), f"in-memory+{SIMULATED_RTT * 1000:.0f}ms rtt")
+    await benchmark_crash()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
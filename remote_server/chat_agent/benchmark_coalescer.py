@@ -0,0 +1,78 @@
+"""Benchmark the executor event path with and without StreamCoalescer.
+
+Feeds a fake token stream through the same TaskUpdater -> EventQueue path the executors use,
+serializes every event to JSON (the SSE frame) and parses it back (the host side), then reports
+events per response, events per second and CPU time per response.
+
+Run from this directory: python benchmark_coalescer.py
+"""
+import asyncio
+import time
+from uuid import uuid4
+from a2a.server.events import EventQueue
+from a2a.server.tasks import TaskUpdater
+from a2a.types import TaskState, TaskStatusUpdateEvent
+from a2a.utils import new_agent_text_message
+from src.coalescer import StreamCoalescer
+
+
+async def fake_agent_stream(tokens: int, token_interval_ms: float):
+    """Mimic agent.stream(): one chunk per token, then the final marker."""
+    for i in range(tokens):
+        await asyncio.sleep(token_interval_ms / 1000)
+        yield {'is_final_answer': False, 'content': f"字{i % 10}"}
+    yield {'is_final_answer': True, 'content': ''}
+
+
+async def run_response(coalescer: StreamCoalescer, tokens: int, token_interval_ms: float) -> int:
+    event_queue = EventQueue()
+    task_id, context_id = str(uuid4()), str(uuid4())
+    updater = TaskUpdater(event_queue, task_id, context_id)
+
+    async def produce():
+        async for chunk in coalescer.coalesce(fake_agent_stream(tokens, token_interval_ms)):
+            if not chunk['is_final_answer']:
+                await updater.update_status(
+                    TaskState.working,
+                    new_agent_text_message(chunk['content'], context_id, task_id),
+                )
+            else:
+                await updater.complete()
+
+    async def consume() -> int:
+        events = 0
+        while True:
+            event = await event_queue.dequeue_event()
+            event_queue.task_done()
+            # SSE帧序列化与Host端解析
+            type(event).model_validate_json(event.model_dump_json(by_alias=True, exclude_none=True))
+            events += 1
+            if isinstance(event, TaskStatusUpdateEvent) and event.final:
+                return events
+
+    _, events = await asyncio.gather(produce(), consume())
+    return events
+
+
+async def run_benchmark(label: str, coalescer: StreamCoalescer, responses: int, tokens: int,
+                        token_interval_ms: float) -> None:
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    # 并发执行多个响应，模拟多个会话同时流式输出
+    events = await asyncio.gather(*(
+        run_response(coalescer, tokens, token_interval_ms) for _ in range(responses)
+    ))
+    wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+    total_events = sum(events)
+    print(f"{label:<12} events/response={total_events / responses:8.1f}  "
+          f"events/s={total_events / wall:10.1f}  "
+          f"cpu/response={cpu / responses * 1000:8.2f} ms")
+
+
+async def main(responses: int = 50, tokens: int = 400, token_interval_ms: float = 5) -> None:
+    print(f"{responses} concurrent responses x {tokens} tokens, {token_interval_ms} ms per token")
+    await run_benchmark("per-token", StreamCoalescer(enabled=False), responses, tokens, token_interval_ms)
+    await run_benchmark("coalesced", StreamCoalescer(enabled=True), responses, tokens, token_interval_ms)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,99 @@
+"""Benchmark conversation compaction with a fake local model.
+
+Runs the same long session through create_react_agent with and without ConversationCompactor and
+reports the estimated prompt tokens the model receives per turn. The fake model needs no API key:
+it answers with fixed-length text and writes a short summary when asked to compact. The script
+also checks that the pinned facts reach the system prompt and that the summary call does not leak
+into the token stream.
+
+Run from this directory: python benchmark_compaction.py
+"""
+import asyncio
+from typing import Any, Iterator, List
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.prebuilt import create_react_agent
+from src.compaction import SUMMARY_PROMPT, ConversationCompactor, estimate_tokens
+
+SYSTEM_PROMPT = "你是一个聊天助手，根据用户的输入，告诉用户你所知道的一切，遇到不明确的问题需要你反问用户，让用户明确需求"
+TURNS = 40
+REPORT_AT = (1, 5, 10, 20, 40)
+
+
+class FakeChatModel(BaseChatModel):
+    """Answers every turn with answer_chars characters and records the prompt it received."""
+    answer_chars: int = 300
+    prompts: List[List[BaseMessage]] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "FakeChatModel":
+        return self
+
+    def _answer(self, messages: List[BaseMessage]) -> str:
+        if messages[0].content == SUMMARY_PROMPT:
+            return f"摘要：用户咨询了宝马车型与贷款方案，共{len(messages[1].content)}字的对话已合并。"
+        self.prompts.append(messages)
+        return ("好的，" + "这是一段关于宝马车型和金融方案的详细回答。" * 30)[:self.answer_chars]
+
+    def _generate(self, messages: List[BaseMessage], stop: Any = None, run_manager: Any = None,
+                  **kwargs: Any) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._answer(messages)))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Any = None, run_manager: Any = None,
+                **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        # 与ChatTongyi一样逐块流式输出，每块10个字符
+        text = self._answer(messages)
+        for i in range(0, len(text), 10):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=text[i:i + 10]))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+def user_input(turn: int) -> str:
+    if turn == 2:
+        return "我想了解BMW005这款车的贷款方案"
+    if turn == 3:
+        return "我的身份证号是310101199203154567，手机号13812345678，帮我做个预审"
+    return f"第{turn}个问题：请再详细介绍一下首付比例、期限和月供的区别"
+
+
+async def run_session(label: str, compactor: ConversationCompactor, model: FakeChatModel) -> None:
+    graph = create_react_agent(model=model, tools=[], checkpointer=InMemorySaver(),
+                               **compactor.graph_options())
+    config = {'configurable': {'thread_id': label}}
+    streamed_chunks, summary_leaks = 0, 0
+    for turn in range(1, TURNS + 1):
+        async for chunk, _ in graph.astream({'messages': user_input(turn)}, config=config,
+                                            stream_mode='messages'):
+            if isinstance(chunk, AIMessageChunk):
+                streamed_chunks += 1
+                summary_leaks += "摘要" in chunk.content
+        if turn in REPORT_AT:
+            print(f"  turn {turn:>3}: prompt tokens={estimate_tokens(model.prompts[-1]):6d}")
+    total = sum(estimate_tokens(prompt) for prompt in model.prompts)
+    print(f"  total prompt tokens over {TURNS} turns: {total}, streamed chunks={streamed_chunks}, "
+          f"summary chunks leaked={summary_leaks}")
+    if compactor.enabled:
+        system = model.prompts[-1][0].content
+        print(f"  pinned in system prompt: BMW005={'BMW005' in system}, "
+              f"id_number={'310101199203154567' in system}, phone={'13812345678' in system}")
+        print(f"  metrics: {compactor.get_metrics()}")
+
+
+async def main() -> None:
+    print("without compaction")
+    model = FakeChatModel()
+    await run_session("full", ConversationCompactor(model, SYSTEM_PROMPT, enabled=False), model)
+    print("with compaction")
+    model = FakeChatModel()
+    await run_session("compacted", ConversationCompactor(model, SYSTEM_PROMPT, enabled=True), model)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
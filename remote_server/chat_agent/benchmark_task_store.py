@@ -0,0 +1,68 @@
+"""Soak benchmark for the task stores: process memory while saving 100k streamed tasks.
+
+Every task goes through the same saves the A2A TaskManager performs for a streamed answer
+(submitted -> several working updates with a growing history -> completed). Resident memory is
+sampled every 10k tasks for the SDK's InMemoryTaskStore and for BoundedInMemoryTaskStore.
+
+Run from this directory: python benchmark_task_store.py
+"""
+import asyncio
+import gc
+import os
+import resource
+import time
+from uuid import uuid4
+from a2a.server.tasks import InMemoryTaskStore
+from a2a.types import Message, Part, Role, Task, TaskState, TaskStatus, TextPart
+from src.task_store import BoundedInMemoryTaskStore
+
+TASKS = 100_000
+SAMPLE_EVERY = 10_000
+HISTORY_MESSAGES = 20
+
+
+def rss_mb() -> float:
+    """Current resident set size in MB (Linux), falling back to peak RSS elsewhere."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def message(role: Role, text: str, task_id: str, context_id: str) -> Message:
+    return Message(role=role, parts=[Part(root=TextPart(text=text))], message_id=str(uuid4()),
+                   task_id=task_id, context_id=context_id)
+
+
+async def soak(label: str, store) -> None:
+    gc.collect()
+    start_rss, started_at = rss_mb(), time.perf_counter()
+    print(f"{label}: start rss={start_rss:.1f} MB")
+    for i in range(1, TASKS + 1):
+        task_id, context_id = str(uuid4()), str(uuid4())
+        task = Task(id=task_id, context_id=context_id, status=TaskStatus(state=TaskState.submitted),
+                    history=[message(Role.user, "给我推荐一个贷款方案，车型是BMW005", task_id, context_id)])
+        await store.save(task)
+        task.status = TaskStatus(state=TaskState.working)
+        for n in range(HISTORY_MESSAGES):
+            task.history.append(message(Role.agent, f"第{n}段回答内容，" * 4, task_id, context_id))
+            if n % 5 == 0:
+                await store.save(task)
+        task.status = TaskStatus(state=TaskState.completed)
+        await store.save(task)
+        if i % SAMPLE_EVERY == 0:
+            gc.collect()
+            print(f"  {i:>7} tasks  rss={rss_mb():8.1f} MB  (+{rss_mb() - start_rss:.1f} MB)")
+    print(f"  {TASKS / (time.perf_counter() - started_at):.0f} tasks/s")
+    if hasattr(store, 'get_stats'):
+        print(f"  stats: {store.get_stats()}")
+
+
+async def main() -> None:
+    await soak("BoundedInMemoryTaskStore", BoundedInMemoryTaskStore(max_tasks=5000))
+    await soak("InMemoryTaskStore", InMemoryTaskStore())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,9 +1,15 @@
+from collections import OrderedDict
 from typing import AsyncIterable, Dict, Any
 from langgraph.prebuilt import create_react_agent
-from langchain_community.chat_models import ChatTongyi
-from langchain_core.messages import AIMessageChunk
-from src.config.load_key import load_key
-from langgraph.checkpoint.redis import AsyncRedisSaver
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, ToolMessage
+from src.config.settings import CHECKPOINT_CONFIG
+from src.durable_checkpoint import DurableCheckpointSaver
+from src.fake_backends import open_checkpointer
+from src.model_provider import create_chat_model
+from src.stream_log import StreamLogSummary
+from src.trace_recorder import TraceRecorder
+from src.compaction import ConversationCompactor
+from src.response_cache import ResponseCache
 from langchain_core.runnables import RunnableConfig
 import os
 import logging.config
@@ -19,11 +25,10 @@ class ChatAgent:
     def __init__(self) -> None:
         logger.info("Initializing CodingAgent")
         try:
-            self.model = ChatTongyi(
-                base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
-                api_key=load_key("DASHSCOPE_API_KEY"),
-                model="qwen-plus",
-            )
+            self.model = create_chat_model()
+            self.compactor = ConversationCompactor(self.model, self.SYSTEM_PROMPT)
+            self.tracer = TraceRecorder()
+            self.response_cache = ResponseCache(self.SYSTEM_PROMPT)
         except Exception as e:
             logger.error(f"Failed to initialize ChatTongyi model: {e}")
             raise
@@ -31,38 +36,147 @@ class ChatAgent:
     async def initialize(self):
         logger.info("Initializing Redis checkpointer for Agent")
         try:
-            self.checkpointer = AsyncRedisSaver("redis://localhost:6379")
+            # Redis检查点及其清理任务；FAKE_BACKENDS时为进程内实现
+            self.checkpointer, self.retention = await open_checkpointer()
+            # 本进程已检查过是否需要崩溃修复的会话（最多CHECKPOINT_CONFIG['recovery_sessions']个）
+            self.recovered_sessions: "OrderedDict[str, None]" = OrderedDict()
+            # 按CHECKPOINT_CONFIG['durability']写入检查点，检查点清理仍直接使用下层存储
+            self.durable_checkpointer = DurableCheckpointSaver(self.checkpointer)
             logger.info("Redis checkpointer initialized")
             self.graph = create_react_agent(
                 model = self.model, 
                 tools=[], 
-                prompt=self.SYSTEM_PROMPT,
-                checkpointer=self.checkpointer
+                # 系统提示词由压缩阶段与历史摘要一起组装；未启用压缩时直接作为prompt
+                **self.compactor.graph_options(),
+                checkpointer=self.durable_checkpointer
             )
             logger.info("React agent created with Redis checkpointer")
         except Exception as e:
             logger.error(f"Failed to initialize Redis checkpointer or create React agent: {e}")
             raise
 
+    async def close(self) -> None:
+        """Flush buffered checkpoint writes, then stop the sweeper and release the Redis connections."""
+        await self.durable_checkpointer.close()
+        await self.retention.stop()
+        await self.tracer.close()
+        await self.response_cache.close()
+
+    async def recover_interrupted_turn(self, session_id) -> None:
+        """Keep the checkpoint valid after a turn was canceled or the process crashed.
+
+        If the run was canceled while tools were executing, the last checkpointed message is an
+        AIMessage whose tool calls never got results. Answer them with placeholder ToolMessages
+        so the next turn sends a well-formed history to the model. If the run stopped after a
+        step finished but before its checkpoint was written, the step's output is only saved as
+        pending writes, which a new input would discard; commit them into a checkpoint first.
+        """
+        config: RunnableConfig = {'configurable': {'thread_id': session_id}}
+        try:
+            state = await self.graph.aget_state(config)
+            messages = state.values.get('messages', [])
+            if messages and isinstance(messages[-1], AIMessage) and messages[-1].tool_calls:
+                await self.graph.aupdate_state(
+                    config,
+                    {'messages': [
+                        ToolMessage(content="Tool call canceled by user.", tool_call_id=tool_call['id'])
+                        for tool_call in messages[-1].tool_calls
+                    ]},
+                    as_node='tools',
+                )
+                logger.info(f"Closed {len(messages[-1].tool_calls)} pending tool calls for session ID: {session_id}")
+            elif state.tasks and not state.next:
+                # update_state先应用已保存的pending writes，再写入新的检查点
+                await self.graph.aupdate_state(config, {'messages': []}, as_node=state.tasks[0].name)
+                logger.info(f"Committed pending writes of step {state.tasks[0].name} for session ID: {session_id}")
+        except Exception as e:
+            logger.error(f"Failed to recover checkpoint for session ID {session_id}: {e}")
+
+    async def _recover_once(self, session_id) -> None:
+        if session_id in self.recovered_sessions:
+            self.recovered_sessions.move_to_end(session_id)
+            return
+        await self.recover_interrupted_turn(session_id)
+        self.recovered_sessions[session_id] = None
+        while len(self.recovered_sessions) > CHECKPOINT_CONFIG['recovery_sessions']:
+            self.recovered_sessions.popitem(last=False)
+
     async def stream(
         self, messages, session_id
     ) -> AsyncIterable[Dict[str, Any]]:
         logger.info(f"Starting stream processing for session ID: {session_id}")
+        # 活跃时间由后台任务批量写入Redis，不等待
+        await self.retention.touch(session_id)
+        # 进程崩溃时没有取消回调：本进程第一次处理该会话（上一轮可能在已退出的进程中执行）或本进程中上一轮未正常结束时，
+        # 检查上一轮是否完整结束；本进程内被取消的轮次已由调度器在会话锁内修复，不必每轮都读取检查点
+        await self._recover_once(session_id)
         config: RunnableConfig = {'configurable': {'thread_id': session_id}}
+        cache_key = None
+        if self.response_cache.enabled:
+            # 只有会话第一轮的回答与上下文无关，可以使用缓存
+            has_history = await self.durable_checkpointer.aget_tuple(config) is not None
+            cache_key = self.response_cache.key(messages, has_history)
+        cached = await self.response_cache.get(cache_key) if cache_key else None
+        if cached:
+            async for chunk in self._replay(messages, cached, config, session_id):
+                yield chunk
+            return
+        # 不逐token写日志，流结束时输出一行汇总（token数、首字延迟、耗时）
+        stream_log = StreamLogSummary(logger, session_id)
+        # 开启录制时记录本轮的模型调用、工具调用与输出内容块
+        trace = self.tracer.start_turn(session_id, messages)
+        status = "canceled"
+        answer = []
         try:
-            async for item in self.graph.astream(input={"messages": messages}, config=config, stream_mode='messages'):
+            async for item in self.graph.astream(input={"messages": messages}, config={**config, 'callbacks': trace.callbacks},
+                                                 stream_mode='messages',
+                                                 checkpoint_during=self.durable_checkpointer.checkpoint_during):
                 if isinstance(item[0], AIMessageChunk):
-                    logger.debug(f"Received message chunk: {item[0].content}")
+                    stream_log.token(item[0].content)
+                    trace.chunk(item[0].content)
+                    answer.append(item[0].content)
                     yield {
                         'is_final_answer': False,
                         'content': item[0].content,
                     }
+            status = "completed"
         except Exception as e:
+            status = "failed"
             logger.error(f"Error during stream processing for session ID {session_id}: {e}")
             raise
-        logger.info(f"Stream processing completed for session ID: {session_id}")
+        finally:
+            stream_log.finish(status)
+            if status != "completed":
+                self.recovered_sessions.pop(session_id, None)
+            self.tracer.finish(trace, status)
+        if cache_key:
+            await self.response_cache.put(cache_key, answer)
         # 循环结束后，发送输出结束的标志
         yield {
             'is_final_answer': True,  # 任务已完成
             'content': '',  # 可以为空或适当的结束信息
         }
+
+    async def _replay(self, user_input, chunks, config: RunnableConfig, session_id) -> AsyncIterable[Dict[str, Any]]:
+        """Stream a cached answer in its original chunks and record the turn in the checkpoint."""
+        stream_log = StreamLogSummary(logger, session_id)
+        for content in chunks:
+            stream_log.token(content)
+            yield {
+                'is_final_answer': False,
+                'content': content,
+            }
+        stream_log.finish("served from cache")
+        try:
+            # 与模型生成的轮次一样写入检查点，后续轮次能看到这一轮的问答
+            await self.graph.aupdate_state(
+                config,
+                {'messages': [HumanMessage(user_input), AIMessage(''.join(chunks))]},
+                as_node='agent',
+            )
+        except Exception as e:
+            logger.error(f"Failed to record cached answer for session ID {session_id}: {e}")
+        yield {
+            'is_final_answer': True,
+            'content': '',
+        }
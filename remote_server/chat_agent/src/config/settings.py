@@ -0,0 +1,140 @@
+# config/settings.py
+import os
+
+# 流式输出合并设定：缓冲文本达到max_chars个字符或等待超过max_delay_ms毫秒时发送一次状态更新，
+# 第一个内容块立即发送；enabled为False时逐token发送
+STREAM_COALESCE_CONFIG = {
+    'enabled': True,
+    'max_delay_ms': 50,
+    'max_chars': 64
+}
+
+# 日志设定：queue为True时日志处理器在后台线程执行；level为根日志级别；
+# token_sample_every大于0时每隔N个token输出一条DEBUG采样日志，否则每个流只输出一行汇总
+LOGGING_CONFIG = {
+    'queue': True,
+    'level': 'INFO',
+    'token_sample_every': 0
+}
+
+# 任务存储设定：backend为memory（有界内存，超过max_tasks个或max_bytes字节时淘汰终态任务；max_bytes按估算的
+# 任务对象内存计算，而非序列化长度）
+# 或redis（复用检查点的Redis，任何副本都可以响应tasks/get；执行中的任务除状态变化外最多每snapshot_interval秒
+# 写入一次快照，其他副本看到的进度最多落后这么久）；ttl为任务保留时间（秒）
+TASK_STORE_CONFIG = {
+    'backend': 'memory',
+    'max_tasks': 10000,
+    'max_bytes': 256 * 1024 * 1024,
+    'ttl': 3600,
+    'redis_url': 'redis://localhost:6379',
+    'key_prefix': 'a2a_task:chat_agent:',
+    'snapshot_interval': 2
+}
+
+# 服务设定：workers为uvicorn进程数，大于1时每个进程各自初始化Agent（会话状态在Redis检查点中共享），
+# 此时TASK_STORE_CONFIG的backend应使用redis；loop/http为auto时，若已安装uvloop/httptools则自动使用
+SERVER_CONFIG = {
+    'host': '0.0.0.0',
+    'port': 10050,
+    'workers': 1,
+    'loop': 'auto',
+    'http': 'auto'
+}
+
+# 会话调度设定：enabled为True时同一会话的轮次依次执行；coalesce为True时同一会话中输入相同的
+# 进行中请求共享一次生成；max_pending为同一会话最多排队等待的轮次数，超过时拒绝新的轮次。
+# 调度只在进程内有效：workers大于1时开启redis_lock，轮次执行期间持有Redis中的会话锁（lock_ttl秒过期，
+# 执行期间自动续期，最多等待lock_wait秒），避免同一会话在不同worker上同时写同一检查点；
+# 也可以关闭redis_lock，由前端负载均衡按session_id粘性路由到同一worker
+SESSION_SCHEDULER_CONFIG = {
+    'enabled': True,
+    'coalesce': True,
+    'max_pending': 4,
+    'redis_lock': SERVER_CONFIG['workers'] > 1,
+    'redis_url': 'redis://localhost:6379',
+    'lock_prefix': 'session_lock:',
+    'lock_ttl': 30,
+    'lock_wait': 300
+}
+
+# 对话压缩设定：发给模型的摘要与未摘要消息估算超过max_tokens个token时，把最近keep_turns轮之前的
+# 对话合并进检查点中的滚动摘要；pinned_patterns中的关键信息（车型ID、身份证号、手机号）从被摘要的
+# 消息中提取并始终附在系统提示词后；max_message_chars为摘要请求中单条消息的最大长度。
+# 默认关闭（可用环境变量COMPACTION_ENABLED=1开启）：超过阈值的那一轮在首个token之前同步调用一次模型生成摘要
+COMPACTION_CONFIG = {
+    'enabled': os.getenv('COMPACTION_ENABLED', '0') == '1',
+    'max_tokens': 4000,
+    'keep_turns': 4,
+    'max_message_chars': 2000,
+    'pinned_patterns': {
+        'model_id': r'BMW\d{3}',
+        'id_number': r'(?<!\d)\d{17}[\dXx](?!\d)',
+        'phone_number': r'(?<!\d)1[3-9]\d{9}(?!\d)'
+    }
+}
+
+# 检查点保留设定：ttl_minutes为线程所有检查点键的过期时间（分钟，读取时刷新，0表示不过期）；
+# 后台每sweep_interval秒清理一次：删除各Agent均超过ttl未活跃的线程，并把活跃线程裁剪为最近keep_last个检查点
+CHECKPOINT_CONFIG = {
+    'agent_name': 'chat_agent',
+    'redis_url': 'redis://localhost:6379',
+    'ttl_minutes': 7 * 24 * 60,
+    'keep_last': 10,
+    'sweep_interval': 600,
+    # 检查点持久化策略：sync每个ReAct步骤同步写入Redis；async写入进程内缓冲区后由后台任务顺序写入，
+    # 崩溃时可能丢失最近几步；exit只在一轮对话结束时写入
+    'durability': 'sync',
+    # async模式下缓冲区的最大写入数，写满后等待后台写入
+    'write_behind_buffer': 1000,
+    # 每个进程记录已做过崩溃检查的会话数上限，超出时最久未用的会话下次再检查
+    'recovery_sessions': 100000
+}
+
+# 回答缓存设定（默认关闭）：缓存会话第一轮的完整回答，命中时按原分块重放；已有历史的轮次、超过
+# max_input_chars个字符或匹配bypass_patterns（个人信息）的输入不使用缓存；内存中最多max_entries条，
+# ttl为有效期（秒）；redis_enabled为True时以Redis作为各worker进程共享的第二级缓存
+RESPONSE_CACHE_CONFIG = {
+    'enabled': False,
+    'max_entries': 1000,
+    'ttl': 24 * 3600,
+    'max_input_chars': 500,
+    'bypass_patterns': {
+        'id_number': r'(?<!\d)\d{17}[\dXx](?!\d)',
+        'phone_number': r'(?<!\d)1[3-9]\d{9}(?!\d)'
+    },
+    'redis_enabled': False,
+    'redis_url': 'redis://localhost:6379',
+    'key_prefix': 'llm_cache:chat_agent:'
+}
+
+# 模型设定：provider为tongyi（通义千问）、fake（本地确定性模型，不访问网络，用于测量框架自身的开销）
+# 或replay（按录制文件回放模型与工具），可用环境变量MODEL_PROVIDER覆盖；fake模型首个token在ttft_ms毫秒后输出，
+# 之后每秒输出tokens_per_second个token，每轮先依次调用tool_calls中的工具；replay读取path（环境变量REPLAY_TRACES）
+# 中的录制，按录制的耗时除以speed（环境变量REPLAY_SPEED，0为不等待）输出；fake_backends为True时，使用fake或
+# replay模型的同时检查点（Redis）、数据库（MySQL改为SQLite）与MCP工具（MongoDB、Redis向量库）也使用进程内实现
+MODEL_CONFIG = {
+    'provider': os.getenv('MODEL_PROVIDER', 'tongyi'),
+    'model': 'qwen-plus',
+    'base_url': 'https://dashscope.aliyuncs.com/compatible-mode/v1',
+    'fake': {
+        'ttft_ms': 300,
+        'tokens_per_second': 50,
+        'answer_tokens': 200,
+        'tool_calls': []
+    },
+    'replay': {
+        'path': os.getenv('REPLAY_TRACES', 'logs/traces.jsonl'),
+        'speed': float(os.getenv('REPLAY_SPEED', '1'))
+    },
+    'fake_backends': True
+}
+
+# 对话录制设定（默认关闭，可用环境变量TRACE_ENABLED=1开启）：把每轮的用户输入、输出内容块、模型调用（逐token时间）
+# 与工具调用（参数、结果、耗时）写入path（.gz结尾时压缩），供replay模型回放；按会话采样sample_rate比例，
+# 等待写入的轮次超过max_buffer时丢弃
+TRACE_CONFIG = {
+    'enabled': os.getenv('TRACE_ENABLED', '0') == '1',
+    'path': 'logs/traces.jsonl',
+    'sample_rate': 1.0,
+    'max_buffer': 10000
+}
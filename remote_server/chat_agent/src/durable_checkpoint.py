@@ -0,0 +1,192 @@
+from collections.abc import AsyncIterator, Sequence
+from typing import Any, Dict, Optional, Tuple
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    copy_checkpoint,
+)
+from src.config.settings import CHECKPOINT_CONFIG
+import asyncio
+import time
+import os
+import logging.config
+
+log_config_path = os.path.abspath("src/config/logging.conf")
+logging.config.fileConfig(log_config_path, encoding='utf-8')
+logger = logging.getLogger(__name__)
+
+DURABILITY_POLICIES = ('sync', 'async', 'exit')
+# 记录最近写入序号的线程数超过该值时清理已写完的线程
+MAX_TRACKED_THREADS = 10000
+
+
+class DurableCheckpointSaver(BaseCheckpointSaver):
+    """按持久化策略写入检查点的包装器。
+
+    - sync：每个ReAct步骤（模型调用、工具调用、工具结果）的检查点直接写入下层存储（原有行为）；
+    - async：写入进入进程内的有序缓冲区后立即返回，由后台任务按顺序写入Redis（write-behind）；
+      读取某个线程前先等待该线程已缓冲的写入完成，保证读到自己的写入；进程崩溃时丢失的只是
+      缓冲区中最新的一段，Redis中保留的始终是按顺序写入的前缀；
+    - exit：配合graph.astream(checkpoint_during=False)，只在一轮对话结束（含取消、出错）时写入。
+    """
+
+    def __init__(self,
+                 saver: BaseCheckpointSaver,
+                 policy: str = CHECKPOINT_CONFIG['durability'],
+                 max_buffer: int = CHECKPOINT_CONFIG['write_behind_buffer']):
+        """
+        Args:
+            saver: The checkpoint saver that persists the data (AsyncRedisSaver).
+            policy: 'sync', 'async' or 'exit'.
+            max_buffer: Maximum buffered writes in 'async' mode; writers wait when it is full.
+        """
+        if policy not in DURABILITY_POLICIES:
+            raise ValueError(f"Unknown checkpoint durability policy: {policy}")
+        super().__init__(serde=saver.serde)
+        self.saver = saver
+        self.policy = policy
+        self.max_buffer = max_buffer
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.writer: Optional[asyncio.Task] = None
+        # 按入队顺序编号；written_seq之前的写入都已完成
+        self.enqueued_seq = 0
+        self.written_seq = 0
+        self.written = asyncio.Event()
+        self.thread_seq: Dict[str, int] = {}
+        self.writes = 0
+        self.write_errors = 0
+        self.read_waits = 0
+        self.max_buffered = 0
+        self.lag_total = 0.0
+
+    @property
+    def checkpoint_during(self) -> bool:
+        """The checkpoint_during argument for graph.astream under this policy."""
+        return self.policy != 'exit'
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        await self._wait_thread(config['configurable']['thread_id'])
+        return await self.saver.aget_tuple(config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        if config:
+            await self._wait_thread(config['configurable']['thread_id'])
+        else:
+            await self.flush()
+        async for checkpoint_tuple in self.saver.alist(config, filter=filter, before=before, limit=limit):
+            yield checkpoint_tuple
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        if self.policy != 'async':
+            return await self.saver.aput(config, checkpoint, metadata, new_versions)
+        await self._enqueue(config, self.saver.aput, config, copy_checkpoint(checkpoint), dict(metadata),
+                            dict(new_versions))
+        # 与AsyncRedisSaver.aput的返回值一致，后续步骤以此作为父检查点
+        return {'configurable': {
+            'thread_id': config['configurable']['thread_id'],
+            'checkpoint_ns': config['configurable'].get('checkpoint_ns', ''),
+            'checkpoint_id': checkpoint['id'],
+        }}
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                          task_path: str = '') -> None:
+        if self.policy != 'async':
+            return await self.saver.aput_writes(config, writes, task_id, task_path)
+        await self._enqueue(config, self.saver.aput_writes, config, list(writes), task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await self._wait_thread(thread_id)
+        await self.saver.adelete_thread(thread_id)
+
+    def get_next_version(self, current: Optional[Any], channel: Any) -> Any:
+        # 版本号格式必须与下层存储一致
+        return self.saver.get_next_version(current, channel)
+
+    async def flush(self) -> None:
+        """Wait until every buffered write has been persisted."""
+        await self._wait_seq(self.enqueued_seq)
+
+    async def close(self) -> None:
+        """Flush the buffer and stop the background writer."""
+        await self.flush()
+        if self.writer:
+            self.writer.cancel()
+            await asyncio.gather(self.writer, return_exceptions=True)
+            self.writer = None
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get the durability policy, buffer depth and write-behind counters."""
+        return {
+            'policy': self.policy,
+            'buffered': self.enqueued_seq - self.written_seq,
+            'max_buffered': self.max_buffered,
+            'writes': self.writes,
+            'write_errors': self.write_errors,
+            'read_waits': self.read_waits,
+            'avg_lag_ms': round(self.lag_total / self.writes * 1000, 2) if self.writes else 0.0,
+        }
+
+    async def _enqueue(self, config: RunnableConfig, method, *args: Any) -> None:
+        if self.writer is None:
+            self.writer = asyncio.create_task(self._write_loop())
+        # 缓冲区满时等待；编号与入队之间没有await，保证写入顺序与编号一致
+        while self.enqueued_seq - self.written_seq >= self.max_buffer:
+            await self.written.wait()
+        self.enqueued_seq += 1
+        self.thread_seq[config['configurable']['thread_id']] = self.enqueued_seq
+        if len(self.thread_seq) > MAX_TRACKED_THREADS:
+            # 丢弃写入已完成的线程记录
+            self.thread_seq = {thread_id: seq for thread_id, seq in self.thread_seq.items() if seq > self.written_seq}
+        self.max_buffered = max(self.max_buffered, self.enqueued_seq - self.written_seq)
+        self.queue.put_nowait((self.enqueued_seq, time.monotonic(), method, args))
+
+    async def _write_loop(self) -> None:
+        while True:
+            batch = [await self.queue.get()]
+            while not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            # 检查点按顺序逐个写入（父检查点先于子检查点）；相邻的pending writes之间没有依赖，并发写入
+            group = []
+            for item in batch:
+                if item[2] == self.saver.aput_writes:
+                    group.append(item)
+                    continue
+                await self._write(group)
+                await self._write([item])
+                group = []
+            await self._write(group)
+
+    async def _write(self, items: list) -> None:
+        if not items:
+            return
+        results = await asyncio.gather(*(method(*args) for _, _, method, args in items), return_exceptions=True)
+        now = time.monotonic()
+        for (_, enqueued_at, _, _), result in zip(items, results):
+            if isinstance(result, Exception):
+                # write-behind无法把错误交还给调用方，记录后继续写入后续数据
+                self.write_errors += 1
+                logger.error(f"Failed to persist buffered checkpoint write: {result}")
+            else:
+                self.writes += 1
+                self.lag_total += now - enqueued_at
+        self.written_seq = items[-1][0]
+        self.written.set()
+        self.written = asyncio.Event()
+
+    async def _wait_thread(self, thread_id: str) -> None:
+        seq = self.thread_seq.get(thread_id, 0)
+        if seq > self.written_seq:
+            self.read_waits += 1
+            await self._wait_seq(seq)
+        elif seq:
+            self.thread_seq.pop(thread_id, None)
+
+    async def _wait_seq(self, seq: int) -> None:
+        while self.written_seq < seq:
+            await self.written.wait()
@@ -0,0 +1,163 @@
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from src.config.settings import CHECKPOINT_CONFIG, RESPONSE_CACHE_CONFIG
+import redis.asyncio as redis
+import hashlib
+import json
+import re
+import time
+import unicodedata
+import os
+import logging.config
+
+log_config_path = os.path.abspath("src/config/logging.conf")
+logging.config.fileConfig(log_config_path, encoding='utf-8')
+logger = logging.getLogger(__name__)
+
+# 问题末尾的标点与语气词不影响回答
+_TRAILING = re.compile(r'[\s?？。.!！~～,，、;；:：]+$')
+_SPACES = re.compile(r'\s+')
+
+
+def normalize_input(user_input: str) -> str:
+    """Normalize a user message for the cache key.
+
+    Full-width characters are folded to half-width, runs of whitespace collapse to one space and
+    trailing punctuation is dropped. Case is kept: identifiers in code requests are case-sensitive.
+    """
+    text = unicodedata.normalize('NFKC', user_input)
+    text = _SPACES.sub(' ', text).strip()
+    return _TRAILING.sub('', text)
+
+
+class ResponseCache:
+    """模型回答缓存，缓存常见的首轮问题（FAQ、样板代码）的完整回答。
+
+    缓存键为(Agent名称, 系统提示词哈希, 规范化后的对话)。只有会话的第一轮可以使用缓存：已有历史的
+    轮次、超过max_input_chars或包含个人信息（bypass_patterns，如身份证号、手机号）的输入都不使用缓存。
+    回答按模型流式输出时的分块保存，命中时按相同分块重放。内存中为带TTL的LRU，启用redis时
+    作为第二级缓存，在多个worker进程之间共享。
+    """
+
+    def __init__(self,
+                 system_prompt: str,
+                 agent_name: str = CHECKPOINT_CONFIG['agent_name'],
+                 enabled: bool = RESPONSE_CACHE_CONFIG['enabled'],
+                 max_entries: int = RESPONSE_CACHE_CONFIG['max_entries'],
+                 ttl: float = RESPONSE_CACHE_CONFIG['ttl'],
+                 max_input_chars: int = RESPONSE_CACHE_CONFIG['max_input_chars'],
+                 bypass_patterns: Dict[str, str] = RESPONSE_CACHE_CONFIG['bypass_patterns'],
+                 redis_enabled: bool = RESPONSE_CACHE_CONFIG['redis_enabled'],
+                 redis_url: str = RESPONSE_CACHE_CONFIG['redis_url'],
+                 key_prefix: str = RESPONSE_CACHE_CONFIG['key_prefix']):
+        """
+        Args:
+            system_prompt: The agent's system prompt; changing it invalidates the cached answers.
+            agent_name: Part of the cache key.
+            enabled: When False every turn is generated by the model.
+            max_entries: Maximum answers kept in memory.
+            ttl: Seconds an answer stays valid, in memory and in Redis.
+            max_input_chars: Longer user messages are not cached.
+            bypass_patterns: Name -> regex; user messages matching any of them are not cached.
+            redis_enabled: Use Redis as a second tier shared by all worker processes.
+            redis_url: Redis connection URL.
+            key_prefix: Prefix of the Redis keys.
+        """
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_input_chars = max_input_chars
+        self.bypass_patterns = [re.compile(pattern) for pattern in bypass_patterns.values()]
+        self.key_prefix = key_prefix
+        self.redis = redis.from_url(redis_url) if enabled and redis_enabled else None
+        self.namespace = json.dumps([agent_name, hashlib.sha256(system_prompt.encode('utf-8')).hexdigest()])
+        # key -> (回答分块, 过期时间)
+        self.entries: "OrderedDict[str, Tuple[List[str], float]]" = OrderedDict()
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.stores = 0
+        self.errors = 0
+
+    def key(self, user_input: str, has_history: bool) -> Optional[str]:
+        """Get the cache key of a turn, or None when the turn must be generated by the model.
+
+        Args:
+            user_input: The user message of the turn.
+            has_history: Whether the session already has earlier turns.
+        """
+        if not self.enabled:
+            return None
+        if (has_history or len(user_input) > self.max_input_chars
+                or any(pattern.search(user_input) for pattern in self.bypass_patterns)):
+            self.bypassed += 1
+            return None
+        conversation = json.dumps([normalize_input(user_input)], ensure_ascii=False)
+        return hashlib.sha256((self.namespace + conversation).encode('utf-8')).hexdigest()
+
+    async def get(self, key: str) -> Optional[List[str]]:
+        """Get the cached answer chunks, or None on a miss."""
+        entry = self.entries.get(key)
+        if entry and entry[1] > time.monotonic():
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+        if entry:
+            del self.entries[key]
+        if self.redis:
+            try:
+                data = await self.redis.get(self.key_prefix + key)
+            except Exception as e:
+                # Redis不可用时按未命中处理
+                self.errors += 1
+                logger.warning(f"Failed to read the response cache from Redis: {e}")
+                data = None
+            if data:
+                chunks = json.loads(data)
+                self._remember(key, chunks)
+                self.hits += 1
+                self.redis_hits += 1
+                return chunks
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, chunks: List[str]) -> None:
+        """Cache the answer chunks of a completed turn."""
+        chunks = [chunk for chunk in chunks if chunk]
+        if not chunks:
+            return
+        self._remember(key, chunks)
+        self.stores += 1
+        if self.redis:
+            try:
+                await self.redis.set(self.key_prefix + key, json.dumps(chunks, ensure_ascii=False), ex=max(1, int(self.ttl)))
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"Failed to write the response cache to Redis: {e}")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get the hit, miss and bypass counters."""
+        lookups = self.hits + self.misses
+        return {
+            'enabled': self.enabled,
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'redis_hits': self.redis_hits,
+            'misses': self.misses,
+            'bypassed': self.bypassed,
+            'stores': self.stores,
+            'errors': self.errors,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    async def close(self) -> None:
+        """Close the Redis connection."""
+        if self.redis:
+            await self.redis.aclose()
+
+    def _remember(self, key: str, chunks: List[str]) -> None:
+        self.entries[key] = (chunks, time.monotonic() + self.ttl)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
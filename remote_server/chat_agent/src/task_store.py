@@ -0,0 +1,200 @@
+from collections import OrderedDict
+from itertools import chain
+from typing import Dict, Optional, Tuple
+from a2a.server.tasks import TaskStore
+from a2a.types import Task, TaskState
+from src.config.settings import TASK_STORE_CONFIG
+import asyncio
+import sys
+import time
+import os
+import logging.config
+
+log_config_path = os.path.abspath("src/config/logging.conf")
+logging.config.fileConfig(log_config_path, encoding='utf-8')
+logger = logging.getLogger(__name__)
+
+# 终态任务不会再被更新，可以安全地淘汰或持久化
+TERMINAL_STATES = {
+    TaskState.completed,
+    TaskState.canceled,
+    TaskState.failed,
+    TaskState.rejected,
+}
+
+
+# 任务对象的内存占用（a2a-sdk 0.3.0，tracemalloc测得）：Task本身约1.1KB，每条消息或工件约2KB（不含文本），
+# 约为JSON序列化长度的7倍
+TASK_BYTES = 1100
+MESSAGE_BYTES = 2000
+
+
+def _is_terminal(task: Task) -> bool:
+    return task.status.state in TERMINAL_STATES
+
+
+def estimate_task_bytes(task: Task) -> int:
+    """Estimate the memory held by a Task: fixed per-object costs plus the size of every text part."""
+    size = TASK_BYTES
+    for item in chain(task.history or [], task.artifacts or []):
+        size += MESSAGE_BYTES + sum(sys.getsizeof(part.root.text) for part in item.parts
+                                    if isinstance(getattr(part.root, 'text', None), str))
+    return size
+
+
+class BoundedInMemoryTaskStore(TaskStore):
+    """有界的内存任务存储。
+
+    按LRU顺序保存任务，超过max_tasks个任务或max_bytes字节时淘汰最久未使用的终态任务，
+    超过ttl秒未更新的任务无论状态都会被淘汰。max_bytes限制的是估算的对象内存占用：
+    执行中的任务按消息数计入（不遍历历史），进入终态时再按消息与文本估算一次。
+    """
+
+    def __init__(self,
+                 max_tasks: int = TASK_STORE_CONFIG['max_tasks'],
+                 max_bytes: int = TASK_STORE_CONFIG['max_bytes'],
+                 ttl: float = TASK_STORE_CONFIG['ttl']):
+        self.max_tasks = max_tasks
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # task_id -> (task, 估算的内存字节数, 最后更新时间)
+        self.tasks: "OrderedDict[str, Tuple[Task, int, float]]" = OrderedDict()
+        self.total_bytes = 0
+        self.evictions = 0
+        self.lock = asyncio.Lock()
+
+    async def save(self, task: Task) -> None:
+        async with self.lock:
+            previous = self.tasks.pop(task.id, None)
+            if _is_terminal(task):
+                size = estimate_task_bytes(task)
+            else:
+                # 每个流式事件都会保存，执行中只按消息数估算，不遍历整个历史
+                size = TASK_BYTES + (len(task.history or []) + len(task.artifacts or [])) * MESSAGE_BYTES
+            self.total_bytes += size - (previous[1] if previous else 0)
+            self.tasks[task.id] = (task, size, time.monotonic())
+            self._evict()
+
+    async def get(self, task_id: str) -> Optional[Task]:
+        async with self.lock:
+            entry = self.tasks.get(task_id)
+            if not entry:
+                return None
+            if time.monotonic() - entry[2] > self.ttl:
+                self._remove(task_id)
+                self.evictions += 1
+                return None
+            self.tasks.move_to_end(task_id)
+            return entry[0]
+
+    async def delete(self, task_id: str) -> None:
+        async with self.lock:
+            if task_id in self.tasks:
+                self._remove(task_id)
+            else:
+                logger.warning(f"Attempted to delete nonexistent task with id: {task_id}")
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get the number of tasks, their estimated memory in bytes and the eviction count."""
+        return {'tasks': len(self.tasks), 'bytes': self.total_bytes, 'evictions': self.evictions}
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        # 先淘汰过期任务（LRU顺序最前的最旧）
+        while self.tasks:
+            task_id, (_, _, updated_at) = next(iter(self.tasks.items()))
+            if now - updated_at <= self.ttl:
+                break
+            self._remove(task_id)
+            self.evictions += 1
+        # 再按LRU淘汰终态任务，执行中的任务保留
+        excess_tasks = len(self.tasks) - self.max_tasks
+        excess_bytes = self.total_bytes - self.max_bytes
+        victims = []
+        for task_id, (task, size, _) in self.tasks.items():
+            if excess_tasks <= 0 and excess_bytes <= 0:
+                break
+            if _is_terminal(task):
+                victims.append(task_id)
+                excess_tasks -= 1
+                excess_bytes -= size
+        for task_id in victims:
+            self._remove(task_id)
+            self.evictions += 1
+
+    def _remove(self, task_id: str) -> None:
+        _, size, _ = self.tasks.pop(task_id)
+        self.total_bytes -= size
+
+
+class RedisTaskStore(TaskStore):
+    """基于Redis的任务存储。
+
+    复用保存检查点的Redis实例，任何副本都可以响应tasks/get。执行中的任务保存在本进程内，
+    任务状态变化时写入Redis，逐token的working更新最多每snapshot_interval秒写入一次快照，
+    其他副本读到的执行中任务（含已输出的历史）最多落后这么久；终态任务写入后从本地移除。
+    """
+
+    def __init__(self,
+                 redis_url: str = TASK_STORE_CONFIG['redis_url'],
+                 key_prefix: str = TASK_STORE_CONFIG['key_prefix'],
+                 ttl: int = TASK_STORE_CONFIG['ttl'],
+                 snapshot_interval: float = TASK_STORE_CONFIG['snapshot_interval']):
+        # Redis客户端随langgraph-checkpoint-redis一起安装
+        import redis.asyncio as redis
+        self.redis = redis.from_url(redis_url)
+        self.key_prefix = key_prefix
+        self.ttl = ttl
+        self.snapshot_interval = snapshot_interval
+        # task_id -> (执行中的任务, 最近一次写入Redis时的状态, 写入时间)
+        self.active: Dict[str, Tuple[Task, Optional[TaskState], float]] = {}
+
+    async def save(self, task: Task) -> None:
+        entry = self.active.get(task.id)
+        written_state = entry[1] if entry else None
+        if _is_terminal(task):
+            self.active.pop(task.id, None)
+            await self._write(task)
+        elif task.status.state != written_state or time.monotonic() - entry[2] >= self.snapshot_interval:
+            await self._write(task)
+            self.active[task.id] = (task, task.status.state, time.monotonic())
+            self._prune()
+        else:
+            self.active[task.id] = (task, written_state, entry[2])
+
+    async def get(self, task_id: str) -> Optional[Task]:
+        entry = self.active.get(task_id)
+        if entry:
+            return entry[0]
+        data = await self.redis.get(self.key_prefix + task_id)
+        if data is None:
+            return None
+        return Task.model_validate_json(data)
+
+    async def delete(self, task_id: str) -> None:
+        self.active.pop(task_id, None)
+        await self.redis.delete(self.key_prefix + task_id)
+
+    async def close(self) -> None:
+        """Close the Redis connection pool."""
+        await self.redis.aclose()
+
+    def _prune(self) -> None:
+        # 未能进入终态就被放弃的任务（进程内残留）超过ttl后丢弃，Redis中的副本仍然保留
+        expired_at = time.monotonic() - self.ttl
+        for task_id in [task_id for task_id, entry in self.active.items() if entry[2] < expired_at]:
+            del self.active[task_id]
+
+    async def _write(self, task: Task) -> None:
+        await self.redis.set(self.key_prefix + task.id, task.model_dump_json(), ex=self.ttl)
+
+
+def create_task_store() -> TaskStore:
+    """Create the task store selected by TASK_STORE_CONFIG['backend'] ('memory' or 'redis')."""
+    backend = TASK_STORE_CONFIG['backend']
+    logger.info(f"Using {backend} task store")
+    if backend == 'redis':
+        return RedisTaskStore()
+    if backend == 'memory':
+        return BoundedInMemoryTaskStore()
+    raise ValueError(f"Unknown task store backend: {backend}")
@@ -0,0 +1,287 @@
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.messages import AIMessage, BaseMessage, SystemMessage, ToolMessage
+from langchain_core.tools import BaseTool, StructuredTool
+from src.config.settings import CHECKPOINT_CONFIG, MODEL_CONFIG, TRACE_CONFIG
+import asyncio
+import gzip
+import hashlib
+import json
+import time
+import zlib
+import os
+import logging.config
+
+log_config_path = os.path.abspath("src/config/logging.conf")
+logging.config.fileConfig(log_config_path, encoding='utf-8')
+logger = logging.getLogger(__name__)
+
+# 以录制文件回放模型与工具（MODEL_CONFIG['provider'] == 'replay'）
+REPLAY = MODEL_CONFIG['provider'] == 'replay'
+
+
+def conversation_key(messages: Sequence[BaseMessage]) -> str:
+    """Key of a model call: a hash of the conversation without system messages.
+
+    System messages are left out, so a release that changes the system prompt (or the compaction
+    summary placement) still finds the recorded answers. Tool call IDs are left out as well.
+    """
+    conversation = [
+        # 流式输出合并后的AIMessageChunk与AIMessage视为相同
+        ['ai' if isinstance(message, AIMessage) else message.type, message.content,
+         [[call['name'], call['args']] for call in getattr(message, 'tool_calls', [])]]
+        for message in messages
+        if not isinstance(message, SystemMessage)
+    ]
+    return hashlib.sha256(json.dumps(conversation, ensure_ascii=False, sort_keys=True,
+                                     default=str).encode('utf-8')).hexdigest()
+
+
+def tool_key(name: str, args: Any) -> str:
+    return json.dumps([name, args], ensure_ascii=False, sort_keys=True, default=str)
+
+
+def _offset_ms(started_at: float) -> float:
+    return round((time.perf_counter() - started_at) * 1000, 2)
+
+
+class TurnTrace(AsyncCallbackHandler):
+    """一轮对话的录制：输出的内容块，以及每次模型调用（逐token时间）与工具调用（参数、结果、耗时）。
+
+    作为LangChain回调传给graph.astream，未被采样的轮次recording为False，不记录任何内容。
+    """
+
+    def __init__(self, session_id: str, user_input: str, recording: bool):
+        self.recording = recording
+        self.session_id = session_id
+        self.user_input = user_input
+        self.started_at = time.perf_counter()
+        self.timestamp = time.time()
+        self.chunks: List[Tuple[float, str]] = []
+        self.model_calls: Dict[UUID, Dict[str, Any]] = {}
+        self.tool_calls: Dict[UUID, Dict[str, Any]] = {}
+
+    @property
+    def callbacks(self) -> List[AsyncCallbackHandler]:
+        """The callbacks for the graph config: this trace when the turn is recorded."""
+        return [self] if self.recording else []
+
+    def chunk(self, content: Any) -> None:
+        """Record one content chunk streamed to the A2A client."""
+        if self.recording and content:
+            self.chunks.append((_offset_ms(self.started_at), content))
+
+    async def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[BaseMessage]], *,
+                                  run_id: UUID, **kwargs: Any) -> None:
+        self.model_calls[run_id] = {
+            'key': conversation_key(messages[0]),
+            'started_ms': _offset_ms(self.started_at),
+            'started_at': time.perf_counter(),
+            'tokens': [],
+        }
+
+    async def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        call = self.model_calls.get(run_id)
+        if call and token:
+            call['tokens'].append((_offset_ms(call['started_at']), token))
+
+    async def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        call = self.model_calls.get(run_id)
+        if not call:
+            return
+        message = response.generations[0][0].message if response.generations and response.generations[0] else None
+        call['duration_ms'] = _offset_ms(call.pop('started_at'))
+        call['content'] = message.content if message else ''
+        call['tool_calls'] = [
+            {'name': tool_call['name'], 'args': tool_call['args'], 'id': tool_call['id']}
+            for tool_call in getattr(message, 'tool_calls', [])
+        ]
+
+    async def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID,
+                            inputs: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        self.tool_calls[run_id] = {
+            'name': serialized.get('name') or kwargs.get('name'),
+            'args': inputs if inputs is not None else input_str,
+            'started_ms': _offset_ms(self.started_at),
+            'started_at': time.perf_counter(),
+        }
+
+    async def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        call = self.tool_calls.get(run_id)
+        if not call:
+            return
+        call['duration_ms'] = _offset_ms(call.pop('started_at'))
+        call['result'] = output.content if isinstance(output, ToolMessage) else output
+
+    def to_record(self, status: str) -> Dict[str, Any]:
+        return {
+            'kind': 'agent_turn',
+            'agent': CHECKPOINT_CONFIG['agent_name'],
+            'session_id': self.session_id,
+            'user_input': self.user_input,
+            'timestamp': self.timestamp,
+            'status': status,
+            'duration_ms': _offset_ms(self.started_at),
+            'chunks': self.chunks,
+            # 未完成（被取消）的调用没有结果，回放时无法使用
+            'model_calls': [call for call in self.model_calls.values() if 'duration_ms' in call],
+            'tool_calls': [call for call in self.tool_calls.values() if 'duration_ms' in call],
+        }
+
+
+class TraceRecorder:
+    """对话录制器，把每轮对话写入JSONL文件（路径以.gz结尾时gzip压缩）。
+
+    按session_id采样，被采样的会话录制所有轮次，保证回放时对话历史完整。写入在后台任务中批量进行，
+    不阻塞流式输出；缓冲区超过max_buffer条时丢弃新的记录。
+    """
+
+    def __init__(self,
+                 enabled: bool = TRACE_CONFIG['enabled'],
+                 path: str = TRACE_CONFIG['path'],
+                 sample_rate: float = TRACE_CONFIG['sample_rate'],
+                 max_buffer: int = TRACE_CONFIG['max_buffer']):
+        """
+        Args:
+            enabled: Record conversations.
+            path: The JSONL file the turns are appended to; '.gz' compresses it.
+            sample_rate: Share of sessions recorded, from 0 to 1.
+            max_buffer: Maximum turns waiting to be written.
+        """
+        self.enabled = enabled
+        self.path = os.path.abspath(path)
+        self.sample_rate = sample_rate
+        self.max_buffer = max_buffer
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.writer: Optional[asyncio.Task] = None
+        self.recorded = 0
+        self.dropped = 0
+        self.write_errors = 0
+
+    def start_turn(self, session_id: str, user_input: str) -> TurnTrace:
+        """Start recording a turn; the returned trace records nothing when the session is not sampled."""
+        return TurnTrace(session_id, user_input, self.enabled and self._sampled(session_id))
+
+    def finish(self, trace: TurnTrace, status: str) -> None:
+        """Queue a finished turn for writing."""
+        if not trace.recording:
+            return
+        if self.queue.qsize() >= self.max_buffer:
+            self.dropped += 1
+            return
+        if self.writer is None:
+            self.writer = asyncio.create_task(self._write_loop())
+        self.queue.put_nowait(trace.to_record(status))
+
+    async def close(self) -> None:
+        """Write the queued turns and stop the writer."""
+        if self.writer:
+            await self.queue.join()
+            self.writer.cancel()
+            await asyncio.gather(self.writer, return_exceptions=True)
+            self.writer = None
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get the recorded, dropped and failed turn counters."""
+        return {
+            'enabled': self.enabled,
+            'recorded': self.recorded,
+            'buffered': self.queue.qsize(),
+            'dropped': self.dropped,
+            'write_errors': self.write_errors,
+        }
+
+    def _sampled(self, session_id: str) -> bool:
+        if self.sample_rate >= 1:
+            return True
+        return zlib.crc32(session_id.encode('utf-8')) / 0xFFFFFFFF < self.sample_rate
+
+    async def _write_loop(self) -> None:
+        while True:
+            batch = [await self.queue.get()]
+            while not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            lines = ''.join(json.dumps(record, ensure_ascii=False, default=str) + '\n' for record in batch)
+            try:
+                await asyncio.to_thread(self._append, lines)
+                self.recorded += len(batch)
+            except Exception as e:
+                self.write_errors += len(batch)
+                logger.error(f"Failed to write {len(batch)} traced turns to {self.path}: {e}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _append(self, lines: str) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # gzip文件可以逐批追加（多个gzip成员），读取时作为一个整体解压
+        opener = gzip.open if self.path.endswith('.gz') else open
+        with opener(self.path, 'at', encoding='utf-8') as f:
+            f.write(lines)
+
+
+class Recording:
+    """录制文件中的模型调用与工具结果，供回放使用。"""
+
+    def __init__(self, path: str):
+        self.model_calls: Dict[str, Dict[str, Any]] = {}
+        self.tool_results: Dict[str, Dict[str, Any]] = {}
+        turns = 0
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                if record.get('kind') != 'agent_turn' or record.get('agent') != CHECKPOINT_CONFIG['agent_name']:
+                    continue
+                turns += 1
+                for call in record['model_calls']:
+                    self.model_calls.setdefault(call['key'], call)
+                for call in record['tool_calls']:
+                    self.tool_results.setdefault(tool_key(call['name'], call['args']), call)
+        logger.info(f"Loaded {turns} recorded turns with {len(self.model_calls)} model calls and "
+                    f"{len(self.tool_results)} tool results from {path}")
+
+    def model_call(self, messages: Sequence[BaseMessage]) -> Dict[str, Any]:
+        call = self.model_calls.get(conversation_key(messages))
+        if call is None:
+            raise LookupError("No recorded model call for this conversation")
+        return call
+
+    def tool_result(self, name: str, args: Any) -> Dict[str, Any]:
+        call = self.tool_results.get(tool_key(name, args))
+        if call is None:
+            raise LookupError(f"No recorded result for tool {name} with arguments {args}")
+        return call
+
+
+@lru_cache(maxsize=None)
+def load_recording(path: str = MODEL_CONFIG['replay']['path']) -> Recording:
+    """Load a recording once per process; the model and the tools share it."""
+    return Recording(os.path.abspath(path))
+
+
+def replay_tools(tools: Sequence[BaseTool], speed: float = MODEL_CONFIG['replay']['speed']) -> List[BaseTool]:
+    """Replace tools with ones that return the recorded results after the recorded duration.
+
+    The replayed tools keep the names, descriptions and argument schemas, so the model and the
+    ToolNode see the same tools as in the recorded release.
+
+    Args:
+        tools: The agent's tools.
+        speed: Recorded durations are divided by it; 0 returns the results without waiting.
+    """
+    recording = load_recording()
+
+    def replayed(tool: BaseTool) -> BaseTool:
+        async def run(**kwargs: Any) -> Any:
+            call = recording.tool_result(tool.name, kwargs)
+            if speed:
+                await asyncio.sleep(call['duration_ms'] / 1000 / speed)
+            return call['result']
+
+        return StructuredTool.from_function(coroutine=run, name=tool.name, description=tool.description,
+                                            args_schema=tool.args_schema)
+
+    return [replayed(tool) for tool in tools]
@@ -1,4 +1,8 @@
 from src.agent import CodingAgent
+from src.coalescer import StreamCoalescer
+from src.session_scheduler import SessionScheduler
+from src.config.settings import SESSION_SCHEDULER_CONFIG
+from src.fake_backends import FAKE_BACKENDS
 from a2a.server.agent_execution import AgentExecutor
 import os
 from a2a.server.agent_execution.context import RequestContext
@@ -6,6 +10,7 @@ from a2a.server.events.event_queue import EventQueue
 from a2a.server.tasks import TaskUpdater
 from a2a.utils import new_agent_text_message, new_task
 from a2a.types import TaskState, Part, TextPart
+from typing import Any, Dict
 import asyncio
 import os
 import logging.config
@@ -14,14 +19,56 @@ log_config_path = os.path.abspath("src/config/logging.conf")
 logging.config.fileConfig(log_config_path,encoding='utf-8')
 logger = logging.getLogger(__name__)
 
+# 取消时等待执行中的任务结束的最长时间（秒）
+CANCEL_TIMEOUT = 5
+
 
 class CodingAgentExecutor(AgentExecutor):
     def __init__(self) -> None:
         logger.info("Initializing Agent Executor")
         self.agent = CodingAgent()
-        asyncio.run(self.agent.initialize())
+        self.coalescer = StreamCoalescer()
+        # 按会话串行执行轮次并合并重复请求；生成被取消时由调度器在会话锁内修复检查点。
+        # 多worker时另持有Redis中的会话锁，FAKE_BACKENDS时没有Redis
+        self.scheduler = SessionScheduler(on_cancel=self.agent.recover_interrupted_turn,
+                                          redis_lock=SESSION_SCHEDULER_CONFIG['redis_lock'] and not FAKE_BACKENDS)
+        # 正在执行的任务：task_id -> 执行该任务的asyncio.Task，用于取消。只记录本进程的任务：多worker运行时
+        # （SERVER_CONFIG['workers'] > 1）tasks/cancel可能落到其他worker，那里找不到任务，只会把任务存储中的状态改为canceled，
+        # 执行中的生成不会被中断
+        self.running_tasks: Dict[str, asyncio.Task] = {}
+
+    async def startup(self) -> None:
+        """Initialize the agent's async resources; called from the application lifespan."""
+        await self.agent.initialize()
         logger.info("Agent Executor initialize completed.")
 
+    async def shutdown(self) -> None:
+        """Cancel the tasks still running when the server stops."""
+        running = [task for task in self.running_tasks.values() if not task.done()]
+        for task in running:
+            task.cancel()
+        if running:
+            # 与cancel()相同，等待检查点修复完成
+            await asyncio.wait(running, timeout=CANCEL_TIMEOUT)
+        await self.scheduler.close()
+        await self.agent.close()
+        logger.info(f"Agent Executor shut down, {len(running)} running tasks canceled")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get the running task count, the session scheduler, compaction, checkpoint write, response cache and trace counters."""
+        return {
+            'running_tasks': len(self.running_tasks),
+            **self.scheduler.get_metrics(),
+            'compaction': self.agent.compactor.get_metrics(),
+            'checkpoint_writes': self.agent.durable_checkpointer.get_metrics(),
+            'response_cache': self.agent.response_cache.get_metrics(),
+            'traces': self.agent.tracer.get_metrics(),
+        }
+
+    async def get_checkpoint_stats(self) -> Dict[str, Any]:
+        """Get the checkpoint thread counts, bytes and eviction rates."""
+        return await self.agent.retention.get_stats()
+
     # 必须实现execute和cancel方法
     async def execute(self, context: RequestContext, event_queue: EventQueue) -> None:
         logger.info("Starting execute method")
@@ -37,14 +84,20 @@ class CodingAgentExecutor(AgentExecutor):
             context.current_task = task
             await event_queue.enqueue_event(task)
         updater = TaskUpdater(event_queue, task.id, task.context_id)
+        self.running_tasks[task.id] = asyncio.current_task()
 
         try:
             # 解析了A2A Client发来的请求，就可以让Server智能体干活了，按照正常逻辑进行调用，需要注意执行过程和结束都需要跟Client保持通信，要不断更新当前任务的状态
-            async for chunk in self.agent.stream(messages=user_input, session_id=session_id):
+            # 合并逐token的内容块，减少状态更新事件数量
+            stream = self.scheduler.stream(
+                session_id,
+                user_input,
+                lambda: self.coalescer.coalesce(self.agent.stream(messages=user_input, session_id=session_id)),
+            )
+            async for chunk in stream:
                 is_final_answer = chunk.get("is_final_answer")
                 content = chunk.get("content")
                 if not is_final_answer:
-                    logger.info(f"Updating task status to working with content: {content}")
                     await updater.update_status(
                         TaskState.working,
                         new_agent_text_message(
@@ -64,6 +117,15 @@ class CodingAgentExecutor(AgentExecutor):
                     await updater.complete()
                     break
 
+        except asyncio.CancelledError:
+            # 没有其他请求共享本轮生成时，调度器会中断graph.astream以及底层的模型流式请求并修复检查点
+            logger.info(f"Task {task.id} canceled, session_id={session_id}")
+            # 原SSE流只读取本任务的队列，在这里发送canceled最终事件（tasks/cancel的队列也会收到）。
+            # 合并到同一生成的其他请求各有自己的任务与队列，不受影响；同一task_id有更新的执行，
+            # 或cancel()等待超时已自行回复时不发送
+            if self.running_tasks.get(task.id) is asyncio.current_task():
+                await asyncio.shield(self._send_canceled(updater))
+            raise
         except Exception as e:
             logger.error(f"Exception occurred while processing task with session_id={session_id}: {str(e)}", exc_info=True)
             await updater.update_status(
@@ -74,8 +136,29 @@ class CodingAgentExecutor(AgentExecutor):
                     task.id,
                 ),
             )
+        finally:
+            if self.running_tasks.get(task.id) is asyncio.current_task():
+                del self.running_tasks[task.id]
 
-    async def cancel(self, context: RequestContext, event_queue: EventQueue) -> None:
-        logger.warning("Cancel method called, but not supported")
-        raise Exception("cancel not supported")
+    @staticmethod
+    async def _send_canceled(updater: TaskUpdater) -> None:
+        try:
+            await updater.cancel()
+        except RuntimeError:
+            # 取消到达前任务已发送最终状态
+            pass
 
+    async def cancel(self, context: RequestContext, event_queue: EventQueue) -> None:
+        task_id = context.task_id
+        logger.info(f"Cancel requested for task {task_id}")
+        running_task = self.running_tasks.get(task_id)
+        if running_task and not running_task.done():
+            running_task.cancel()
+            # 等待执行结束，确保检查点修复完成后再回复；canceled状态由执行任务发送
+            done, _ = await asyncio.wait({running_task}, timeout=CANCEL_TIMEOUT)
+            if done:
+                return
+            # 超时仍未结束时由这里回复，执行任务结束时不再重复发送
+            self.running_tasks.pop(task_id, None)
+        updater = TaskUpdater(event_queue, task_id, context.context_id)
+        await updater.cancel()
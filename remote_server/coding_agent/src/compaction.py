@@ -0,0 +1,196 @@
+from typing import Any, Dict, List, NotRequired, Sequence
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from langgraph.constants import TAG_NOSTREAM
+from langgraph.prebuilt.chat_agent_executor import AgentState
+from src.config.settings import COMPACTION_CONFIG
+import json
+import re
+import os
+import logging.config
+
+log_config_path = os.path.abspath("src/config/logging.conf")
+logging.config.fileConfig(log_config_path, encoding='utf-8')
+logger = logging.getLogger(__name__)
+
+# 中日韩字符及全角标点，qwen分词器中约一个字符一个token
+_CJK = re.compile(r'[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]')
+
+SUMMARY_PROMPT = (
+    "你负责压缩对话历史。请把已有摘要和新增对话合并为一段简洁的摘要，"
+    "保留用户的需求、偏好、已提供或已确认的信息、工具调用得到的关键结果以及已经给出的结论，"
+    "删除寒暄和重复内容。只输出摘要本身。"
+)
+
+
+class CompactionState(AgentState):
+    """AgentState plus the compaction fields stored in the checkpoint."""
+    # 滚动摘要，覆盖messages[:summarized_count]
+    summary: NotRequired[str]
+    summarized_count: NotRequired[int]
+    # 从已摘要的消息中提取的关键信息，如model_id、身份证号
+    pinned: NotRequired[Dict[str, str]]
+
+
+def message_text(message: BaseMessage) -> str:
+    """Get the text of a message, including the arguments of its tool calls."""
+    if isinstance(message.content, str):
+        text = message.content
+    else:
+        text = ''.join(part if isinstance(part, str) else str(part.get('text', '')) for part in message.content)
+    if isinstance(message, AIMessage) and message.tool_calls:
+        text += json.dumps([call['args'] for call in message.tool_calls], ensure_ascii=False)
+    return text
+
+
+def estimate_tokens(messages: Sequence[BaseMessage]) -> int:
+    """Estimate the prompt tokens of messages without a tokenizer.
+
+    A CJK character counts as one token, other text as four characters per token, and every
+    message adds four tokens of framing.
+    """
+    total = 0
+    for message in messages:
+        text = message_text(message)
+        cjk = len(_CJK.findall(text))
+        total += cjk + (len(text) - cjk) // 4 + 4
+    return total
+
+
+class ConversationCompactor:
+    """对话压缩阶段，作为create_react_agent的pre_model_hook在每次调用模型前执行。
+
+    发给模型的内容为：系统提示词（附加历史摘要和关键信息）+ 尚未摘要的消息。尚未摘要的部分
+    超过max_tokens时，把最近keep_turns轮之前的消息合并进滚动摘要，摘要与进度保存在检查点中，
+    完整的消息历史保持不变。
+    """
+
+    def __init__(self,
+                 model: BaseChatModel,
+                 system_prompt: str,
+                 enabled: bool = COMPACTION_CONFIG['enabled'],
+                 max_tokens: int = COMPACTION_CONFIG['max_tokens'],
+                 keep_turns: int = COMPACTION_CONFIG['keep_turns'],
+                 max_message_chars: int = COMPACTION_CONFIG['max_message_chars'],
+                 pinned_patterns: Dict[str, str] = COMPACTION_CONFIG['pinned_patterns']):
+        """
+        Args:
+            model: The chat model used to write the summary.
+            system_prompt: The agent's system prompt, always sent first.
+            enabled: When False the agent graph is built without the compaction stage.
+            max_tokens: Estimated token budget of the summary plus the unsummarized messages.
+            keep_turns: Number of most recent turns (from a user message on) always sent verbatim.
+            max_message_chars: Each message is truncated to this length in the summary request.
+            pinned_patterns: Fact name -> regex; the last match in summarized messages is pinned.
+        """
+        self.model = model
+        self.system_prompt = system_prompt
+        self.enabled = enabled
+        self.max_tokens = max_tokens
+        self.keep_turns = keep_turns
+        self.max_message_chars = max_message_chars
+        self.pinned_patterns = {name: re.compile(pattern) for name, pattern in pinned_patterns.items()}
+        self.model_calls = 0
+        self.compactions = 0
+        self.summary_failures = 0
+        self.history_tokens = 0
+        self.sent_tokens = 0
+        self.summary_tokens = 0
+
+    def graph_options(self) -> Dict[str, Any]:
+        """Get the create_react_agent keyword arguments for the system prompt and compaction."""
+        if not self.enabled:
+            return {'prompt': self.system_prompt}
+        return {'pre_model_hook': self, 'state_schema': CompactionState}
+
+    async def __call__(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        messages: List[BaseMessage] = state['messages']
+        summary: str = state.get('summary', '')
+        summarized: int = state.get('summarized_count', 0)
+        pinned: Dict[str, str] = state.get('pinned') or {}
+        update: Dict[str, Any] = {}
+
+        system = self._system_message(summary, pinned)
+        if estimate_tokens([system, *messages[summarized:]]) > self.max_tokens:
+            cutoff = self._cutoff(messages)
+            if cutoff > summarized:
+                folded = messages[summarized:cutoff]
+                try:
+                    summary = await self._summarize(summary, folded)
+                except Exception as e:
+                    # 摘要失败时本次发送未压缩的历史，不影响当前轮次
+                    self.summary_failures += 1
+                    logger.warning(f"Failed to summarize conversation, sending full history: {e}")
+                else:
+                    pinned = {**pinned, **self._extract_pinned(folded)}
+                    summarized = cutoff
+                    update = {'summary': summary, 'summarized_count': summarized, 'pinned': pinned}
+                    system = self._system_message(summary, pinned)
+                    self.compactions += 1
+
+        llm_input = [system, *messages[summarized:]]
+        history_tokens = estimate_tokens([SystemMessage(self.system_prompt), *messages])
+        sent_tokens = estimate_tokens(llm_input)
+        self.model_calls += 1
+        self.history_tokens += history_tokens
+        self.sent_tokens += sent_tokens
+        if update:
+            logger.info(f"Compacted {summarized} messages into the summary, "
+                        f"estimated prompt tokens {history_tokens} -> {sent_tokens}")
+        return {**update, 'llm_input_messages': llm_input}
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get the compaction counters and the estimated prompt tokens saved."""
+        saved = self.history_tokens - self.sent_tokens
+        return {
+            'model_calls': self.model_calls,
+            'compactions': self.compactions,
+            'summary_failures': self.summary_failures,
+            'history_tokens': self.history_tokens,
+            'sent_tokens': self.sent_tokens,
+            'saved_tokens': saved,
+            'summary_tokens': self.summary_tokens,
+            'saved_ratio': round(saved / self.history_tokens, 4) if self.history_tokens else 0.0,
+        }
+
+    def _cutoff(self, messages: Sequence[BaseMessage]) -> int:
+        # 最近keep_turns轮的起点；按用户消息切分，不会拆开工具调用与其结果
+        turn_starts = [i for i, message in enumerate(messages) if isinstance(message, HumanMessage)]
+        if len(turn_starts) <= self.keep_turns:
+            return 0
+        return turn_starts[-self.keep_turns]
+
+    def _system_message(self, summary: str, pinned: Dict[str, str]) -> SystemMessage:
+        content = self.system_prompt
+        if summary:
+            content += f"\n\n以下是与用户之前对话的摘要：\n{summary}"
+        if pinned:
+            facts = '\n'.join(f"- {name}: {value}" for name, value in pinned.items())
+            content += f"\n\n对话中已确认的关键信息：\n{facts}"
+        return SystemMessage(content)
+
+    def _extract_pinned(self, messages: Sequence[BaseMessage]) -> Dict[str, str]:
+        pinned: Dict[str, str] = {}
+        for message in messages:
+            text = message_text(message)
+            for name, pattern in self.pinned_patterns.items():
+                matches = pattern.findall(text)
+                if matches:
+                    pinned[name] = matches[-1]
+        return pinned
+
+    async def _summarize(self, summary: str, messages: Sequence[BaseMessage]) -> str:
+        roles = {HumanMessage: '用户', AIMessage: '助手', ToolMessage: '工具结果'}
+        lines = []
+        for message in messages:
+            text = message_text(message)[:self.max_message_chars]
+            if text:
+                lines.append(f"{roles.get(type(message), message.type)}：{text}")
+        request = [
+            SystemMessage(SUMMARY_PROMPT),
+            HumanMessage(f"已有摘要：\n{summary or '无'}\n\n新增对话：\n" + '\n'.join(lines)),
+        ]
+        self.summary_tokens += estimate_tokens(request)
+        # nostream标签：摘要调用的token不进入graph.astream(stream_mode='messages')的输出
+        response = await self.model.ainvoke(request, config={'tags': [TAG_NOSTREAM]})
+        return message_text(response).strip()
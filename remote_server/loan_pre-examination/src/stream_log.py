@@ -0,0 +1,41 @@
+from src.config.settings import LOGGING_CONFIG
+import logging
+import time
+
+
+class StreamLogSummary:
+    """流式输出的日志汇总。
+
+    不再逐token写日志，而是统计token数、首字延迟(TTFT)和总耗时，在流结束时输出一行汇总；
+    token_sample_every大于0时，每隔N个token额外输出一条DEBUG采样日志。
+    """
+
+    def __init__(self, logger: logging.Logger, session_id: str,
+                 sample_every: int = LOGGING_CONFIG['token_sample_every']):
+        self.logger = logger
+        self.session_id = session_id
+        self.sample_every = sample_every
+        self.started_at = time.perf_counter()
+        self.first_token_at = None
+        self.tokens = 0
+        self.chars = 0
+
+    def token(self, content) -> None:
+        """Record one streamed chunk."""
+        if not content:
+            return
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.tokens += 1
+        self.chars += len(content)
+        if self.sample_every and self.tokens % self.sample_every == 0:
+            self.logger.debug("Session %s token #%d: %r", self.session_id, self.tokens, content)
+
+    def finish(self, status: str = "completed") -> None:
+        """Write the per-stream summary line."""
+        duration = time.perf_counter() - self.started_at
+        ttft = (self.first_token_at - self.started_at) * 1000 if self.first_token_at else -1
+        self.logger.info(
+            "Stream %s for session ID: %s, tokens=%d, chars=%d, ttft=%.1fms, duration=%.1fms",
+            status, self.session_id, self.tokens, self.chars, ttft, duration * 1000,
+        )
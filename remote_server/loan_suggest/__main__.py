@@ -1,15 +1,5 @@
-from a2a.server.apps import A2AStarletteApplication
-from a2a.server.request_handlers import DefaultRequestHandler
-from a2a.server.tasks import InMemoryTaskStore
-from a2a.types import (
-    AgentCapabilities,
-    AgentCard,
-    AgentSkill,
-)
-from src.agent import LoanSuggestAgent
-from src.agent_executor import LoanSuggestAgentExecutor
+from src.config.settings import SERVER_CONFIG
 import uvicorn
-from pydantic import ValidationError
 import logging.config
 import os
 
@@ -17,71 +7,23 @@ log_config_path = os.path.abspath("src/config/logging.conf")
 logging.config.fileConfig(log_config_path, encoding='utf-8')
 logger = logging.getLogger(__name__)
 
-
-def main(host, port):
-    logger.info(f"Starting Loan Scheme Suggestion Agent service on host: {host}, port: {port}")
-    
-    try:
-        # 创建AgentSkill
-        capabilities = AgentCapabilities(
-            streaming=True)
-        skill = AgentSkill(
-            id='333',
-            name='loan suggest',
-            description='Give the loan scheme suggestion to user',
-            tags=['loan scheme suggestion', 'loan scheme', 'loan suggestion', 'loan suggest'],
-            examples=['What is the best loan scheme for me?', 'Suggest a loan scheme based on my requirements'],
-        )
-        logger.info("AgentSkill created")
-
-        # 创建AgentCard
-        agent_card = AgentCard(
-            name='Loan Scheme Suggestion Agent',
-            description='Give the loan scheme suggestion to user',
-            url=f'http://localhost:{port}/',
-            version='1.0.0',
-            defaultInputModes=LoanSuggestAgent.SUPPORTED_CONTENT_TYPES,
-            defaultOutputModes=LoanSuggestAgent.SUPPORTED_CONTENT_TYPES,
-            capabilities=capabilities,
-            skills=[skill],
-        )
-        logger.info("AgentCard created")
-    except ValidationError as ve:
-        logger.error(f"Invalid configuration: {ve}")
-        return
-    except Exception as e:
-        logger.exception(f"Unexpected error: {e}")
-        return
-    
-    # 创建请求处理器 - 区分配置错误和未知错误
-    try: 
-        request_handler = DefaultRequestHandler(
-            agent_executor=LoanSuggestAgentExecutor(),
-            task_store=InMemoryTaskStore(),
-        )
-        logger.info("DefaultRequestHandler created")
-    except (TypeError, ValueError) as e:
-        logger.critical(f"Configuration error in RequestHandler: {e}")
-        return
-    except Exception as e:
-        logger.exception(f"Unexpected error creating RequestHandler: {e}")
-        return
-
-    # 创建Starlette应用
-    try:
-        server = A2AStarletteApplication(
-            agent_card=agent_card,
-            http_handler=request_handler,
-        )
-        logger.info("A2AStarletteApplication created")
-    except Exception as e:
-        logger.exception(f"Failed to create A2AStarletteApplication: {e}")
-        return
+def main():
+    host, port, workers = SERVER_CONFIG['host'], SERVER_CONFIG['port'], SERVER_CONFIG['workers']
+    logger.info(f"Starting Loan Scheme Suggestion Agent service on host: {host}, port: {port}, workers: {workers}")
 
     # 启动服务 - 添加端口冲突处理
     try:
         logger.info(f"Service starting at http://{host}:{port}")
-        uvicorn.run(server.build(), host=host, port=port)
+        # 以导入字符串启动应用工厂：每个worker进程各自调用create_app，并在lifespan中初始化Agent
+        uvicorn.run(
+            "src.server:create_app",
+            factory=True,
+            host=host,
+            port=port,
+            workers=workers,
+            loop=SERVER_CONFIG['loop'],
+            http=SERVER_CONFIG['http'],
+        )
     except OSError as e:
         if "address in use" in str(e):
             logger.error(f"Port {port} already in use. Please choose another port.")
@@ -90,15 +32,8 @@ def main(host, port):
     except Exception as e:
         logger.exception(f"Service startup failed: {e}")
     finally:
-        # 资源清理 - 实际应用中根据组件需要添加
-        logger.info("Performing service shutdown cleanup...")
-        
-        # 示例：如果使用需要关闭的连接
-        # if database_connection:
-        #     database_connection.close()
-        
-        # 对于InMemoryTaskStore，通常不需要额外清理
+        # Agent、任务存储等资源在应用的lifespan中清理
         logger.info("Service shutdown complete")
 
 if __name__ == '__main__':
-    main('0.0.0.0', 10030)
+    main()
@@ -1,36 +1,273 @@
-from langchain_community.document_loaders import TextLoader
-import redis
+"""Incremental ingestion of loan scheme files into the Redis vector index and the model index.
+
+Scheme files are split into blocks at blank lines. Each block is stored under a stable document ID,
+a hash of its file name and content, and a manifest in Redis records the documents of every file.
+A run therefore only embeds blocks that are new or changed, and deletes the documents of blocks
+that were removed from the ingested files. With --prune it also deletes the documents of files no
+longer given and documents written before the manifest existed. Embedding requests go out in
+batches, several at a time, under a request rate limit. Afterwards the model_id → scheme index read
+by the MCP server is rebuilt from the manifest.
+
+Run from this directory:
+    python rag_input.py [files or directories ...] [--prune] [--concurrency 4] [--rps 10] [--fake]
+"""
+from typing import Any, Dict, List, NamedTuple, Optional
+from langchain_core.embeddings import Embeddings
 from langchain_redis import RedisConfig, RedisVectorStore
-from langchain_community.embeddings import DashScopeEmbeddings
-from dotenv import load_dotenv
+import argparse
+import asyncio
+import hashlib
+import json
 import os
+import re
+import time
+import redis
+
+REDIS_URL = "redis://localhost:6379"
+INDEX_NAME = "loan_scheme"
+EMBEDDING_MODEL = "text-embedding-v1"
+EMBEDDING_DIMENSIONS = 1536
+# 每个文档ID所属的文件、位置、适用车型与内容，用于增量比对与重建车型索引
+MANIFEST_KEY = "loan_scheme_manifest"
+# 车型索引在Redis中的键前缀，与MCP服务RAG_CONFIG['scheme_index_prefix']一致
+SCHEME_INDEX_PREFIX = "loan_scheme_index"
+MODEL_LINE = re.compile(r"适用车型[:：]\s*(.+)")
+
+
+class Chunk(NamedTuple):
+    id: str
+    source: str
+    position: int
+    text: str
+    model_ids: List[str]
+
+
+def parse_model_ids(scheme: str) -> List[str]:
+    """Get the model IDs of a scheme block from its 适用车型 line."""
+    match = MODEL_LINE.search(scheme)
+    if not match:
+        return []
+    return [model_id.strip().upper() for model_id in re.split(r"[,，、\s]+", match.group(1)) if model_id.strip()]
+
+
+def load_chunks(paths: List[str]) -> Dict[str, List[Chunk]]:
+    """Split the scheme files (directories are searched for .txt files) into blocks, by file name."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(os.path.join(root, name) for root, _, names in os.walk(path)
+                            for name in names if name.endswith('.txt'))
+        else:
+            files.append(path)
+    chunks: Dict[str, List[Chunk]] = {}
+    for file_path in files:
+        source = os.path.basename(file_path)
+        with open(file_path, encoding='utf-8') as f:
+            blocks = [block.strip() for block in re.split(r"\n\s*\n", f.read()) if block.strip()]
+        chunks[source] = [
+            Chunk(hashlib.sha1(f"{source}\n{block}".encode('utf-8')).hexdigest()[:20], source, position, block,
+                  parse_model_ids(block))
+            for position, block in enumerate(blocks)
+        ]
+    return chunks
+
+
+def build_scheme_index(redis_client, manifest: Dict[str, Dict[str, Any]], prefix=SCHEME_INDEX_PREFIX) -> int:
+    """Replace the model_id → scheme index read by the MCP server with the schemes in the manifest.
+
+    <prefix>:schemes maps a document ID to the scheme text, <prefix>:models maps a model ID to the
+    JSON list of its document IDs in catalogue order (file name, then position in the file).
+    <prefix>:version is increased, which makes the MCP server reload its in-memory copy.
+    """
+    ordered = sorted(manifest.items(), key=lambda item: (item[1]['source'], item[1]['position']))
+    models: Dict[str, List[str]] = {}
+    for doc_id, entry in ordered:
+        for model_id in entry['model_ids']:
+            models.setdefault(model_id, []).append(doc_id)
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.delete(f"{prefix}:schemes", f"{prefix}:models")
+    if ordered:
+        pipe.hset(f"{prefix}:schemes", mapping={doc_id: entry['text'] for doc_id, entry in ordered})
+    if models:
+        pipe.hset(f"{prefix}:models", mapping={model_id: json.dumps(ids) for model_id, ids in models.items()})
+    pipe.incr(f"{prefix}:version")
+    pipe.execute()
+    return len(models)
+
+
+class RateLimiter:
+    """每秒最多发出rate个请求（rate为0时不限制）。"""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate else 0
+        self.next_at = 0.0
+
+    async def wait(self) -> None:
+        now = time.monotonic()
+        start_at = max(now, self.next_at)
+        self.next_at = start_at + self.interval
+        await asyncio.sleep(start_at - now)
+
+
+class PrecomputedEmbeddings(Embeddings):
+    """已计算好的向量，供RedisVectorStore.add_texts写入时查找，不再调用嵌入模型。"""
+
+    def __init__(self):
+        self.vectors: Dict[str, List[float]] = {}
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.vectors[text] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.vectors[text]
+
+
+async def embed_chunks(embeddings: Embeddings, chunks: List[Chunk], batch_size: int, concurrency: int, rps: float,
+                       retries: int = 3) -> Dict[str, List[float]]:
+    """Embed the chunks in batches, at most concurrency requests at a time and rps requests per second.
+
+    Failed requests (e.g. throttled by the API) are retried with exponential backoff.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = RateLimiter(rps)
+    texts = list(dict.fromkeys(chunk.text for chunk in chunks))
+
+    async def embed_batch(batch: List[str]) -> List[List[float]]:
+        async with semaphore:
+            for attempt in range(retries + 1):
+                await limiter.wait()
+                try:
+                    return await asyncio.to_thread(embeddings.embed_documents, batch)
+                except Exception as e:
+                    if attempt == retries:
+                        raise
+                    print(f"embedding request failed ({e}), retrying")
+                    await asyncio.sleep(2 ** attempt)
+
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    results = await asyncio.gather(*(embed_batch(batch) for batch in batches))
+    return {text: vector for batch, vectors in zip(batches, results) for text, vector in zip(batch, vectors)}
+
+
+async def ingest(paths: List[str], embeddings: Embeddings, redis_url: str = REDIS_URL, index_name: str = INDEX_NAME,
+                 prune: bool = False, batch_size: int = 25, concurrency: int = 4, rps: float = 10) -> Dict[str, Any]:
+    """Bring the vector index and the model index in line with the scheme files.
+
+    Args:
+        paths: Scheme files or directories of them.
+        embeddings: The embedding model; only new and changed blocks are embedded.
+        redis_url: Redis connection URL.
+        index_name: The vector index, as in the MCP server's RAG_CONFIG.
+        prune: Also delete the documents of files not in paths, and documents without a manifest entry.
+        batch_size: Texts per embedding request (DashScope accepts 25).
+        concurrency: Embedding requests in flight at a time.
+        rps: Maximum embedding requests per second; 0 for no limit.
+
+    Returns:
+        The counts of the run.
+    """
+    started_at = time.perf_counter()
+    chunks = load_chunks(paths)
+    redis_client = redis.Redis.from_url(redis_url)
+    precomputed = PrecomputedEmbeddings()
+    vector_store = RedisVectorStore(precomputed, config=RedisConfig(
+        index_name=index_name, redis_client=redis_client, embedding_dimensions=EMBEDDING_DIMENSIONS))
+
+    manifest = {doc_id.decode('utf-8'): json.loads(entry)
+                for doc_id, entry in redis_client.hgetall(MANIFEST_KEY).items()}
+    current = {chunk.id: chunk for source_chunks in chunks.values() for chunk in source_chunks}
+    new_chunks = [chunk for doc_id, chunk in current.items() if doc_id not in manifest]
+    removed = [doc_id for doc_id, entry in manifest.items()
+               if doc_id not in current and (prune or entry['source'] in chunks)]
+    if prune:
+        # 引入清单之前写入的文档（键为随机ID）没有清单记录
+        key_prefix = f"{vector_store.config.key_prefix}:"
+        removed += [key.decode('utf-8')[len(key_prefix):] for key in redis_client.scan_iter(match=f"{key_prefix}*")
+                    if key.decode('utf-8')[len(key_prefix):] not in manifest
+                    and key.decode('utf-8')[len(key_prefix):] not in current]
+
+    embedding_started_at = time.perf_counter()
+    precomputed.vectors = await embed_chunks(embeddings, new_chunks, batch_size, concurrency, rps)
+    embedding_seconds = time.perf_counter() - embedding_started_at
+    if new_chunks:
+        await asyncio.to_thread(
+            vector_store.add_texts,
+            [chunk.text for chunk in new_chunks],
+            metadatas=[{'source': chunk.source, 'model_ids': chunk.model_ids} for chunk in new_chunks],
+            keys=[chunk.id for chunk in new_chunks],
+        )
+        redis_client.hset(MANIFEST_KEY, mapping={
+            chunk.id: json.dumps({'source': chunk.source, 'position': chunk.position, 'model_ids': chunk.model_ids,
+                                  'text': chunk.text}, ensure_ascii=False)
+            for chunk in new_chunks
+        })
+    # 位置变化（其他块插入或删除）不改变文档ID，只更新清单中的位置
+    moved = {doc_id: chunk for doc_id, chunk in current.items()
+             if doc_id in manifest and manifest[doc_id]['position'] != chunk.position}
+    if moved:
+        redis_client.hset(MANIFEST_KEY, mapping={
+            doc_id: json.dumps({**manifest[doc_id], 'position': chunk.position}, ensure_ascii=False)
+            for doc_id, chunk in moved.items()
+        })
+    if removed:
+        vector_store.delete(removed)
+        redis_client.hdel(MANIFEST_KEY, *removed)
+
+    manifest = {doc_id.decode('utf-8'): json.loads(entry)
+                for doc_id, entry in redis_client.hgetall(MANIFEST_KEY).items()}
+    models = build_scheme_index(redis_client, manifest)
+    return {
+        'files': len(chunks),
+        'chunks': len(current),
+        'unchanged': len(current) - len(new_chunks),
+        'embedded': len(precomputed.vectors),
+        'requests': -(-len(precomputed.vectors) // batch_size),
+        'deleted': len(removed),
+        'documents': len(manifest),
+        'models': models,
+        'embedding_seconds': round(embedding_seconds, 3),
+        'seconds': round(time.perf_counter() - started_at, 3),
+    }
+
+
+def create_embeddings(fake: bool = False) -> Embeddings:
+    if fake:
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        return DeterministicFakeEmbedding(size=EMBEDDING_DIMENSIONS)
+    from langchain_community.embeddings import DashScopeEmbeddings
+    from src.config.load_key import load_key
+    return DashScopeEmbeddings(model=EMBEDDING_MODEL, dashscope_api_key=load_key("DASHSCOPE_API_KEY"))
+
+
+def format_stats(stats: Dict[str, Any]) -> str:
+    throughput = stats['embedded'] / stats['embedding_seconds'] if stats['embedding_seconds'] else 0
+    return (f"{stats['files']} files, {stats['chunks']} chunks: {stats['unchanged']} unchanged, "
+            f"{stats['embedded']} embedded in {stats['requests']} requests ({throughput:.1f} chunks/s), "
+            f"{stats['deleted']} deleted; {stats['documents']} documents and {stats['models']} models indexed "
+            f"in {stats['seconds']}s")
+
 
 # add knowledge to RAG
 def rag_ingest(file_path="loan_scheme_V2.txt"):
-    #1、加载原始文档    
-    loader = TextLoader(file_path,encoding='utf-8')
-    documents = loader.load()
-    #2、切分文档
-    import re
-    from langchain_text_splitters import CharacterTextSplitter
-    text_splitter = CharacterTextSplitter(chunk_size=500, chunk_overlap=0, separator="\n\n", keep_separator=True)
-    texts = re.split(r"\n\n", documents[0].page_content)
-    segments = text_splitter.split_text(documents[0].page_content)
-    segment_documents = text_splitter.create_documents(texts)
-    #3、将文档向量化，保存到Redis中
-    embedding_model = DashScopeEmbeddings(model="text-embedding-v1",dashscope_api_key="xxx")
-    redis_url = "redis://localhost:6379"
-    config = RedisConfig(
-        index_name="loan_scheme",
-        redis_url=redis_url
-    )
-    vector_store = RedisVectorStore(embedding_model, config=config)
-    vector_store.add_documents(segment_documents)
-    return f"{len(segment_documents)} documents ingested to RAG Redis."
+    return format_stats(asyncio.run(ingest([file_path], create_embeddings())))
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('paths', nargs='*', default=["loan_scheme_V2.txt"], help="scheme files or directories")
+    parser.add_argument('--prune', action='store_true',
+                        help="also delete documents of files not given and documents without a manifest entry")
+    parser.add_argument('--batch-size', type=int, default=25, help="texts per embedding request")
+    parser.add_argument('--concurrency', type=int, default=4, help="embedding requests in flight")
+    parser.add_argument('--rps', type=float, default=10, help="maximum embedding requests per second, 0 for no limit")
+    parser.add_argument('--redis-url', default=REDIS_URL)
+    parser.add_argument('--index', default=INDEX_NAME)
+    parser.add_argument('--fake', action='store_true', help="use local deterministic embeddings (for testing)")
+    args = parser.parse_args(argv)
+    stats = asyncio.run(ingest(args.paths, create_embeddings(args.fake), args.redis_url, args.index, args.prune,
+                               args.batch_size, args.concurrency, args.rps))
+    print(format_stats(stats))
 
 
 if __name__ == "__main__":
-    # add base knowledge to RAG
-    print(rag_ingest())
-    # add additional knowledge to RAG
-    # print(rag_ingest())
\ No newline at end of file
+    main()
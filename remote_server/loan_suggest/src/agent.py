@@ -1,14 +1,19 @@
 import logging
+from collections import OrderedDict
 from collections.abc import AsyncIterable
 from typing import Any, Dict, Literal
-from langchain_core.messages import AIMessageChunk
+from langchain_core.messages import AIMessage, AIMessageChunk, ToolMessage
 from langchain_core.runnables import RunnableConfig
 from pydantic import BaseModel, Field
 from langchain_mcp_adapters.client import MultiServerMCPClient
 from langgraph.prebuilt import create_react_agent
-from langchain_community.chat_models import ChatTongyi
-from src.config.load_key import load_key
-from langgraph.checkpoint.redis import AsyncRedisSaver
+from src.config.settings import CHECKPOINT_CONFIG
+from src.durable_checkpoint import DurableCheckpointSaver
+from src.fake_backends import FAKE_BACKENDS, fake_mcp_tools, open_checkpointer
+from src.model_provider import create_chat_model
+from src.stream_log import StreamLogSummary
+from src.trace_recorder import REPLAY, TraceRecorder, replay_tools
+from src.compaction import ConversationCompactor
 import os
 import logging.config
 
@@ -50,12 +55,10 @@ class LoanSuggestAgent:
         #ChatOpenAI不支持下面Agent实例中的response_format设定
         try:
             # self.model = ChatOpenAI(
-            self.model = ChatTongyi(
-                base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
-                api_key=load_key("DASHSCOPE_API_KEY"),
-                model="qwen-plus",
-            )
+            self.model = create_chat_model()
             self.mcp_client = None
+            self.compactor = ConversationCompactor(self.model, self.SYSTEM_INSTRUCTION)
+            self.tracer = TraceRecorder()
         except Exception as e:
             logger.error(f"Failed to initialize ChatTongyi model: {e}")
             raise
@@ -72,14 +75,22 @@ class LoanSuggestAgent:
                     }
                 }
             )
-            self.checkpointer = AsyncRedisSaver("redis://localhost:6379")
+            # Redis检查点及其清理任务；FAKE_BACKENDS时为进程内实现
+            self.checkpointer, self.retention = await open_checkpointer()
+            # 本进程已检查过是否需要崩溃修复的会话（最多CHECKPOINT_CONFIG['recovery_sessions']个）
+            self.recovered_sessions: "OrderedDict[str, None]" = OrderedDict()
+            # 按CHECKPOINT_CONFIG['durability']写入检查点，检查点清理仍直接使用下层存储
+            self.durable_checkpointer = DurableCheckpointSaver(self.checkpointer)
             logger.info("Redis checkpointer initialized")
-            self.tools = await self.mcp_client.get_tools()
+            self.tools = fake_mcp_tools() if FAKE_BACKENDS else await self.mcp_client.get_tools()
+            if REPLAY:
+                self.tools = replay_tools(self.tools)
             self.graph = create_react_agent(
                 self.model,
                 tools=self.tools,
-                checkpointer=self.checkpointer,
-                prompt=self.SYSTEM_INSTRUCTION,
+                checkpointer=self.durable_checkpointer,
+                # 系统提示词由压缩阶段与历史摘要一起组装；未启用压缩时直接作为prompt
+                **self.compactor.graph_options(),
                 # response_format=ResponseFormat,               
             )
             logger.info("React agent created with Redis checkpointer")
@@ -87,23 +98,87 @@ class LoanSuggestAgent:
             logger.error(f"Failed to initialize Redis checkpointer or create React agent: {e}")
             raise
 
+    async def close(self) -> None:
+        """Flush buffered checkpoint writes, then stop the sweeper and release its Redis connection."""
+        await self.durable_checkpointer.close()
+        await self.retention.stop()
+        await self.tracer.close()
+
+    async def recover_interrupted_turn(self, session_id) -> None:
+        """Keep the checkpoint valid after a turn was canceled or the process crashed.
+
+        If the run was canceled while tools were executing, the last checkpointed message is an
+        AIMessage whose tool calls never got results. Answer them with placeholder ToolMessages
+        so the next turn sends a well-formed history to the model. If the run stopped after a
+        step finished but before its checkpoint was written, the step's output is only saved as
+        pending writes, which a new input would discard; commit them into a checkpoint first.
+        """
+        config: RunnableConfig = {'configurable': {'thread_id': session_id}}
+        try:
+            state = await self.graph.aget_state(config)
+            messages = state.values.get('messages', [])
+            if messages and isinstance(messages[-1], AIMessage) and messages[-1].tool_calls:
+                await self.graph.aupdate_state(
+                    config,
+                    {'messages': [
+                        ToolMessage(content="Tool call canceled by user.", tool_call_id=tool_call['id'])
+                        for tool_call in messages[-1].tool_calls
+                    ]},
+                    as_node='tools',
+                )
+                logger.info(f"Closed {len(messages[-1].tool_calls)} pending tool calls for session ID: {session_id}")
+            elif state.tasks and not state.next:
+                # update_state先应用已保存的pending writes，再写入新的检查点
+                await self.graph.aupdate_state(config, {'messages': []}, as_node=state.tasks[0].name)
+                logger.info(f"Committed pending writes of step {state.tasks[0].name} for session ID: {session_id}")
+        except Exception as e:
+            logger.error(f"Failed to recover checkpoint for session ID {session_id}: {e}")
+
+    async def _recover_once(self, session_id) -> None:
+        if session_id in self.recovered_sessions:
+            self.recovered_sessions.move_to_end(session_id)
+            return
+        await self.recover_interrupted_turn(session_id)
+        self.recovered_sessions[session_id] = None
+        while len(self.recovered_sessions) > CHECKPOINT_CONFIG['recovery_sessions']:
+            self.recovered_sessions.popitem(last=False)
+
     async def stream(
         self, messages, session_id
     ) -> AsyncIterable[Dict[str, Any]]:
         logger.info(f"Starting stream processing for session ID: {session_id}")
+        # 活跃时间由后台任务批量写入Redis，不等待
+        await self.retention.touch(session_id)
+        # 进程崩溃时没有取消回调：本进程第一次处理该会话（上一轮可能在已退出的进程中执行）或本进程中上一轮未正常结束时，
+        # 检查上一轮是否完整结束；本进程内被取消的轮次已由调度器在会话锁内修复，不必每轮都读取检查点
+        await self._recover_once(session_id)
         config: RunnableConfig = {'configurable': {'thread_id': session_id}}
+        # 不逐token写日志，流结束时输出一行汇总（token数、首字延迟、耗时）
+        stream_log = StreamLogSummary(logger, session_id)
+        # 开启录制时记录本轮的模型调用、工具调用与输出内容块
+        trace = self.tracer.start_turn(session_id, messages)
+        status = "canceled"
         try:
-            async for item in self.graph.astream(input={"messages": messages}, config=config, stream_mode='messages'):
+            async for item in self.graph.astream(input={"messages": messages}, config={**config, 'callbacks': trace.callbacks},
+                                                 stream_mode='messages',
+                                                 checkpoint_during=self.durable_checkpointer.checkpoint_during):
                 if isinstance(item[0], AIMessageChunk):
-                    logger.debug(f"Received message chunk: {item[0].content}")
+                    stream_log.token(item[0].content)
+                    trace.chunk(item[0].content)
                     yield {
                         'is_final_answer': False,
                         'content': item[0].content,
                     }
+            status = "completed"
         except Exception as e:
+            status = "failed"
             logger.error(f"Error during stream processing for session ID {session_id}: {e}")
             raise
-        logger.info(f"Stream processing completed for session ID: {session_id}")
+        finally:
+            stream_log.finish(status)
+            if status != "completed":
+                self.recovered_sessions.pop(session_id, None)
+            self.tracer.finish(trace, status)
         # 循环结束后，发送输出结束的标志
         yield {
             'is_final_answer': True,  # 任务已完成
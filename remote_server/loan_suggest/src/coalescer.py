@@ -0,0 +1,97 @@
+from typing import Any, AsyncIterable, AsyncIterator, Dict, List
+from src.config.settings import STREAM_COALESCE_CONFIG
+import asyncio
+
+
+class StreamCoalescer:
+    """流式输出合并器。
+
+    将agent.stream()逐token产生的内容块合并后再交给TaskUpdater：缓冲的文本达到max_chars个字符，
+    或首个缓冲块已等待max_delay_ms毫秒时发送一次；第一个非空内容块立即发送，不影响首字延迟(TTFT)。
+    """
+
+    def __init__(self,
+                 enabled: bool = STREAM_COALESCE_CONFIG['enabled'],
+                 max_delay_ms: float = STREAM_COALESCE_CONFIG['max_delay_ms'],
+                 max_chars: int = STREAM_COALESCE_CONFIG['max_chars']):
+        self.enabled = enabled
+        self.max_delay = max_delay_ms / 1000
+        self.max_chars = max_chars
+
+    async def coalesce(self, stream: AsyncIterable[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+        """Merge consecutive non-final chunks of an agent stream.
+
+        Args:
+            stream: The chunks yielded by agent.stream(), each with 'is_final_answer' and 'content'.
+
+        Yields:
+            Dict[str, Any]: Chunks in the same format; non-final contents are concatenated.
+        """
+        if not self.enabled:
+            async for chunk in stream:
+                yield chunk
+            return
+
+        loop = asyncio.get_running_loop()
+        iterator = stream.__aiter__()
+        buffer: List[str] = []
+        buffered_chars = 0
+        deadline = 0.0
+        first = True
+        pending = None
+        try:
+            while True:
+                if pending is None:
+                    pending = asyncio.ensure_future(iterator.__anext__())
+                # 缓冲区为空时一直等待下一个块；否则最多等到deadline
+                timeout = max(0.0, deadline - loop.time()) if buffer else None
+                done, _ = await asyncio.wait({pending}, timeout=timeout)
+                if not done:
+                    yield self._flush(buffer)
+                    buffered_chars = 0
+                    continue
+
+                try:
+                    chunk = pending.result()
+                except StopAsyncIteration:
+                    pending = None
+                    break
+                pending = None
+
+                if chunk.get('is_final_answer'):
+                    if buffer:
+                        yield self._flush(buffer)
+                        buffered_chars = 0
+                    yield chunk
+                    continue
+
+                content = chunk.get('content')
+                if not content:
+                    continue
+                if first:
+                    first = False
+                    yield chunk
+                    continue
+                if not buffer:
+                    deadline = loop.time() + self.max_delay
+                buffer.append(content)
+                buffered_chars += len(content)
+                if buffered_chars >= self.max_chars:
+                    yield self._flush(buffer)
+                    buffered_chars = 0
+
+            if buffer:
+                yield self._flush(buffer)
+        finally:
+            # 被取消或提前关闭时，同时中断上游的模型流
+            if pending is not None and not pending.done():
+                pending.cancel()
+                await asyncio.gather(pending, return_exceptions=True)
+            if hasattr(iterator, 'aclose'):
+                await iterator.aclose()
+
+    @staticmethod
+    def _flush(buffer: List[str]) -> Dict[str, Any]:
+        content = ''.join(buffer)
+        buffer.clear()
+        return {'is_final_answer': False, 'content': content}
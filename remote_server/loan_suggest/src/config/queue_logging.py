@@ -0,0 +1,39 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+from typing import Optional
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_queue_logging(level: str = "INFO") -> None:
+    """Move the root logger's handlers onto a background thread.
+
+    Call after the last logging.config.fileConfig(...). The handlers configured in logging.conf
+    (console, timed rotating file) are driven by a QueueListener thread; the event loop thread only
+    puts records on an in-memory queue, so slow console or file I/O no longer stalls streaming.
+
+    Args:
+        level: The root logger level; records below it are not created at all.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    root.handlers = [logging.handlers.QueueHandler(log_queue)]
+    root.setLevel(level)
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    # 进程退出前把队列中剩余的日志写完
+    atexit.register(stop_queue_logging)
+
+
+def stop_queue_logging() -> None:
+    """Flush the queue and stop the background logging thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
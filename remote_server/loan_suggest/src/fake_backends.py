@@ -0,0 +1,113 @@
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.tools import BaseTool, tool
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.redis import AsyncRedisSaver
+# 在模块导入时加载：该模块执行fileConfig，若在lifespan中才导入，会替换setup_queue_logging设置的QueueHandler
+from src.checkpoint_retention import CheckpointRetention, checkpoint_ttl_config
+from src.config.settings import CHECKPOINT_CONFIG, MODEL_CONFIG
+from datetime import datetime
+import time
+import os
+import logging.config
+
+log_config_path = os.path.abspath("src/config/logging.conf")
+logging.config.fileConfig(log_config_path, encoding='utf-8')
+logger = logging.getLogger(__name__)
+
+# 使用本地模型或回放录制时，检查点、数据库与MCP工具也使用进程内实现，不需要Redis、MySQL和MongoDB
+FAKE_BACKENDS = MODEL_CONFIG['provider'] in ('fake', 'replay') and MODEL_CONFIG['fake_backends']
+
+# 代替MongoDB的examination_result集合
+EXAMINATION_RESULTS: List[Dict[str, str]] = []
+
+
+class InMemoryCheckpointRetention:
+    """CheckpointRetention的进程内替代，检查点保存在InMemorySaver中，随进程退出而释放。"""
+
+    def __init__(self, agent_name: str = CHECKPOINT_CONFIG['agent_name']):
+        self.agent_name = agent_name
+        self.threads: Dict[str, float] = {}
+
+    def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def touch(self, thread_id: str) -> None:
+        self.threads[thread_id] = time.time()
+
+    async def sweep(self) -> Dict[str, int]:
+        return {'evicted': 0, 'trimmed': 0, 'checkpoints': 0}
+
+    async def get_stats(self) -> Dict[str, Any]:
+        return {'agent': self.agent_name, 'backend': 'memory', 'threads': len(self.threads)}
+
+
+async def open_checkpointer() -> Tuple[BaseCheckpointSaver, Any]:
+    """Create the checkpointer and its retention sweeper.
+
+    Returns:
+        Tuple[BaseCheckpointSaver, Any]: AsyncRedisSaver and a started CheckpointRetention, or an
+        InMemorySaver and InMemoryCheckpointRetention when FAKE_BACKENDS is set.
+    """
+    if FAKE_BACKENDS:
+        return InMemorySaver(), InMemoryCheckpointRetention()
+    checkpointer = AsyncRedisSaver(CHECKPOINT_CONFIG['redis_url'], ttl=checkpoint_ttl_config())
+    # 创建检查点索引（已存在时不覆盖），检查点清理按索引查询线程的键
+    await checkpointer.asetup()
+    retention = CheckpointRetention(checkpointer)
+    retention.start()
+    return checkpointer, retention
+
+
+def create_sqlite_engine(ddl_path: str = "ddl.sql"):
+    """Create an in-memory SQLite engine loaded with the bmw_car_models table from ddl.sql."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.pool import StaticPool
+    # 所有连接共用同一个内存数据库
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={'check_same_thread': False})
+    with open(os.path.abspath(ddl_path), encoding='utf-8') as f:
+        ddl = f.read()
+    connection = engine.raw_connection()
+    try:
+        connection.executescript(ddl)
+        connection.commit()
+    finally:
+        connection.close()
+    return engine
+
+
+def fake_mcp_tools() -> List[BaseTool]:
+    """Local tools with the names, arguments and result shapes of the auto_finance_mcp server."""
+
+    @tool
+    async def get_loan_scheme_from_rag(model_id: Optional[str] = None) -> Dict:
+        """Get the loan schemes of an automobile model ID."""
+        if not model_id:
+            return {'model_id': '', 'schemes': [], 'count': 0, 'error': "model_id cannot be empty."}
+        schemes = [f"{model_id} 方案{i}：首付{20 + i * 10}%，期限{12 * (i + 2)}期，年利率{2.99 + i:.2f}%" for i in range(3)]
+        return {'model_id': model_id, 'schemes': schemes, 'count': len(schemes), 'error': None}
+
+    @tool
+    async def get_credit_info(id_number: str) -> Dict:
+        """Get the user's credit information by ID card number."""
+        if not id_number:
+            return {'id_number': '', 'credit_report': [], 'error': "身份证号不能为空"}
+        return {'id_number': id_number, 'credit_report': [
+            "用户姓名: 张三", "征信状态: 良好", "--- 信用记录详情 ---",
+            "1. 信用卡 - 招商银行\n   起止日期: 2019-03-01 至 至今\n   状态: 正常",
+        ], 'error': None}
+
+    @tool
+    async def create_examination_result(id_number: str, phone_number: str, result: str) -> None:
+        """Store the pre-examination result."""
+        EXAMINATION_RESULTS.append({
+            'id_number': id_number,
+            'phone_number': phone_number,
+            'examination_result': result,
+            'examination_time': datetime.now().isoformat(),
+        })
+
+    return [get_loan_scheme_from_rag, get_credit_info, create_examination_result]
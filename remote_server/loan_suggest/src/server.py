@@ -0,0 +1,129 @@
+from contextlib import asynccontextmanager
+from a2a.server.apps import A2AStarletteApplication
+from a2a.server.request_handlers import DefaultRequestHandler
+from a2a.types import (
+    AgentCapabilities,
+    AgentCard,
+    AgentSkill,
+)
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from src.agent import LoanSuggestAgent
+from src.agent_executor import LoanSuggestAgentExecutor
+from src.config.settings import LOGGING_CONFIG, SERVER_CONFIG
+from src.config.queue_logging import setup_queue_logging
+from src.task_store import create_task_store
+from pydantic import ValidationError
+import logging.config
+import time
+import os
+
+log_config_path = os.path.abspath("src/config/logging.conf")
+logging.config.fileConfig(log_config_path, encoding='utf-8')
+logger = logging.getLogger(__name__)
+
+
+def create_app() -> Starlette:
+    """Build the A2A application. uvicorn calls this factory once in every worker process.
+
+    The agent's async resources (Redis checkpointer, MCP tools) are created in the lifespan, on the
+    event loop that serves the requests, so every worker owns its own connections.
+
+    Returns:
+        Starlette: The application to serve.
+    """
+    # 日志处理器移到后台线程，避免控制台/文件I/O阻塞事件循环；须在所有模块的fileConfig之后调用
+    if LOGGING_CONFIG['queue']:
+        setup_queue_logging(LOGGING_CONFIG['level'])
+
+    port = SERVER_CONFIG['port']
+    logger.info(f"Creating Loan Scheme Suggestion Agent application in process {os.getpid()}")
+
+    try:
+        # 创建AgentSkill
+        capabilities = AgentCapabilities(
+            streaming=True)
+        skill = AgentSkill(
+            id='333',
+            name='loan suggest',
+            description='Give the loan scheme suggestion to user',
+            tags=['loan scheme suggestion', 'loan scheme', 'loan suggestion', 'loan suggest'],
+            examples=['What is the best loan scheme for me?', 'Suggest a loan scheme based on my requirements'],
+        )
+        logger.info("AgentSkill created")
+
+        # 创建AgentCard
+        agent_card = AgentCard(
+            name='Loan Scheme Suggestion Agent',
+            description='Give the loan scheme suggestion to user',
+            url=f'http://localhost:{port}/',
+            version='1.0.0',
+            defaultInputModes=LoanSuggestAgent.SUPPORTED_CONTENT_TYPES,
+            defaultOutputModes=LoanSuggestAgent.SUPPORTED_CONTENT_TYPES,
+            capabilities=capabilities,
+            skills=[skill],
+        )
+        logger.info("AgentCard created")
+    except ValidationError as ve:
+        logger.error(f"Invalid configuration: {ve}")
+        raise
+    except Exception as e:
+        logger.exception(f"Unexpected error: {e}")
+        raise
+
+    try:
+        # 算法代码要被client调用，得用A2A的DefaultRequestHandler封装一下，让它可以应对来自client的请求，并自动执行AgentExecutor中的对应函数
+        agent_executor = LoanSuggestAgentExecutor()
+        task_store = create_task_store()
+        request_handler = DefaultRequestHandler(
+            agent_executor=agent_executor,
+            task_store=task_store,
+        )
+        logger.info("DefaultRequestHandler created")
+    except (TypeError, ValueError) as e:
+        logger.critical(f"Configuration error in RequestHandler: {e}")
+        raise
+    except Exception as e:
+        logger.exception(f"Unexpected error creating RequestHandler: {e}")
+        raise
+
+    @asynccontextmanager
+    async def lifespan(app: Starlette):
+        # 在服务请求的事件循环上完成异步初始化，初始化失败时uvicorn不会开始接收请求
+        await agent_executor.startup()
+        try:
+            yield
+        finally:
+            logger.info("Performing application shutdown cleanup...")
+            await agent_executor.shutdown()
+            if hasattr(task_store, 'close'):
+                await task_store.close()
+            logger.info("Application shutdown complete")
+
+    # 使用A2A SDK封装一个应用服务，lifespan透传给Starlette
+    try:
+        server = A2AStarletteApplication(
+            agent_card=agent_card,
+            http_handler=request_handler,
+        )
+        logger.info("A2AStarletteApplication created")
+        app = server.build(lifespan=lifespan)
+    except Exception as e:
+        logger.exception(f"Failed to create A2AStarletteApplication: {e}")
+        raise
+
+    async def metrics(request: Request) -> JSONResponse:
+        # 本worker进程的会话队列深度、合并计数与任务存储统计；cpu_seconds为进程累计CPU时间，用于计算每个流的CPU开销
+        data = {'pid': os.getpid(), 'cpu_seconds': time.process_time(), 'executor': agent_executor.get_metrics()}
+        if hasattr(task_store, 'get_stats'):
+            data['task_store'] = task_store.get_stats()
+        return JSONResponse(data)
+
+    async def checkpoint_metrics(request: Request) -> JSONResponse:
+        # 检查点线程数、各Agent占用字节数与淘汰速率，需要查询Redis
+        return JSONResponse(await agent_executor.get_checkpoint_stats())
+
+    app.add_route('/metrics', metrics, methods=['GET'])
+    app.add_route('/metrics/checkpoints', checkpoint_metrics, methods=['GET'])
+    return app
@@ -0,0 +1,239 @@
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from src.config.settings import SESSION_SCHEDULER_CONFIG
+import asyncio
+import os
+import logging.config
+
+log_config_path = os.path.abspath("src/config/logging.conf")
+logging.config.fileConfig(log_config_path, encoding='utf-8')
+logger = logging.getLogger(__name__)
+
+
+class SessionQueueFull(RuntimeError):
+    """同一会话排队的轮次超过max_pending。"""
+
+
+class SessionLockTimeout(RuntimeError):
+    """等待其他worker释放会话锁超过lock_wait秒。"""
+
+
+class _Generation:
+    """一次模型生成：由一个后台任务产生内容块，所有订阅者从头读取。"""
+
+    def __init__(self, key: Tuple[str, str]):
+        self.key = key
+        self.chunks: List[Dict[str, Any]] = []
+        self.changed = asyncio.Event()
+        self.started = False
+        self.done = False
+        self.final_seen = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+
+    def publish(self, chunk: Dict[str, Any]) -> None:
+        self.chunks.append(chunk)
+        if chunk.get('is_final_answer'):
+            self.final_seen = True
+        self.notify()
+
+    def notify(self) -> None:
+        # 唤醒当前所有等待者，之后的等待者使用新的Event
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class SessionScheduler:
+    """按会话串行调度Agent轮次。
+
+    同一session_id(即检查点的thread_id)的轮次依次执行，避免并发的graph.astream争抢同一检查点；
+    不同会话互不影响、并行执行。同一会话中输入相同且仍在排队或执行中的请求（重复发送、前端重试）
+    合并为一次生成，所有请求共享同一个内容流，新加入的请求从头收到已生成的内容。
+    调度只在本进程内可见：多worker运行时开启redis_lock，轮次执行期间（含检查点修复）另外持有Redis中的会话锁，
+    不同worker、不同Agent的同一会话也依次执行；合并重复请求仍只在同一进程内进行。
+    """
+
+    def __init__(self,
+                 on_cancel: Optional[Callable[[str], Awaitable[None]]] = None,
+                 enabled: bool = SESSION_SCHEDULER_CONFIG['enabled'],
+                 coalesce: bool = SESSION_SCHEDULER_CONFIG['coalesce'],
+                 max_pending: int = SESSION_SCHEDULER_CONFIG['max_pending'],
+                 redis_lock: bool = SESSION_SCHEDULER_CONFIG['redis_lock']):
+        """
+        Args:
+            on_cancel: Awaited with the session ID when a started generation is canceled, before
+                the next turn of the session may start (used to repair the checkpoint).
+            enabled: Serialize turns per session; when False, streams run directly.
+            coalesce: Share one generation between identical in-flight requests.
+            max_pending: Maximum turns of one session waiting behind the running one.
+            redis_lock: Also hold a per-session lock in Redis while a turn runs, for several workers.
+        """
+        self.on_cancel = on_cancel
+        self.enabled = enabled
+        self.coalesce = coalesce
+        self.max_pending = max_pending
+        self.redis = None
+        if enabled and redis_lock:
+            # Redis客户端随langgraph-checkpoint-redis一起安装
+            import redis.asyncio as redis
+            self.redis = redis.from_url(SESSION_SCHEDULER_CONFIG['redis_url'])
+        self.lock_ttl = SESSION_SCHEDULER_CONFIG['lock_ttl']
+        self.lock_wait = SESSION_SCHEDULER_CONFIG['lock_wait']
+        # session_id -> [会话锁, 排队或执行中的轮次数]
+        self.sessions: Dict[str, List[Any]] = {}
+        # (session_id, user_input) -> 排队或执行中的生成
+        self.generations: Dict[Tuple[str, str], _Generation] = {}
+        self.running = 0
+        self.queued = 0
+        self.max_queue_depth = 0
+        self.turns = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.canceled = 0
+        self.lock_timeouts = 0
+
+    async def stream(self, session_id: str, user_input: str,
+                     factory: Callable[[], AsyncIterable[Dict[str, Any]]]) -> AsyncIterator[Dict[str, Any]]:
+        """Run one turn of a session, or join an identical turn already in flight.
+
+        Args:
+            session_id: The session ID, used as the checkpoint thread_id.
+            user_input: The user input of this turn.
+            factory: Creates the chunk stream of the turn; called only when the turn starts.
+
+        Yields:
+            Dict[str, Any]: The chunks of the (possibly shared) generation.
+
+        Raises:
+            SessionQueueFull: Too many turns of the session are already waiting.
+            SessionLockTimeout: Another worker held the session lock for longer than lock_wait.
+        """
+        if not self.enabled:
+            async for chunk in factory():
+                yield chunk
+            return
+
+        key = (session_id, user_input)
+        generation = self.generations.get(key) if self.coalesce else None
+        if generation:
+            self.coalesced += 1
+            logger.info(f"Joined in-flight turn of session_id={session_id}, "
+                        f"subscribers={generation.subscribers + 1}")
+        else:
+            session = self.sessions.setdefault(session_id, [asyncio.Lock(), 0])
+            if session[1] > self.max_pending:
+                self.rejected += 1
+                raise SessionQueueFull(f"Too many pending turns for session {session_id}")
+            session[1] += 1
+            self.queued += 1
+            self.max_queue_depth = max(self.max_queue_depth, session[1])
+            generation = _Generation(key)
+            if self.coalesce:
+                self.generations[key] = generation
+            generation.task = asyncio.create_task(self._produce(generation, session_id, session[0], factory))
+            # 在完成回调中释放：任务在开始执行前被取消时，协程内的finally不会运行
+            generation.task.add_done_callback(lambda _: self._release(generation, session_id, session))
+
+        generation.subscribers += 1
+        index = 0
+        try:
+            while True:
+                while index < len(generation.chunks):
+                    yield generation.chunks[index]
+                    index += 1
+                if generation.done:
+                    if generation.error:
+                        raise generation.error
+                    return
+                await generation.changed.wait()
+        finally:
+            generation.subscribers -= 1
+            # 最后一个订阅者离开且生成尚未给出最终答案时取消生成，等待其完成检查点修复
+            if generation.subscribers == 0 and not generation.done and not generation.final_seen:
+                if self.generations.get(generation.key) is generation:
+                    del self.generations[generation.key]
+                generation.task.cancel()
+                await asyncio.gather(generation.task, return_exceptions=True)
+
+    def get_metrics(self) -> Dict[str, int]:
+        """Get queue depth and coalescing counters."""
+        return {
+            'sessions': len(self.sessions),
+            'running': self.running,
+            'queued': self.queued,
+            'max_queue_depth': self.max_queue_depth,
+            'turns': self.turns,
+            'coalesced': self.coalesced,
+            'rejected': self.rejected,
+            'canceled': self.canceled,
+            'lock_timeouts': self.lock_timeouts,
+        }
+
+    async def close(self) -> None:
+        """Close the Redis connection of the session lock."""
+        if self.redis:
+            await self.redis.aclose()
+
+    async def _produce(self, generation: _Generation, session_id: str, lock: asyncio.Lock,
+                       factory: Callable[[], AsyncIterable[Dict[str, Any]]]) -> None:
+        async with lock:
+            self.queued -= 1
+            generation.started = True
+            self.running += 1
+            self.turns += 1
+            try:
+                async with self._redis_lock(session_id):
+                    try:
+                        async for chunk in factory():
+                            generation.publish(chunk)
+                    except asyncio.CancelledError:
+                        self.canceled += 1
+                        if self.on_cancel:
+                            # 持有会话锁修复检查点，下一轮次不会读到中断的状态
+                            await self.on_cancel(session_id)
+                        raise
+            except Exception as e:
+                generation.error = e
+            finally:
+                self.running -= 1
+
+    @asynccontextmanager
+    async def _redis_lock(self, session_id: str) -> AsyncIterator[None]:
+        if not self.redis:
+            yield
+            return
+        # 锁按会话（检查点thread_id）命名，各Agent共用；执行期间每lock_ttl/3秒续期，进程崩溃时lock_ttl秒后自动释放
+        lock = self.redis.lock(f"{SESSION_SCHEDULER_CONFIG['lock_prefix']}{session_id}", timeout=self.lock_ttl,
+                               blocking_timeout=self.lock_wait, thread_local=False)
+        if not await lock.acquire():
+            self.lock_timeouts += 1
+            raise SessionLockTimeout(f"Session {session_id} is still busy in another worker")
+        renewal = asyncio.create_task(self._renew(lock))
+        try:
+            yield
+        finally:
+            renewal.cancel()
+            try:
+                await lock.release()
+            except Exception as e:
+                logger.warning(f"Failed to release session lock of session_id={session_id}: {e}")
+
+    async def _renew(self, lock: Any) -> None:
+        while True:
+            await asyncio.sleep(self.lock_ttl / 3)
+            try:
+                await lock.reacquire()
+            except Exception as e:
+                logger.warning(f"Failed to extend session lock {lock.name}: {e}")
+
+    def _release(self, generation: _Generation, session_id: str, session: List[Any]) -> None:
+        if not generation.started:
+            self.queued -= 1
+        session[1] -= 1
+        if session[1] == 0:
+            del self.sessions[session_id]
+        if self.generations.get(generation.key) is generation:
+            del self.generations[generation.key]
+        generation.done = True
+        generation.notify()